@@ -19,6 +19,14 @@ from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events.event_queue import EventQueue
 from a2a.types import AgentExtension, Task
 
+from .compact import (
+    CompactCodec,
+    a2ui_COMPACT_MIME_TYPE,
+    build_key_dictionary,
+    is_compact_encoding_available,
+    key_dictionary_version,
+)
+
 logger = logging.getLogger(__name__)
 
 # --- Define a2ui UI constants ---
@@ -30,19 +38,55 @@ a2ui_MIME_TYPE = "application/json+a2ui"
 class a2uiExtension:
     """A generic a2ui UI extension that activates UI mode."""
 
+    def __init__(self, compact_keys: list[str] | None = None):
+        # The compact encoding is only offered when a key dictionary is given
+        # and the optional MessagePack dependency is installed.
+        self.compact_keys = (
+            compact_keys if compact_keys and is_compact_encoding_available() else None
+        )
+
+    def supported_encodings(self) -> list[str]:
+        """The a2ui encodings this agent can emit, in order of preference."""
+        if self.compact_keys:
+            return [a2ui_MIME_TYPE, a2ui_COMPACT_MIME_TYPE]
+        return [a2ui_MIME_TYPE]
+
     def agent_extension(self) -> AgentExtension:
         """Get the AgentExtension representing this extension."""
+        params = {
+            "supportedSchemas": [
+                "https://raw.githubusercontent.com/google/A2UI/refs/heads/main/specification/json/server_to_client.json"
+            ],
+            "acceptsDynamicSchemas": True,
+            "supportedEncodings": self.supported_encodings(),
+        }
+        if self.compact_keys:
+            params["compactKeyDictionary"] = self.compact_keys
+            params["compactKeyDictionaryVersion"] = key_dictionary_version(
+                self.compact_keys
+            )
         return AgentExtension(
             uri=URI,
             description="Provides a declarative a2ui UI JSON structure in messages.",
-            params={
-                "supportedSchemas": [
-                    "https://raw.githubusercontent.com/google/A2UI/refs/heads/main/specification/json/server_to_client.json"
-                ],
-                "acceptsDynamicSchemas": True,
-            },
+            params=params,
         )
 
+    def requested_encoding(self, context: RequestContext) -> str:
+        """
+        Returns the a2ui encoding the client asked for.
+
+        Clients select an encoding from `supportedEncodings` by sending
+        `{"encoding": "<mime type>"}` under the extension URI in the message
+        metadata. Unknown or unsupported encodings fall back to JSON.
+        """
+        metadata = (context.message.metadata if context.message else None) or {}
+        ext_params = metadata.get(URI)
+        if isinstance(ext_params, dict):
+            encoding = ext_params.get("encoding")
+            if encoding in self.supported_encodings():
+                return encoding
+        return a2ui_MIME_TYPE
+
     def activate(self, context: RequestContext) -> bool:
         """Checks if the a2ui UI extension was requested by the client."""
         if URI in context.requested_extensions:
@@ -68,14 +112,21 @@ class _a2uiExecutor(AgentExecutor):
             f"--- Client requested extensions: {context.requested_extensions} ---"
         )
         use_ui = self._ext.activate(context)
+        encoding = a2ui_MIME_TYPE
         if use_ui:
-            logger.info("--- a2ui UI EXTENSION ACTIVATED ---")
+            encoding = self._ext.requested_encoding(context)
+            logger.info(f"--- a2ui UI EXTENSION ACTIVATED (encoding: {encoding}) ---")
         else:
             logger.info("--- a2ui UI EXTENSION *NOT* ACTIVE ---")
 
         # All parsing logic is now handled correctly inside the delegate executor.
-        # We pass the `use_ui` flag to the delegate.
-        await self._delegate.execute(context, event_queue, use_ui=use_ui)
+        # We pass the `use_ui` flag to the delegate, and the negotiated encoding
+        # only when it is not plain JSON, so delegates that predate the compact
+        # encoding keep working.
+        kwargs = {"use_ui": use_ui}
+        if encoding != a2ui_MIME_TYPE:
+            kwargs["a2ui_encoding"] = encoding
+        await self._delegate.execute(context, event_queue, **kwargs)
 
     async def cancel(
         self, context: RequestContext, event_queue: EventQueue
@@ -85,6 +136,10 @@ class _a2uiExecutor(AgentExecutor):
 
 __all__ = [
     "URI",
+    "CompactCodec",
     "a2uiExtension",
+    "a2ui_COMPACT_MIME_TYPE",
     "a2ui_MIME_TYPE",
+    "build_key_dictionary",
+    "is_compact_encoding_available",
 ]
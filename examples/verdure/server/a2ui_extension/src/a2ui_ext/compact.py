@@ -0,0 +1,108 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact MessagePack encoding for a2ui messages.
+
+A2UI messages repeat the same property names (`component`, `literalString`,
+`explicitList`, `children`, ...) in every component. The compact encoding
+replaces every property name found in a key dictionary with its index and
+serializes the result with MessagePack. The key dictionary is derived from the
+A2UI JSON schema and advertised in the extension params, so clients can
+rebuild it, or check its version, before decoding.
+
+MessagePack support is optional and requires the `msgpack` package
+(`pip install a2ui_ext[compact]`).
+"""
+
+import hashlib
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+a2ui_COMPACT_MIME_TYPE = "application/msgpack+a2ui"
+
+
+def is_compact_encoding_available() -> bool:
+    """Returns True if the optional MessagePack dependency is installed."""
+    return msgpack is not None
+
+
+def build_key_dictionary(schema: dict[str, Any]) -> list[str]:
+    """Collects every property name defined in `schema`, in a stable order."""
+    keys = set()
+
+    def visit(node: Any) -> None:
+        if isinstance(node, dict):
+            properties = node.get("properties")
+            if isinstance(properties, dict):
+                keys.update(properties.keys())
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for item in node:
+                visit(item)
+
+    visit(schema)
+    return sorted(keys)
+
+
+def key_dictionary_version(keys: list[str]) -> str:
+    """Returns a short fingerprint clients can use to verify their dictionary."""
+    return hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()[:12]
+
+
+class CompactCodec:
+    """Encodes and decodes a2ui messages using a shared key dictionary."""
+
+    def __init__(self, keys: list[str]):
+        if msgpack is None:
+            raise RuntimeError(
+                "The compact a2ui encoding requires the 'msgpack' package."
+            )
+        self.keys = list(keys)
+        self.version = key_dictionary_version(self.keys)
+        self._index = {key: i for i, key in enumerate(self.keys)}
+
+    def _compress(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                self._index.get(key, key): self._compress(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._compress(item) for item in value]
+        return value
+
+    def _expand(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                self.keys[key] if isinstance(key, int) else key: self._expand(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._expand(item) for item in value]
+        return value
+
+    def encode(self, messages: Any) -> bytes:
+        """Serializes a2ui messages into the compact binary form."""
+        return msgpack.packb(self._compress(messages), use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        """Restores a2ui messages from their compact binary form."""
+        return self._expand(
+            msgpack.unpackb(data, raw=False, strict_map_key=False)
+        )
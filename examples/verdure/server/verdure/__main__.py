@@ -12,20 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import importlib.util
 import logging
 import os
 
 import click
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
-from a2a.types import AgentCapabilities, AgentCard, AgentSkill
-from a2ui_ext import a2uiExtension
-from agent import LandscapeAgent
-from agent_executor import LandscapeAgentExecutor
 from dotenv import load_dotenv
-from starlette.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles
 
 load_dotenv()
 
@@ -37,72 +29,119 @@ class MissingAPIKeyError(Exception):
     """Exception for missing API key."""
 
 
+def _require_module(option: str, value: str, module: str) -> None:
+    if value == module and importlib.util.find_spec(module) is None:
+        raise click.BadParameter(
+            f"'{value}' needs the '{module}' package to be installed.", param_hint=option
+        )
+
+
 @click.command()
 @click.option("--host", default="localhost")
 @click.option("--port", default=10002)
-def main(host, port):
+@click.option(
+    "--workers",
+    default=1,
+    envvar="VERDURE_SERVER_WORKERS",
+    help="Worker processes, each with its own executor and sessions.",
+)
+@click.option(
+    "--loop",
+    type=click.Choice(["auto", "asyncio", "uvloop"]),
+    default="auto",
+    envvar="VERDURE_SERVER_LOOP",
+    help="Event loop; `auto` uses uvloop when it is installed.",
+)
+@click.option(
+    "--http",
+    type=click.Choice(["auto", "h11", "httptools"]),
+    default="auto",
+    envvar="VERDURE_SERVER_HTTP",
+    help="HTTP parser; `auto` uses httptools when it is installed.",
+)
+@click.option(
+    "--keep-alive",
+    default=5,
+    envvar="VERDURE_SERVER_KEEP_ALIVE",
+    help="Seconds an idle client connection is kept open.",
+)
+@click.option(
+    "--backlog",
+    default=2048,
+    envvar="VERDURE_SERVER_BACKLOG",
+    help="Connections the OS queues before they are accepted.",
+)
+@click.option(
+    "--session-affinity/--no-session-affinity",
+    default=True,
+    envvar="VERDURE_SESSION_AFFINITY",
+    help="With several workers, route each conversation to one worker (see affinity_router.py).",
+)
+@click.option(
+    "--limit-concurrency",
+    default=0,
+    envvar="VERDURE_SERVER_LIMIT_CONCURRENCY",
+    help="Connections and tasks per worker before new requests get a 503 (0 for no limit).",
+)
+def main(
+    host, port, workers, loop, http, keep_alive, backlog, session_affinity, limit_concurrency
+):
+    _require_module("--loop", loop, "uvloop")
+    _require_module("--http", http, "httptools")
     try:
-        # Check for API key only if Vertex AI is not configured
-        if not os.getenv("GOOGLE_GENAI_USE_VERTEXAI") == "TRUE":
+        # Check for API key only if Vertex AI is not configured and the
+        # offline fake model is not selected.
+        uses_fake_model = os.getenv("LITELLM_MODEL", "").startswith("fake")
+        if not os.getenv("GOOGLE_GENAI_USE_VERTEXAI") == "TRUE" and not uses_fake_model:
             if not os.getenv("GEMINI_API_KEY"):
                 raise MissingAPIKeyError(
                     "GEMINI_API_KEY environment variable not set and GOOGLE_GENAI_USE_VERTEXAI is not TRUE."
                 )
 
-        hello_ext = a2uiExtension()
-        capabilities = AgentCapabilities(
-            streaming=True,
-            extensions=[
-                hello_ext.agent_extension(),
-            ],
-        )
-        skill = AgentSkill(
-            id="design_landscape",
-            name="Landscape Design Tool",
-            description="Helps users design a landscape by guiding them through preferences and options.",
-            tags=["landscape", "design", "garden"],
-            examples=["Design my backyard", "Start a new landscape project"],
-        )
-
-        base_url = f"http://{host}:{port}"
-
-        agent_card = AgentCard(
-            name="A2UIScape Design",
-            description="This agent helps you envision your dream landscape.",
-            url=base_url,  # <-- Use base_url here
-            version="1.0.0",
-            default_input_modes=LandscapeAgent.SUPPORTED_CONTENT_TYPES,
-            default_output_modes=LandscapeAgent.SUPPORTED_CONTENT_TYPES,
-            capabilities=capabilities,
-            skills=[skill],
-        )
-
-        agent_executor = LandscapeAgentExecutor(base_url=base_url)
-
-        agent_executor = hello_ext.wrap_executor(agent_executor)
+        # Read by the application factory in every worker.
+        os.environ.setdefault("VERDURE_BASE_URL", f"http://{host}:{port}")
 
-        request_handler = DefaultRequestHandler(
-            agent_executor=agent_executor,
-            task_store=InMemoryTaskStore(),
-        )
-        server = A2AStarletteApplication(
-            agent_card=agent_card, http_handler=request_handler
-        )
         import uvicorn
 
-        app = server.build()
-
-        app.add_middleware(
-            CORSMiddleware,
-            allow_origins=["http://localhost:5173"],
-            allow_credentials=True,
-            allow_methods=["*"],
-            allow_headers=["*"],
+        if workers > 1 and session_affinity:
+            from affinity_router import AffinityRouter, create_router_app, worker_command
+
+            # The workers run as separate servers behind the router.
+            router = AffinityRouter.from_env(
+                worker_command(
+                    loop=loop,
+                    http=http,
+                    keep_alive=keep_alive,
+                    backlog=backlog,
+                    limit_concurrency=limit_concurrency,
+                ),
+                port=port,
+                workers=workers,
+            )
+            uvicorn.run(
+                create_router_app(router),
+                host=host,
+                port=port,
+                loop=loop,
+                http=http,
+                timeout_keep_alive=keep_alive,
+                backlog=backlog,
+            )
+            return
+
+        # Each worker imports the factory and builds its own application.
+        uvicorn.run(
+            "server_app:create_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            timeout_keep_alive=keep_alive,
+            backlog=backlog,
+            limit_concurrency=limit_concurrency or None,
         )
-
-        app.mount("/images", StaticFiles(directory="images"), name="images")
-
-        uvicorn.run(app, host=host, port=port)
     except MissingAPIKeyError as e:
         logger.error(f"Error: {e}")
         exit(1)
@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Builds the compact a2ui codec for this agent from its A2UI_SCHEMA, so the
+# executor and the advertised agent card share the same key dictionary.
+#
+# The compact encoding is off by default. The MessagePack bytes are about half
+# the size of the JSON, but A2A carries them base64-encoded in a JSON FilePart,
+# which adds a third back. Responses are then still 30-40% smaller than JSON
+# before HTTP compression, but 5-30% larger after gzip, which compresses the
+# repetitive JSON better. Decoding is also about 3 times slower than
+# `json.loads`. It only pays off on uncompressed links; `python
+# a2ui_encoding.py` compares both over the example surfaces.
+#
+# Configuration (environment):
+#   VERDURE_COMPACT_ENCODING  Set to `true` to offer the compact encoding in the
+#                             agent card (needs the `msgpack` package).
+
+import json
+import logging
+
+from a2ui_ext import CompactCodec, build_key_dictionary, is_compact_encoding_available
+from a2ui_schema import load_a2ui_schema
+from config import env_flag
+
+logger = logging.getLogger(__name__)
+
+
+def get_compact_keys() -> list[str] | None:
+    """Returns the key dictionary for A2UI_SCHEMA, or None if not enabled or unavailable."""
+    if not env_flag("VERDURE_COMPACT_ENCODING"):
+        return None
+    if not is_compact_encoding_available():
+        logger.info("msgpack is not installed; the compact a2ui encoding is disabled.")
+        return None
+    return build_key_dictionary(load_a2ui_schema())
+
+
+def get_compact_codec() -> CompactCodec | None:
+    """Returns the compact codec for A2UI_SCHEMA, or None if unavailable."""
+    keys = get_compact_keys()
+    return CompactCodec(keys) if keys else None
+
+
+if __name__ == "__main__":
+    # Compares the size and throughput of JSON and the compact encoding over
+    # the example surfaces. "wire" is what a response carries: the JSON itself,
+    # or the base64 of the MessagePack bytes. "gz" is the wire size after gzip,
+    # as with HTTP compression.
+    import base64
+    import gzip
+    import timeit
+
+    from ui_examples import load_ui_examples
+
+    if not is_compact_encoding_available():
+        raise SystemExit("Install msgpack to run this comparison.")
+    codec = CompactCodec(build_key_dictionary(load_a2ui_schema()))
+
+    iterations = 2000
+    print(
+        f"{'example':30} {'json B':>7} {'msgpack B':>9} {'wire B':>7} {'json gz':>8} "
+        f"{'wire gz':>8} {'json enc/s':>10} {'cmp enc/s':>10} {'json dec/s':>10} "
+        f"{'cmp dec/s':>10}"
+    )
+    totals = [0, 0, 0, 0, 0]
+    for name, messages in load_ui_examples("http://localhost:10002").items():
+        json_bytes = json.dumps(messages, separators=(",", ":")).encode("utf-8")
+        compact_bytes = codec.encode(messages)
+        wire_bytes = base64.b64encode(compact_bytes)
+        assert codec.decode(base64.b64decode(wire_bytes)) == messages
+        sizes = [
+            len(json_bytes),
+            len(compact_bytes),
+            len(wire_bytes),
+            len(gzip.compress(json_bytes)),
+            len(gzip.compress(wire_bytes)),
+        ]
+        totals = [total + size for total, size in zip(totals, sizes)]
+
+        def rate(fn):
+            return iterations / timeit.timeit(fn, number=iterations)
+
+        print(
+            f"{name:30} {sizes[0]:>7} {sizes[1]:>9} {sizes[2]:>7} {sizes[3]:>8} "
+            f"{sizes[4]:>8} "
+            f"{rate(lambda: json.dumps(messages, separators=(',', ':'))):>10.0f} "
+            f"{rate(lambda: base64.b64encode(codec.encode(messages))):>10.0f} "
+            f"{rate(lambda: json.loads(json_bytes)):>10.0f} "
+            f"{rate(lambda: codec.decode(base64.b64decode(wire_bytes))):>10.0f}"
+        )
+    print(
+        f"{'total':30} {totals[0]:>7} {totals[1]:>9} {totals[2]:>7} {totals[3]:>8} "
+        f"{totals[4]:>8}"
+    )
+    print(
+        f"wire vs JSON: {totals[2] / totals[0] - 1:+.0%} uncompressed, "
+        f"{totals[4] / totals[3] - 1:+.0%} with gzip"
+    )
@@ -15,6 +15,11 @@
 # This file serves as the single source of truth for the A2UI Schema.
 # It is imported by agent.py (for validation) and prompt_builder.py (for prompting).
 
+import functools
+from typing import Any
+
+import json_codec
+
 A2UI_SCHEMA = r"""
 {
   "title": "A2UI Message Schema",
@@ -738,3 +743,9 @@ A2UI_SCHEMA = r"""
   }
 }
 """
+
+
+@functools.cache
+def load_a2ui_schema() -> dict[str, Any]:
+    """Returns A2UI_SCHEMA parsed once per process. Callers must not modify it."""
+    return json_codec.loads(A2UI_SCHEMA)
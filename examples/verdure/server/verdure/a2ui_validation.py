@@ -0,0 +1,188 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Structural validation of a2ui responses.
+#
+# The JSON schema checks each message on its own, but not the component graph
+# the messages describe together: a surface's components refer to each other
+# by ID (`child`, `children.explicitList`, `children.template.componentId`,
+# tab children, modal children), and `beginRendering.root` names the component
+# the surface is drawn from. This module checks, per surface, that
+#   - component IDs are unique;
+#   - every reference and the root resolve to a component of the surface;
+#   - every component is reachable from the root;
+#   - there are no cycles (a component cannot contain itself).
+# Components are indexed in one pass and the graph is walked once from the
+# root, so the check is linear in the number of components and references.
+#
+# A surface updated without `beginRendering` in the same response may refer to
+# components sent in earlier turns, so only its IDs and cycles are checked.
+
+from typing import Any
+
+# Errors reported per response; enough for the model to fix its output.
+MAX_ERRORS = 10
+
+
+def component_references(component: dict[str, Any]) -> list[tuple[str, str]]:
+    """Returns the (field, ID) pairs of the components a component refers to."""
+    definition = component.get("component")
+    if not isinstance(definition, dict) or len(definition) != 1:
+        return []
+    kind, props = next(iter(definition.items()))
+    if not isinstance(props, dict):
+        return []
+    references = []
+    for field in ("child", "entryPointChild", "contentChild"):
+        if isinstance(props.get(field), str):
+            references.append((f"{kind}.{field}", props[field]))
+    children = props.get("children")
+    if isinstance(children, dict):
+        for i, child in enumerate(children.get("explicitList") or []):
+            if isinstance(child, str):
+                references.append((f"{kind}.children.explicitList[{i}]", child))
+        template = children.get("template")
+        if isinstance(template, dict) and isinstance(template.get("componentId"), str):
+            references.append(
+                (f"{kind}.children.template.componentId", template["componentId"])
+            )
+    for i, tab in enumerate(props.get("tabItems") or []):
+        if isinstance(tab, dict) and isinstance(tab.get("child"), str):
+            references.append((f"{kind}.tabItems[{i}].child", tab["child"]))
+    return references
+
+
+class _Surface:
+    def __init__(self):
+        self.root: str | None = None
+        self.components: dict[str, dict[str, Any]] = {}
+
+
+def validate_structure(messages: list[dict[str, Any]]) -> list[str]:
+    """
+    Checks the component graph of every surface in a response.
+
+    Returns:
+        A description of each problem found (at most MAX_ERRORS), or an empty
+        list if the response is structurally valid.
+    """
+    errors: list[str] = []
+    surfaces: dict[str, _Surface] = {}
+
+    for message in messages:
+        if "beginRendering" in message:
+            begin = message["beginRendering"]
+            surfaces.setdefault(begin.get("surfaceId"), _Surface()).root = begin.get("root")
+        elif "surfaceUpdate" in message:
+            update = message["surfaceUpdate"]
+            surface = surfaces.setdefault(update.get("surfaceId"), _Surface())
+            for component in update.get("components") or []:
+                component_id = component.get("id")
+                if component_id in surface.components:
+                    errors.append(
+                        f"surface '{update.get('surfaceId')}': component ID "
+                        f"'{component_id}' is used more than once"
+                    )
+                else:
+                    surface.components[component_id] = component
+
+    for surface_id, surface in surfaces.items():
+        _check_graph(surface_id, surface, errors)
+    return errors[:MAX_ERRORS]
+
+
+def _check_graph(surface_id: str, surface: _Surface, errors: list[str]) -> None:
+    components = surface.components
+    if surface.root is not None and surface.root not in components:
+        errors.append(
+            f"surface '{surface_id}': beginRendering.root '{surface.root}' is not "
+            "a component of the surface"
+        )
+        return
+
+    # Iterative depth-first search; a reference to a component still on the
+    # stack (state 1) is a cycle. Every component and reference is visited once.
+    state: dict[str, int] = {}
+    starts = [surface.root] if surface.root is not None else list(components)
+    for start in starts:
+        if start in state:
+            continue
+        state[start] = 1
+        stack = [(start, iter(component_references(components[start])))]
+        while stack:
+            component_id, references = stack[-1]
+            for field, target in references:
+                if target not in components:
+                    if surface.root is not None:
+                        errors.append(
+                            f"surface '{surface_id}': component '{component_id}' "
+                            f"{field} refers to unknown component '{target}'"
+                        )
+                    continue
+                if state.get(target) == 1:
+                    errors.append(
+                        f"surface '{surface_id}': component '{component_id}' "
+                        f"{field} refers to '{target}', which contains it (cycle)"
+                    )
+                    continue
+                if target not in state:
+                    state[target] = 1
+                    stack.append((target, iter(component_references(components[target]))))
+                    break
+            else:
+                state[component_id] = 2
+                stack.pop()
+
+    if surface.root is not None and len(state) < len(components):
+        unreachable = [component_id for component_id in components if component_id not in state]
+        shown = ", ".join(f"'{component_id}'" for component_id in unreachable[:5])
+        more = f" and {len(unreachable) - 5} more" if len(unreachable) > 5 else ""
+        noun, verb = ("component", "is") if len(unreachable) == 1 else ("components", "are")
+        errors.append(
+            f"surface '{surface_id}': {noun} {shown}{more} {verb} not reachable "
+            f"from the root '{surface.root}'"
+        )
+
+
+if __name__ == "__main__":
+    # Checks the example responses, then times the validator against the JSON
+    # schema on synthetic surfaces of increasing size. payload_bench.py has
+    # the full set of payload benchmarks.
+    import sys
+    import time
+
+    import jsonschema
+    from a2ui_schema import load_a2ui_schema
+    from payload_bench import synthetic_response
+    from ui_examples import load_ui_examples
+
+    for name, messages in load_ui_examples("http://localhost:10002").items():
+        problems = validate_structure(messages)
+        print(f"{name:32} {'ok' if not problems else problems}")
+
+    schema = {"type": "array", "items": load_a2ui_schema()}
+    print(f"\n{'components':>10} {'structure ms':>13} {'us/component':>13} {'schema ms':>10}")
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 50_000]
+    for size in sizes:
+        messages = synthetic_response(size, depth=8, data_entries=0)
+        started = time.perf_counter()
+        assert validate_structure(messages) == []
+        structure = time.perf_counter() - started
+        started = time.perf_counter()
+        jsonschema.validate(instance=messages, schema=schema)
+        schema_time = time.perf_counter() - started
+        print(
+            f"{size:>10} {structure * 1000:>13.1f} {structure / size * 1e6:>13.2f} "
+            f"{schema_time * 1000:>10.1f}"
+        )
@@ -0,0 +1,671 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# A front router that keeps every conversation on one worker process.
+#
+# Sessions, tasks, surface state and cached uploads live in the memory of the
+# worker that served them, so with several workers each turn of a
+# conversation must reach the worker that served the previous ones. With
+# session affinity on, `__main__` starts the workers as separate servers on
+# local ports and runs this router on the public port instead of sharing the
+# socket between them.
+#
+# A2A JSON-RPC calls are routed by their `contextId`:
+#   - a message without one is given a new one here (the server adopts the
+#     client's context ID), so its conversation is routed from its first turn;
+#   - calls naming only a task (`tasks/get`, `tasks/cancel`, ...) go where the
+#     task was created, learned from the responses that created it;
+#   - other requests (agent card, images, uploads) go to any worker, their
+#     bodies streamed through rather than buffered.
+# A worker that cannot be reached or fails mid-response is answered with 502.
+# Contexts are placed on a consistent hash ring of the workers, and each
+# conversation stays pinned to the worker that served its first turn. When a
+# worker is added, conversations in progress stay where they are and new ones
+# spread over every worker; only the conversations of a removed worker move.
+# A worker joins the ring once its `/ready` answers 200, so no conversation is
+# pinned to a worker that is still starting. A worker that exits is taken off
+# the ring, its conversations move to the others, and it is started again;
+# one that keeps exiting before it is ready is restarted with a growing delay.
+#
+# `GET /ready` is ready once every worker has joined the ring, `GET /metrics`
+# reports the router's and every worker's metrics, and `GET /router/workers`
+# lists the workers. `POST /router/workers` with `{"workers": N}` scales to N
+# workers, at most `MAX_WORKERS_PER_CPU` per CPU. `/router/workers` requires
+# the `X-Verdure-Router-Token` header when a token is configured, and is only
+# served to loopback clients otherwise.
+#
+# Configuration (environment):
+#   VERDURE_ROUTER_WORKER_PORT   Port of the first worker; the others follow
+#                                (default: the router's port + 1).
+#   VERDURE_ROUTER_MAX_CONTEXTS  Conversations (and tasks) whose worker is
+#                                remembered (default 100000).
+#   VERDURE_ROUTER_TOKEN         If set, `/router/workers` requests must carry
+#                                it in the `X-Verdure-Router-Token` header.
+
+import asyncio
+import bisect
+import hashlib
+import hmac
+import logging
+import os
+import subprocess
+import sys
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+import httpx
+import json_codec
+from config import env_int
+from metrics import metrics
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+logger = logging.getLogger(__name__)
+
+# Ring positions per worker; keeps each worker within ~10% of an even share.
+VIRTUAL_NODES = 160
+
+_HOP_BY_HOP_HEADERS = {
+    "connection",
+    "content-length",
+    "host",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Seconds between polls of a starting worker's /ready, and of worker liveness.
+READY_POLL_INTERVAL = 0.5
+SUPERVISE_INTERVAL = 1.0
+# A worker that exits before becoming ready is restarted after a delay that
+# doubles with each failed start, up to the maximum. After this many failed
+# starts in a row, each one is logged as an error.
+RESTART_BACKOFF_BASE = 1.0
+RESTART_BACKOFF_MAX = 60.0
+FAILED_STARTS_REPORTED = 5
+
+# Upper bound of `POST /router/workers`, per CPU.
+MAX_WORKERS_PER_CPU = 4
+
+ROUTER_TOKEN_HEADER = "x-verdure-router-token"
+_LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+# Bytes of a stream buffered while looking for its first event.
+MAX_FIRST_EVENT_BYTES = 1024 * 1024
+
+# JSON-RPC methods that carry a message, and those answered with an SSE stream.
+_MESSAGE_METHODS = {"message/send", "message/stream"}
+_STREAMING_METHODS = {"message/stream", "tasks/resubscribe"}
+
+
+def _event_end(data: bytes | bytearray) -> int | None:
+    """Returns where the first SSE event in `data` ends, if it is complete."""
+    ends = [
+        index + len(separator)
+        for separator in (b"\n\n", b"\r\n\r\n")
+        if (index := data.find(separator)) != -1
+    ]
+    return min(ends) if ends else None
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest())
+
+
+class HashRing:
+    """A consistent hash ring of worker IDs."""
+
+    def __init__(self, virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._positions: list[int] = []
+        self._nodes: list[str] = []
+
+    def add(self, node: str) -> None:
+        for i in range(self.virtual_nodes):
+            position = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._positions, position)
+            self._positions.insert(index, position)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        kept = [(p, n) for p, n in zip(self._positions, self._nodes) if n != node]
+        self._positions = [p for p, _ in kept]
+        self._nodes = [n for _, n in kept]
+
+    def node_for(self, key: str) -> str | None:
+        """Returns the node owning `key`: the first one clockwise of its hash."""
+        if not self._positions:
+            return None
+        index = bisect.bisect(self._positions, _hash(key)) % len(self._positions)
+        return self._nodes[index]
+
+
+class WorkerProcess:
+    """A server process listening on a local port."""
+
+    def __init__(self, worker_id: str, port: int, command: list[str], env: dict[str, str]):
+        self.id = worker_id
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.command = command
+        self.env = env
+        self.process: subprocess.Popen | None = None
+        # Set once the worker's /ready has answered 200; it is then on the ring.
+        self.ready = False
+        # Polls /ready while the worker starts.
+        self.joining: asyncio.Task | None = None
+        # Starts in a row that exited before the worker became ready, and the
+        # earliest (event loop) time it may be restarted.
+        self.failed_starts = 0
+        self.restart_at = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """Starts (or restarts) the process; blocking, so run it in a thread."""
+        self.process = subprocess.Popen(self.command, env=self.env)
+
+    def stop(self) -> None:
+        """Stops the process; blocking, so run it in a thread."""
+        if self.alive:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class _Pins:
+    """Maps recent keys to a worker (or context), least recently used forgotten first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def drop_value(self, value: str) -> int:
+        """Forgets every key mapped to `value`, returning how many there were."""
+        keys = [key for key, pinned in self._entries.items() if pinned == value]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class AffinityRouter:
+    """Starts the worker servers and routes requests to them by conversation."""
+
+    def __init__(
+        self,
+        worker_command: list[str],
+        base_port: int,
+        workers: int = 2,
+        max_contexts: int = 100_000,
+        token: str | None = None,
+    ):
+        # The worker's port is appended to the command.
+        self.worker_command = worker_command
+        self.base_port = base_port
+        self.initial_workers = workers
+        self.token = token
+        self.max_workers = (os.cpu_count() or 1) * MAX_WORKERS_PER_CPU
+        self.workers: dict[str, WorkerProcess] = {}
+        self.ring = HashRing()
+        self._contexts = _Pins(max_contexts)
+        # Task ID -> context ID, for calls that only name a task.
+        self._tasks = _Pins(max_contexts)
+        self._next_any = 0
+        self._client: httpx.AsyncClient | None = None
+        # Serializes scaling and restarts. The worker table and the ring are
+        # only changed on the event loop; process start and stop run in threads.
+        self._scaling = asyncio.Lock()
+        self._supervisor: asyncio.Task | None = None
+        metrics.register_gauge("router_workers", lambda: len(self.workers))
+        metrics.register_gauge(
+            "router_ready_workers",
+            lambda: sum(worker.ready for worker in list(self.workers.values())),
+        )
+        metrics.register_gauge("router_contexts", lambda: len(self._contexts))
+        metrics.register_gauge(
+            "router_down_workers",
+            lambda: sum(not worker.alive for worker in list(self.workers.values())),
+        )
+
+    @classmethod
+    def from_env(cls, worker_command: list[str], port: int, workers: int) -> "AffinityRouter":
+        return cls(
+            worker_command,
+            base_port=env_int("VERDURE_ROUTER_WORKER_PORT", port + 1),
+            workers=workers,
+            max_contexts=env_int("VERDURE_ROUTER_MAX_CONTEXTS", 100_000),
+            token=os.getenv("VERDURE_ROUTER_TOKEN") or None,
+        )
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(600.0, connect=5.0),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=100),
+        )
+        await self.scale_to(self.initial_workers)
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+        await self.scale_to(0)
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def scale_to(self, count: int) -> None:
+        """
+        Starts or stops workers until there are `count`.
+
+        Worker `i` always listens on `base_port + i`, so it takes the same
+        place on the ring after a restart. New workers join the ring once
+        they are ready.
+        """
+        async with self._scaling:
+            while len(self.workers) < count:
+                index = len(self.workers)
+                port = self.base_port + index
+                worker = WorkerProcess(
+                    f"worker-{index}", port, [*self.worker_command, str(port)], dict(os.environ)
+                )
+                self.workers[worker.id] = worker
+                await self._spawn(worker)
+            while len(self.workers) > count:
+                worker_id, worker = self.workers.popitem()
+                self._forget(worker)
+                await asyncio.to_thread(worker.stop)
+                logger.info(f"Stopped {worker_id}.")
+
+    async def _spawn(self, worker: WorkerProcess) -> None:
+        await asyncio.to_thread(worker.start)
+        worker.joining = asyncio.create_task(self._join_when_ready(worker))
+        logger.info(f"Started {worker.id} on port {worker.port}.")
+
+    async def _join_when_ready(self, worker: WorkerProcess) -> None:
+        """Adds a starting worker to the ring once its /ready answers 200."""
+        while worker.alive:
+            try:
+                response = await self._client.get(worker.url + "/ready", timeout=5.0)
+                if response.status_code == 200:
+                    worker.ready = True
+                    worker.failed_starts = 0
+                    worker.restart_at = 0.0
+                    self.ring.add(worker.id)
+                    logger.info(f"{worker.id} is ready and joined the ring.")
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(READY_POLL_INTERVAL)
+
+    def _forget(self, worker: WorkerProcess) -> None:
+        """Takes a worker off the ring and unpins its conversations."""
+        if worker.joining is not None:
+            worker.joining.cancel()
+            worker.joining = None
+        if worker.ready:
+            worker.ready = False
+            self.ring.remove(worker.id)
+        moved = self._contexts.drop_value(worker.id)
+        if moved:
+            metrics.inc("router_contexts_moved_total", moved)
+
+    async def _supervise(self) -> None:
+        """Restarts workers whose process has exited, backing off on failed starts."""
+        loop = asyncio.get_running_loop()
+
+        def due() -> list[WorkerProcess]:
+            return [
+                worker
+                for worker in self.workers.values()
+                if not worker.alive and loop.time() >= worker.restart_at
+            ]
+
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            if not due():
+                continue
+            async with self._scaling:
+                for worker in due():
+                    await self._restart(worker, loop.time())
+
+    async def _restart(self, worker: WorkerProcess, now: float) -> None:
+        status = worker.process.returncode if worker.process else None
+        if worker.ready:
+            worker.failed_starts = 0
+        else:
+            worker.failed_starts += 1
+            metrics.inc("router_worker_failed_starts_total", worker=worker.id)
+        self._forget(worker)
+        # Due if it exits again before becoming ready.
+        delay = (
+            min(RESTART_BACKOFF_BASE * 2 ** (worker.failed_starts - 1), RESTART_BACKOFF_MAX)
+            if worker.failed_starts
+            else 0.0
+        )
+        worker.restart_at = now + delay
+        if worker.failed_starts >= FAILED_STARTS_REPORTED:
+            logger.error(
+                f"{worker.id} exited with status {status} before becoming ready "
+                f"{worker.failed_starts} times in a row; restarting it, next attempt "
+                f"in {delay:.0f}s at the earliest."
+            )
+        else:
+            logger.warning(f"{worker.id} exited with status {status}, restarting it.")
+        metrics.inc("router_worker_restarts_total", worker=worker.id)
+        await self._spawn(worker)
+
+    def worker_for_context(self, context_id: str) -> WorkerProcess | None:
+        """Returns the worker of a conversation, pinning it on first use."""
+        worker = self.workers.get(self._contexts.get(context_id) or "")
+        if worker is not None and worker.ready and worker.alive:
+            return worker
+        while (worker_id := self.ring.node_for(context_id)) is not None:
+            worker = self.workers[worker_id]
+            if worker.alive:
+                self._contexts.set(context_id, worker.id)
+                return worker
+            # Exited since the last check; the supervisor restarts it.
+            self._forget(worker)
+        return None
+
+    def any_worker(self) -> WorkerProcess | None:
+        workers = [
+            worker for worker in self.workers.values() if worker.ready and worker.alive
+        ]
+        if not workers:
+            return None
+        self._next_any += 1
+        return workers[self._next_any % len(workers)]
+
+    def _route_rpc(self, call: Any) -> tuple[WorkerProcess | None, bool]:
+        """
+        Returns the worker for a JSON-RPC call and whether the call was changed.
+
+        A message without a context ID is given one. The worker is None while
+        no worker is ready.
+        """
+        params = call.get("params") if isinstance(call, dict) else None
+        if not isinstance(params, dict):
+            return self.any_worker(), False
+        if call.get("method") in _MESSAGE_METHODS and isinstance(params.get("message"), dict):
+            message = params["message"]
+            changed = False
+            if not message.get("contextId"):
+                task_context = self._tasks.get(message.get("taskId") or "")
+                message["contextId"] = task_context or str(uuid.uuid4())
+                changed = True
+            return self.worker_for_context(message["contextId"]), changed
+        task_id = params.get("id") or params.get("taskId")
+        context_id = self._tasks.get(task_id) if isinstance(task_id, str) else None
+        if context_id is None:
+            return self.any_worker(), False
+        return self.worker_for_context(context_id), False
+
+    def _learn_tasks(self, body: bytes) -> None:
+        """Remembers the context of the task in a JSON-RPC result or SSE event."""
+        for line in body.splitlines() or [body]:
+            line = line.removeprefix(b"data:").strip()
+            if not line.startswith(b"{"):
+                continue
+            try:
+                result = json_codec.loads(line).get("result")
+            except ValueError:
+                continue
+            if not isinstance(result, dict):
+                continue
+            task_id = result.get("taskId") or (
+                result.get("id") if result.get("kind") == "task" else None
+            )
+            if task_id and result.get("contextId"):
+                self._tasks.set(task_id, result["contextId"])
+                return
+
+    async def handle(self, request: Request) -> Response:
+        streaming = False
+        if request.method == "POST" and request.url.path == "/":
+            # Only JSON-RPC calls are read here, to route them; other bodies
+            # (uploads in particular) are streamed through to the worker.
+            body = await request.body()
+            try:
+                call = json_codec.loads(body)
+            except ValueError:
+                call = None
+            worker, changed = self._route_rpc(call)
+            if changed:
+                body = json_codec.dumps_bytes(call)
+            streaming = isinstance(call, dict) and call.get("method") in _STREAMING_METHODS
+            learn = isinstance(call, dict) and call.get("method") in _MESSAGE_METHODS
+            kind = "a2a"
+        else:
+            has_body = "content-length" in request.headers or (
+                "transfer-encoding" in request.headers
+            )
+            body = request.stream() if has_body else b""
+            worker, learn, kind = self.any_worker(), False, "other"
+        if worker is None:
+            metrics.inc("router_unavailable_total", kind=kind)
+            return JSONResponse({"error": "No worker is ready."}, status_code=503)
+        metrics.inc("router_requests_total", worker=worker.id, kind=kind)
+
+        headers = [
+            (name, value)
+            for name, value in request.headers.items()
+            if name.lower() not in _HOP_BY_HOP_HEADERS
+        ]
+        if not isinstance(body, bytes) and "content-length" in request.headers:
+            # Keeps a streamed body from being re-sent chunked.
+            headers.append(("content-length", request.headers["content-length"]))
+        upstream = self._client.build_request(
+            request.method,
+            worker.url + request.url.path,
+            params=request.query_params,
+            headers=headers,
+            content=body,
+        )
+        try:
+            response = await self._client.send(upstream, stream=True)
+            if not streaming:
+                try:
+                    content = await response.aread()
+                finally:
+                    await response.aclose()
+        except httpx.HTTPError as e:
+            logger.warning(f"{worker.id} failed to answer: {e!r}")
+            metrics.inc("router_upstream_errors_total", worker=worker.id)
+            if not worker.alive:
+                self._forget(worker)
+            return JSONResponse({"error": f"{worker.id} is unavailable."}, status_code=502)
+        response_headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in _HOP_BY_HOP_HEADERS
+        }
+
+        if not streaming:
+            if learn and response.status_code == 200:
+                self._learn_tasks(content)
+            return Response(content, response.status_code, response_headers)
+
+        async def relay():
+            # The first event names the task of a streamed message. It may
+            # arrive over several chunks, which are relayed as they come.
+            first_event = bytearray() if learn else None
+            async for chunk in response.aiter_raw():
+                if first_event is not None:
+                    first_event += chunk
+                    end = _event_end(first_event)
+                    if end is not None:
+                        self._learn_tasks(bytes(first_event[:end]))
+                        first_event = None
+                    elif len(first_event) > MAX_FIRST_EVENT_BYTES:
+                        first_event = None
+                yield chunk
+
+        return StreamingResponse(
+            relay(),
+            status_code=response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(response.aclose),
+        )
+
+    async def ready_endpoint(self, request: Request) -> JSONResponse:
+        reports = await self._gather("/ready")
+        # Ready once every worker has joined the ring, not merely answered.
+        workers = list(self.workers.values())
+        ready = bool(workers) and all(worker.ready for worker in workers)
+        return JSONResponse(
+            {
+                "status": "ready" if ready else "warming",
+                "workers": {worker_id: report for worker_id, (_, report) in reports.items()},
+            },
+            status_code=200 if ready else 503,
+        )
+
+    async def metrics_endpoint(self, request: Request) -> JSONResponse:
+        reports = await self._gather("/metrics")
+        return JSONResponse(
+            {
+                "router": metrics.snapshot(),
+                "workers": {worker_id: report for worker_id, (_, report) in reports.items()},
+            }
+        )
+
+    def _authorized(self, request: Request) -> bool:
+        """Whether a request may list or scale the workers."""
+        if self.token is None:
+            return request.client is not None and request.client.host in _LOOPBACK_HOSTS
+        value = request.headers.get(ROUTER_TOKEN_HEADER, "")
+        return hmac.compare_digest(value.encode(), self.token.encode())
+
+    async def workers_endpoint(self, request: Request) -> JSONResponse:
+        if not self._authorized(request):
+            return JSONResponse({"error": "forbidden"}, status_code=403)
+        if request.method == "POST":
+            try:
+                body = json_codec.loads(await request.body())
+            except ValueError as e:
+                return JSONResponse({"error": f"invalid JSON: {e}"}, status_code=400)
+            count = body.get("workers") if isinstance(body, dict) else None
+            if (
+                isinstance(count, bool)
+                or not isinstance(count, int)
+                or not 1 <= count <= self.max_workers
+            ):
+                return JSONResponse(
+                    {
+                        "error": "'workers' must be an integer between 1 and "
+                        f"{self.max_workers}."
+                    },
+                    status_code=400,
+                )
+            await self.scale_to(count)
+        return JSONResponse(
+            {
+                worker_id: {
+                    "port": worker.port,
+                    "pid": worker.process.pid if worker.process else None,
+                    "alive": worker.alive,
+                    "ready": worker.ready,
+                }
+                for worker_id, worker in self.workers.items()
+            }
+        )
+
+    async def _gather(self, path: str) -> dict[str, tuple[int, Any]]:
+        """GETs `path` from every worker, returning (status, JSON) per worker."""
+
+        async def one(worker: WorkerProcess) -> tuple[int, Any]:
+            try:
+                response = await self._client.get(worker.url + path, timeout=5.0)
+                return response.status_code, response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                return 503, {"status": "unreachable", "error": str(e)}
+
+        workers = list(self.workers.values())
+        results = await asyncio.gather(*(one(worker) for worker in workers))
+        return {worker.id: result for worker, result in zip(workers, results)}
+
+
+def create_router_app(router: AffinityRouter) -> Starlette:
+    """Returns the router's application, which starts and stops its workers."""
+    return Starlette(
+        routes=[
+            Route("/ready", router.ready_endpoint, methods=["GET"]),
+            Route("/metrics", router.metrics_endpoint, methods=["GET"]),
+            Route("/router/workers", router.workers_endpoint, methods=["GET", "POST"]),
+            Route(
+                "/{path:path}",
+                router.handle,
+                methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"],
+            ),
+        ],
+        on_startup=[router.start],
+        on_shutdown=[router.stop],
+    )
+
+
+def worker_command(**options: Any) -> list[str]:
+    """Returns the command starting one worker server with `options`, less its port."""
+    command = [sys.executable, os.path.dirname(os.path.abspath(__file__))]
+    for name, value in options.items():
+        command += [f"--{name.replace('_', '-')}", str(value)]
+    command += ["--host", "127.0.0.1", "--workers", "1", "--no-session-affinity"]
+    return [*command, "--port"]
+
+
+if __name__ == "__main__":
+    # How evenly the ring spreads conversations, and how many move when a
+    # worker is added: pinned conversations stay, and hashing alone moves
+    # about 1/N of them.
+    contexts = [str(uuid.uuid4()) for _ in range(100_000)]
+    for workers in (2, 4, 8):
+        ring = HashRing()
+        for i in range(workers):
+            ring.add(f"worker-{i}")
+        before = [ring.node_for(context) for context in contexts]
+        counts = [before.count(f"worker-{i}") for i in range(workers)]
+        ring.add(f"worker-{workers}")
+        moved = sum(a != ring.node_for(c) for a, c in zip(before, contexts))
+        print(
+            f"{workers} workers: {min(counts)}-{max(counts)} contexts per worker "
+            f"(ideal {len(contexts) // workers}); adding one moves {moved / len(contexts):.1%} "
+            f"by hash (ideal {1 / (workers + 1):.1%}), 0% once pinned"
+        )
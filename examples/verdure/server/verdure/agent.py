@@ -12,31 +12,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import json
 import logging
-import os
+import time
+import uuid
 from collections.abc import AsyncIterable
+from contextlib import aclosing
 from typing import Any
 
-import jsonschema
-
 # --- IMPORT MODIFICATION ---
-from a2ui_schema import A2UI_SCHEMA
+from a2ui_schema import load_a2ui_schema
+from config import env_flag, env_float, env_int
+from fake_llm import FakeLlm, match_recorded_response
 from google.adk.agents.llm_agent import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.artifacts import InMemoryArtifactService
+from google.adk.events import Event, EventActions
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
+from hedging import HedgingPolicy
+from http_pool import PooledLiteLLMClient, get_shared_pool
+from metrics import metrics
+from model_router import ROUTED_MODEL_STATE_KEY, ModelRouter, route_model_callback
+from opentelemetry import trace
 from prompt_builder import (
     get_text_prompt,
     get_ui_prompt,
 )
+from questionnaire_cache import prompt_version
 
 # --- END MODIFICATION ---
+from structured_output import (
+    build_response_schema,
+    get_response_format,
+    to_delimited_response,
+)
+from text_stream import DelimitedTextStream
 from tools import get_landscape_options
-from ui_examples import LANDSCAPE_UI_EXAMPLES
+from tracing import tracer
+from ui_examples import LANDSCAPE_UI_EXAMPLES, load_ui_examples
+from usage import USAGE_STATE_KEY, TokenUsage, add_turn
+from validation_pool import check_response_json, shared_validation_pool
 
 logger = logging.getLogger(__name__)
 
@@ -71,29 +91,90 @@ AGENT_INSTRUCTION = """
 """
 
 
+def _record_runner_event(event) -> None:
+    """Adds a runner event to the current attempt's span."""
+    span = trace.get_current_span()
+    if not span.is_recording():
+        return
+    attributes = {"author": event.author or "", "final": event.is_final_response()}
+    calls = [call.name for call in event.get_function_calls()]
+    responses = [response.name for response in event.get_function_responses()]
+    if calls:
+        attributes["function_calls"] = calls
+    if responses:
+        attributes["function_responses"] = responses
+    span.add_event("runner.event", attributes)
+
+
+# The span recorded for each stage of a response check.
+_CHECK_STAGE_SPANS = {
+    "parse": "agent.parse_json",
+    "schema": "agent.validate_schema",
+    "structure": "agent.validate_structure",
+}
+
+
+def _record_check_stages(timings: dict[str, tuple[int, int]]) -> None:
+    """
+    Adds the stages of a response check as child spans of the current span.
+
+    The stages may have run in a pool worker, so their spans are recorded
+    afterwards with the times the check measured.
+    """
+    for stage, (start, end) in timings.items():
+        span = tracer.start_span(_CHECK_STAGE_SPANS[stage], start_time=start)
+        span.end(end_time=end)
+
+
+def _event_text(event) -> str:
+    """Returns the text of a runner event, or "" if it has none."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text or "" for part in event.content.parts)
+
+
 class LandscapeAgent:
     """An agent that helps design landscapes based on user criteria."""
 
     SUPPORTED_CONTENT_TYPES = ["text", "text/plain"]
 
-    def __init__(self, base_url: str, use_ui: bool = False):
+    def __init__(
+        self,
+        base_url: str,
+        use_ui: bool = False,
+        structured_output: bool | None = None,
+    ):
         self.base_url = base_url
         self.use_ui = use_ui
-        self._agent = self._build_agent(use_ui)
-        self._user_id = "remote_agent"
-        self._runner = Runner(
-            app_name=self._agent.name,
-            agent=self._agent,
-            artifact_service=InMemoryArtifactService(),
-            session_service=InMemorySessionService(),
-            memory_service=InMemoryMemoryService(),
+        # Schema-constrained decoding only applies to UI responses.
+        if structured_output is None:
+            structured_output = env_flag("VERDURE_STRUCTURED_OUTPUT")
+        self.structured_output = use_ui and structured_output
+        self.router = ModelRouter.from_env()
+        self.hedging = HedgingPolicy.from_env()
+        # Tokens a conversation may spend before it is degraded; 0 is unlimited.
+        self.token_budget = env_int("VERDURE_SESSION_TOKEN_BUDGET", 0)
+        # Checks large UI responses off the event loop, see validation_pool.py.
+        self.validation_pool = shared_validation_pool() if use_ui else None
+        # Streams response text as it is generated, see text_stream.py.
+        self.stream_text = (
+            env_flag("VERDURE_STREAM_TEXT")
+            and not self.structured_output
+            and self.hedging is None
         )
+        self._run_config = (
+            RunConfig(streaming_mode=StreamingMode.SSE) if self.stream_text else None
+        )
+        self._examples: dict | None = None
+        self._user_id = "remote_agent"
+        # Forked session id -> number of events copied from its source.
+        self._fork_points: dict[str, int] = {}
 
         # --- MODIFICATION: Wrap the schema ---
         # Load the A2UI_SCHEMA string into a Python object for validation
         try:
             # First, load the schema for a *single message*
-            single_message_schema = json.loads(A2UI_SCHEMA)
+            single_message_schema = load_a2ui_schema()
 
             # The prompt instructs the LLM to return a *list* of messages.
             # Therefore, our validation schema must be an *array* of the single message schema.
@@ -104,32 +185,132 @@ class LandscapeAgent:
         except json.JSONDecodeError as e:
             logger.error(f"CRITICAL: Failed to parse A2UI_SCHEMA: {e}")
             self.a2ui_schema_object = None
+            self.structured_output = False
         # --- END MODIFICATION ---
 
+        self._agent = self._build_agent(use_ui)
+        self._runner = Runner(
+            app_name=self._agent.name,
+            agent=self._agent,
+            artifact_service=InMemoryArtifactService(),
+            session_service=InMemorySessionService(),
+            memory_service=InMemoryMemoryService(),
+        )
+
     def get_processing_message(self) -> str:
         return "Designing your landscape options..."
 
+    def get_event_message(self, event) -> str:
+        """Returns the progress message for an intermediate runner event."""
+        calls = event.get_function_calls()
+        if calls:
+            # get_landscape_options -> "Looking up landscape options..."
+            subject = calls[0].name.removeprefix("get_").replace("_", " ")
+            return f"Looking up {subject}..."
+        return self.get_processing_message()
+
+    def _response_mode(self) -> str:
+        """Labels metrics by how the model is asked to format its response."""
+        if not self.use_ui:
+            return "text"
+        return "structured" if self.structured_output else "delimited"
+
+    def _build_model(self, model_name: str):
+        """Builds the model client, using the offline fake model for `fake*` names."""
+        if model_name.startswith("fake"):
+            return FakeLlm(
+                model=model_name,
+                base_url=self.base_url,
+                structured_output=self.structured_output,
+                latency=env_float("VERDURE_FAKE_LATENCY", 0.0),
+                slow_rate=env_float("VERDURE_FAKE_SLOW_RATE", 0.0),
+                slow_latency=env_float("VERDURE_FAKE_SLOW_LATENCY", 0.0),
+                invalid_rate=env_float("VERDURE_FAKE_INVALID_RATE", 0.0),
+                token_delay=env_float("VERDURE_FAKE_TOKEN_DELAY", 0.0),
+            )
+
+        if self.structured_output:
+            # Let the provider constrain decoding to the response schema, with
+            # the conversational text carried in its own field.
+            response_schema = build_response_schema(self.a2ui_schema_object["items"])
+            return LiteLlm(
+                model=model_name,
+                llm_client=PooledLiteLLMClient(get_shared_pool()),
+                response_format=get_response_format(response_schema),
+            )
+
+        # Every model client shares one keep-alive connection pool.
+        return LiteLlm(
+            model=model_name, llm_client=PooledLiteLLMClient(get_shared_pool())
+        )
+
     def _build_agent(self, use_ui: bool) -> LlmAgent:
         """Builds the LLM agent for the landscape agent."""
-        LITELLM_MODEL = os.getenv("LITELLM_MODEL", "gemini-2.5-flash")
+        LITELLM_MODEL = self.router.default_model
 
         if use_ui:
             # Construct the full prompt with UI instructions, examples, and schema
             instruction = AGENT_INSTRUCTION + get_ui_prompt(
-                self.base_url, LANDSCAPE_UI_EXAMPLES
+                self.base_url,
+                LANDSCAPE_UI_EXAMPLES,
+                structured_output=self.structured_output,
             )
         else:
             instruction = get_text_prompt()
+        # Identifies cached responses generated with this prompt.
+        self.prompt_version = prompt_version(instruction)
 
         return LlmAgent(
-            model=LiteLlm(model=LITELLM_MODEL),
+            model=self._build_model(LITELLM_MODEL),
             name="landscape_agent",
             description="An agent that helps design landscapes.",
             instruction=instruction,
             tools=[get_landscape_options],
+            # Applies the per-turn model chosen by the router.
+            before_model_callback=route_model_callback,
+        )
+
+    async def fork_session(self, session_id: str, fork_id: str) -> None:
+        """
+        Creates session `fork_id` as a copy of `session_id`'s state and history.
+
+        Turns run on a fork do not touch the original conversation until the
+        fork is adopted, so they can be generated ahead of time or in parallel.
+        """
+        session_service = self._runner.session_service
+        source = await session_service.get_session(
+            app_name=self._agent.name, user_id=self._user_id, session_id=session_id
+        )
+        fork = await session_service.create_session(
+            app_name=self._agent.name,
+            user_id=self._user_id,
+            state=dict(source.state) if source else {"base_url": self.base_url},
+            session_id=fork_id,
+        )
+        for event in source.events if source else []:
+            await session_service.append_event(fork, event.model_copy(deep=True))
+        self._fork_points[fork_id] = len(fork.events)
+
+    async def adopt_fork(self, session_id: str, fork_id: str) -> None:
+        """Appends the turns generated on a fork to `session_id` and drops the fork."""
+        session_service = self._runner.session_service
+        fork = await session_service.get_session(
+            app_name=self._agent.name, user_id=self._user_id, session_id=fork_id
+        )
+        session = await self._get_or_create_session(session_id)
+        fork_point = self._fork_points.get(fork_id, 0)
+        for event in fork.events[fork_point:] if fork else []:
+            await session_service.append_event(session, event)
+        await self.discard_fork(fork_id)
+
+    async def discard_fork(self, fork_id: str) -> None:
+        """Deletes a forked session without keeping its turns."""
+        self._fork_points.pop(fork_id, None)
+        await self._runner.session_service.delete_session(
+            app_name=self._agent.name, user_id=self._user_id, session_id=fork_id
         )
 
-    async def stream(self, query, session_id, image_part=None) -> AsyncIterable[dict[str, Any]]:
+    async def _get_or_create_session(self, session_id: str):
         session_state = {"base_url": self.base_url}
 
         session = await self._runner.session_service.get_session(
@@ -146,11 +327,333 @@ class LandscapeAgent:
             )
         elif "base_url" not in session.state:
             session.state["base_url"] = self.base_url
+        return session
+
+    async def _record_turn_usage(
+        self, session, action: str, used: TokenUsage, wasted: TokenUsage
+    ) -> None:
+        """Adds the tokens of a turn to the conversation totals in its session state."""
+        metrics.observe(
+            "agent_turn_tokens", used.total_tokens, mode=self._response_mode(), action=action
+        )
+        if not used.model_calls:
+            return
+        totals = add_turn(session.state.get(USAGE_STATE_KEY), action, used, wasted)
+        await self._runner.session_service.append_event(
+            session,
+            Event(
+                author=self._agent.name,
+                actions=EventActions(state_delta={USAGE_STATE_KEY: totals}),
+            ),
+        )
+
+    async def record_cached_turn(self, session_id: str, query: str, content: str) -> None:
+        """
+        Adds a turn answered from a cache to the conversation history.
+
+        The model sees the query and the response in later turns as if it had
+        generated the response itself.
+        """
+        session = await self._get_or_create_session(session_id)
+        session_service = self._runner.session_service
+        await session_service.append_event(
+            session,
+            Event(
+                author="user",
+                content=types.Content(role="user", parts=[types.Part.from_text(text=query)]),
+            ),
+        )
+        await session_service.append_event(
+            session,
+            Event(
+                author=self._agent.name,
+                content=types.Content(role="model", parts=[types.Part.from_text(text=content)]),
+            ),
+        )
+
+    async def over_budget(self, session_id: str) -> bool:
+        """Returns True once a conversation has spent its token budget."""
+        if not self.token_budget:
+            return False
+        session = await self._runner.session_service.get_session(
+            app_name=self._agent.name, user_id=self._user_id, session_id=session_id
+        )
+        totals = session.state.get(USAGE_STATE_KEY) if session else None
+        return bool(totals) and totals["total_tokens"] >= self.token_budget
+
+    def cached_response(self, query: str) -> str | None:
+        """
+        Returns the template response recorded for a query, without a model call.
+
+        Only the UI agent has templates, and only for the steps of the flow;
+        anything else returns None.
+        """
+        recorded = match_recorded_response(query) if self.use_ui else None
+        if recorded is None:
+            return None
+        _, example_name, text = recorded
+        return to_delimited_response(text, self.load_examples()[example_name])
+
+    def load_examples(self) -> dict[str, list[dict[str, Any]]]:
+        """Returns the UI templates with this server's base URL, parsed once."""
+        if self._examples is None:
+            self._examples = load_ui_examples(self.base_url)
+        return self._examples
+
+    async def prime(self) -> None:
+        """
+        Runs a greeting turn on a throwaway session.
+
+        This loads what the first model call loads lazily and lets the
+        provider cache the prompt, before the first user arrives.
+        """
+        session_id = f"warmup:{uuid.uuid4().hex}"
+        try:
+            async with aclosing(self.stream("hi", session_id)) as stream:
+                async for _ in stream:
+                    pass
+        finally:
+            await self._runner.session_service.delete_session(
+                app_name=self._agent.name, user_id=self._user_id, session_id=session_id
+            )
+
+    async def _run_candidate(
+        self,
+        session_id: str,
+        fork_id: str,
+        message: types.Content,
+        model: str,
+        attempt: int,
+        usage: TokenUsage,
+    ) -> tuple[str | None, tuple[str, str | None, list | None] | None]:
+        """Runs one model call on a fork of `session_id` and validates its response."""
+        await self.fork_session(session_id, fork_id)
+        final_response_content = None
+        async with aclosing(
+            self._runner.run_async(
+                user_id=self._user_id,
+                session_id=fork_id,
+                new_message=message.model_copy(deep=True),
+                state_delta={ROUTED_MODEL_STATE_KEY: model},
+            )
+        ) as events:
+            async for event in events:
+                usage.add_event(event)
+                if event.is_final_response():
+                    if event.content and event.content.parts:
+                        final_response_content = "\n".join(
+                            [p.text for p in event.content.parts if p.text]
+                        ) or None
+                    break
+        if final_response_content is None:
+            return None, None
+        return final_response_content, await self._validate_response(
+            final_response_content, attempt
+        )
+
+    async def _hedged_call(
+        self,
+        session_id: str,
+        message: types.Content,
+        model: str,
+        action_label: str,
+        attempt: int,
+        usage: TokenUsage,
+        discarded: TokenUsage,
+    ) -> tuple[str | None, tuple[str, str | None, list | None] | None]:
+        """
+        Runs one model call, hedged with an identical call if it is slow.
+
+        The first call to finish with a valid response wins; its events are
+        added to the session and the other call is cancelled. The tokens of
+        every call are added to `usage`, and those of the losers to `discarded`.
+
+        Returns:
+            The winning final response content and its validation result.
+        """
+        threshold = self.hedging.threshold(model, action_label)
+        self.hedging.budget.record_request()
+        candidates: dict[asyncio.Task, str] = {}
+        usages: dict[asyncio.Task, TokenUsage] = {}
+
+        def launch() -> asyncio.Task:
+            fork_id = f"{session_id}:hedge:{uuid.uuid4().hex}"
+            candidate_usage = TokenUsage()
+            task = asyncio.create_task(
+                self._run_candidate(
+                    session_id, fork_id, message, model, attempt, candidate_usage
+                )
+            )
+            candidates[task] = fork_id
+            usages[task] = candidate_usage
+            return task
+
+        started = time.monotonic()
+        pending = {launch()}
+        winner = fallback = None
+        error = None
+        try:
+            while pending and winner is None:
+                timeout = None
+                if threshold is not None:
+                    timeout = max(0.0, threshold - (time.monotonic() - started))
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if self.hedging.budget.try_acquire():
+                        logger.info(
+                            f"--- LandscapeAgent.stream: No response after {threshold:.2f}s, "
+                            "sending a hedged request. ---"
+                        )
+                        metrics.inc("agent_hedges_total", model=model)
+                        pending.add(launch())
+                    else:
+                        metrics.inc("agent_hedges_denied_total", model=model)
+                    threshold = None
+                    continue
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    content, validation = task.result()
+                    if content is not None and validation[1] is None:
+                        winner = task
+                        break
+                    fallback = fallback or task
+        finally:
+            chosen = winner or fallback
+            losers = [task for task in candidates if task is not chosen]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+            for task in losers:
+                await self.discard_fork(candidates[task])
+            for task, candidate_usage in usages.items():
+                usage.add(candidate_usage)
+                if task is not chosen:
+                    discarded.add(candidate_usage)
+
+        if chosen is None:
+            raise error
+        if len(candidates) > 1:
+            is_hedge = chosen is not next(iter(candidates))
+            metrics.inc(
+                "agent_hedge_wins_total",
+                model=model,
+                winner="hedge" if is_hedge else "primary",
+            )
+        await self.adopt_fork(session_id, candidates[chosen])
+        return chosen.result()
+
+    async def _validate_response(
+        self, final_response_content: str, attempt: int
+    ) -> tuple[str, str | None, list | None]:
+        """
+        Checks a final response against the A2UI schema.
+
+        Large responses are checked in the validation pool, if one is
+        configured, so they do not hold up the event loop.
+
+        Returns:
+            The response in the delimited format the executor expects, an
+            error message if the response is invalid, and the parsed a2ui
+            messages of a valid UI response (so they are not parsed again).
+        """
+        if self.use_ui:
+            logger.info(
+                f"--- LandscapeAgent.stream: Validating UI response (Attempt {attempt})... ---"
+            )
+            try:
+                if self.structured_output:
+                    # 1. The whole response is one JSON object.
+                    json_string_cleaned = final_response_content
+                else:
+                    if "---a2ui_JSON---" not in final_response_content:
+                        raise ValueError("Delimiter '---a2ui_JSON---' not found.")
+
+                    _, json_string = final_response_content.split(
+                        "---a2ui_JSON---", 1
+                    )
+
+                    if not json_string.strip():
+                        raise ValueError("JSON part is empty.")
+
+                    json_string_cleaned = (
+                        json_string.strip().lstrip("```json").rstrip("```").strip()
+                    )
+
+                    if not json_string_cleaned:
+                        raise ValueError("Cleaned JSON string is empty.")
+            except ValueError as e:
+                error = str(e)
+            else:
+                # 2. Parse it, validate it against the A2UI_SCHEMA and check
+                # its component tree.
+                pooled = (
+                    self.validation_pool is not None
+                    and len(json_string_cleaned) > self.validation_pool.inline_bytes
+                )
+                with tracer.start_as_current_span(
+                    "agent.validate_response",
+                    attributes={
+                        "verdure.bytes": len(json_string_cleaned),
+                        "verdure.pooled": pooled,
+                    },
+                ):
+                    if self.validation_pool is not None:
+                        parsed_json_data, structured_text, error, timings = (
+                            await self.validation_pool.check(
+                                json_string_cleaned, self.structured_output
+                            )
+                        )
+                    else:
+                        parsed_json_data, structured_text, error, timings = (
+                            check_response_json(
+                                json_string_cleaned, self.structured_output
+                            )
+                        )
+                    _record_check_stages(timings)
+
+            if error is None:
+                logger.info(
+                    f"--- LandscapeAgent.stream: UI JSON successfully parsed AND validated against schema. "
+                    f"Validation OK (Attempt {attempt}). ---"
+                )
+                if self.structured_output:
+                    # Hand the executor the same delimited format as free-text mode.
+                    final_response_content = to_delimited_response(
+                        structured_text, parsed_json_data
+                    )
+                return final_response_content, None, parsed_json_data
+
+            logger.warning(
+                f"--- LandscapeAgent.stream: A2UI validation failed: {error} (Attempt {attempt}) ---"
+            )
+            logger.warning(
+                f"--- Failed response content: {final_response_content[:500]}... ---"
+            )
+            return final_response_content, f"Validation failed: {error}.", None
+
+        # Not using UI, so text is always "valid"
+        return final_response_content, None, None
+
+    async def stream(
+        self, query, session_id, image_part=None, action=None
+    ) -> AsyncIterable[dict[str, Any]]:
+        session = await self._get_or_create_session(session_id)
 
         # --- Begin: UI Validation and Retry Logic ---
         max_retries = 1  # Total 2 attempts
         attempt = 0
         current_query_text = query
+        mode = self._response_mode()
+        turn_started = time.monotonic()
+        model = self.router.model_for(action, has_image=image_part is not None)
+        action_label = action or "text"
+        # Every token spent on this turn, and those spent on discarded responses.
+        turn_used = TokenUsage()
+        turn_wasted = TokenUsage()
 
         # Ensure schema was loaded
         if self.use_ui and self.a2ui_schema_object is None:
@@ -173,138 +676,180 @@ class LandscapeAgent:
                 f"--- LandscapeAgent.stream: Attempt {attempt}/{max_retries + 1} "
                 f"for session {session_id} ---"
             )
-
-            parts = [types.Part.from_text(text=current_query_text)]
-            if image_part:
-                if image_part.bytes_data:
-                    logger.info(f"Adding image bytes to message")
-                    parts.append(
-                        types.Part.from_bytes(
-                            data=image_part.bytes_data,
-                            mime_type=image_part.mime_type or "image/jpeg",
+            metrics.inc("agent_attempts_total", mode=mode, model=model)
+            if attempt > 1:
+                metrics.inc("agent_retries_total", mode=mode, model=model)
+                # The previous response failed validation (or never came).
+                yield {"is_task_complete": False, "updates": "Reworking the design..."}
+            # The final yield happens outside the span, so the executor's
+            # status update is not attributed to the attempt.
+            with tracer.start_as_current_span(
+                "agent.attempt",
+                attributes={
+                    "verdure.attempt": attempt,
+                    "verdure.model": model,
+                    "verdure.action": action_label,
+                },
+            ) as span:
+                attempt_started = time.monotonic()
+
+                parts = [types.Part.from_text(text=current_query_text)]
+                if image_part:
+                    # A stored upload is read from disk on the first attempt.
+                    image_bytes = await asyncio.to_thread(image_part.read_bytes)
+                    if image_bytes:
+                        logger.info(f"Adding image bytes to message")
+                        parts.append(
+                            types.Part.from_bytes(
+                                data=image_bytes,
+                                mime_type=image_part.mime_type or "image/jpeg",
+                            )
                         )
-                    )
-                else:
-                    logger.info(f"Adding image URL to message: {image_part.url}")
-                    parts.append(
-                        types.Part.from_uri(
-                            file_uri=image_part.url,
-                            mime_type=image_part.mime_type or "image/jpeg",
+                    else:
+                        logger.info(f"Adding image URL to message: {image_part.url}")
+                        parts.append(
+                            types.Part.from_uri(
+                                file_uri=image_part.url,
+                                mime_type=image_part.mime_type or "image/jpeg",
+                            )
                         )
-                    )
 
-            current_message = types.Content(role="user", parts=parts)
-            final_response_content = None
+                current_message = types.Content(role="user", parts=parts)
+                final_response_content = None
+                validation = None
+                used = TokenUsage()
+                # Tokens of hedged calls that lost to another call.
+                discarded = TokenUsage()
 
-            async for event in self._runner.run_async(
-                user_id=self._user_id,
-                session_id=session.id,
-                new_message=current_message,
-            ):
-                logger.info(f"Event from runner: {event}")
-                if event.is_final_response():
-                    if (
-                        event.content
-                        and event.content.parts
-                        and event.content.parts[0].text
-                    ):
-                        final_response_content = "\n".join(
-                            [p.text for p in event.content.parts if p.text]
-                        )
-                    break  # Got the final response, stop consuming events
-                else:
-                    logger.info(f"Intermediate event: {event}")
-                    # Yield intermediate updates on every attempt
+                if self.hedging is not None:
+                    # Hedged calls run on forked sessions and only the winner's
+                    # events are kept, so there are no intermediate events to relay.
                     yield {
                         "is_task_complete": False,
                         "updates": self.get_processing_message(),
                     }
-
-            if final_response_content is None:
-                logger.warning(
-                    f"--- LandscapeAgent.stream: Received no final response content from runner "
-                    f"(Attempt {attempt}). ---"
-                )
-                if attempt <= max_retries:
-                    current_query_text = (
-                        "I received no response. Please try again."
-                        f"Please retry the original request: '{query}'"
+                    final_response_content, validation = await self._hedged_call(
+                        session.id,
+                        current_message,
+                        model,
+                        action_label,
+                        attempt,
+                        used,
+                        discarded,
                     )
-                    continue  # Go to next retry
                 else:
-                    # Retries exhausted on no-response
-                    final_response_content = "I'm sorry, I encountered an error and couldn't process your request."
-                    # Fall through to send this as a text-only error
-
-            is_valid = False
-            error_message = ""
-
-            if self.use_ui:
-                logger.info(
-                    f"--- LandscapeAgent.stream: Validating UI response (Attempt {attempt})... ---"
+                    # Closing the runner's generator explicitly (rather than leaving it
+                    # to garbage collection) aborts the in-flight model call as soon as
+                    # we stop consuming events, including when the turn is cancelled.
+                    text_stream = DelimitedTextStream() if self.stream_text else None
+                    async with aclosing(
+                        self._runner.run_async(
+                            user_id=self._user_id,
+                            session_id=session.id,
+                            new_message=current_message,
+                            state_delta={ROUTED_MODEL_STATE_KEY: model},
+                            run_config=self._run_config,
+                        )
+                    ) as events:
+                        async for event in events:
+                            if event.partial:
+                                # A streamed chunk; the complete response
+                                # follows as a final event.
+                                if text_stream is not None and text_stream.feed(
+                                    _event_text(event)
+                                ) and text_stream.text.strip():
+                                    yield {
+                                        "is_task_complete": False,
+                                        "updates": text_stream.text.strip(),
+                                        "streaming": True,
+                                    }
+                                continue
+                            logger.info(f"Event from runner: {event}")
+                            _record_runner_event(event)
+                            used.add_event(event)
+                            if event.is_final_response():
+                                if (
+                                    event.content
+                                    and event.content.parts
+                                    and event.content.parts[0].text
+                                ):
+                                    final_response_content = "\n".join(
+                                        [p.text for p in event.content.parts if p.text]
+                                    )
+                                break  # Got the final response, stop consuming events
+                            else:
+                                logger.info(f"Intermediate event: {event}")
+                                if text_stream is not None:
+                                    # The next model call streams a new text.
+                                    text_stream = DelimitedTextStream()
+                                # Yield intermediate updates on every attempt;
+                                # the executor coalesces repeated ones.
+                                yield {
+                                    "is_task_complete": False,
+                                    "updates": self.get_event_message(event),
+                                }
+
+                metrics.observe(
+                    "agent_attempt_latency_seconds",
+                    time.monotonic() - attempt_started,
+                    model=model,
+                    action=action_label,
                 )
-                try:
-                    if "---a2ui_JSON---" not in final_response_content:
-                        raise ValueError("Delimiter '---a2ui_JSON---' not found.")
+                used.record(model, action_label)
+                turn_used.add(used)
+                span.set_attribute("verdure.input_tokens", used.input_tokens)
+                span.set_attribute("verdure.output_tokens", used.output_tokens)
 
-                    text_part, json_string = final_response_content.split(
-                        "---a2ui_JSON---", 1
-                    )
-
-                    if not json_string.strip():
-                        raise ValueError("JSON part is empty.")
-
-                    json_string_cleaned = (
-                        json_string.strip().lstrip("```json").rstrip("```").strip()
-                    )
-
-                    if not json_string_cleaned:
-                        raise ValueError("Cleaned JSON string is empty.")
-
-                    # --- New Validation Steps ---
-                    # 1. Check if it's parsable JSON
-                    parsed_json_data = json.loads(json_string_cleaned)
-
-                    # 2. Check if it validates against the A2UI_SCHEMA
-                    # This will raise jsonschema.exceptions.ValidationError if it fails
-                    logger.info(
-                        "--- LandscapeAgent.stream: Validating against A2UI_SCHEMA... ---"
-                    )
-                    jsonschema.validate(
-                        instance=parsed_json_data, schema=self.a2ui_schema_object
-                    )
-                    # --- End New Validation Steps ---
-
-                    logger.info(
-                        f"--- LandscapeAgent.stream: UI JSON successfully parsed AND validated against schema. "
-                        f"Validation OK (Attempt {attempt}). ---"
-                    )
-                    is_valid = True
-
-                except (
-                    ValueError,
-                    json.JSONDecodeError,
-                    jsonschema.exceptions.ValidationError,
-                ) as e:
+                if final_response_content is None:
                     logger.warning(
-                        f"--- LandscapeAgent.stream: A2UI validation failed: {e} (Attempt {attempt}) ---"
+                        f"--- LandscapeAgent.stream: Received no final response content from runner "
+                        f"(Attempt {attempt}). ---"
                     )
-                    logger.warning(
-                        f"--- Failed response content: {final_response_content[:500]}... ---"
+                    if attempt <= max_retries:
+                        used.record_wasted(model, action_label)
+                        turn_wasted.add(used)
+                        current_query_text = (
+                            "I received no response. Please try again."
+                            f"Please retry the original request: '{query}'"
+                        )
+                        model = self.router.fallback_for(model)
+                        continue  # Go to next retry
+                    else:
+                        # Retries exhausted on no-response
+                        final_response_content = "I'm sorry, I encountered an error and couldn't process your request."
+                        # Fall through to send this as a text-only error
+
+                if validation is None:
+                    validation = await self._validate_response(
+                        final_response_content, attempt
                     )
-                    error_message = f"Validation failed: {e}."
-
-            else:  # Not using UI, so text is always "valid"
-                is_valid = True
+                final_response_content, error_message, a2ui_messages = validation
+                is_valid = error_message is None
+                span.set_attribute("verdure.valid", is_valid)
+                # An invalid response is thrown away, hedged calls that lost
+                # always are.
+                wasted = discarded if is_valid else used
+                wasted.record_wasted(model, action_label)
+                turn_wasted.add(wasted)
 
             if is_valid:
                 logger.info(
                     f"--- LandscapeAgent.stream: Response is valid. Sending final response (Attempt {attempt}). ---"
                 )
                 logger.info(f"Final response: {final_response_content}")
+                metrics.observe(
+                    "agent_turn_latency_seconds",
+                    time.monotonic() - turn_started,
+                    mode=mode,
+                    action=action_label,
+                )
+                await self._record_turn_usage(session, action_label, turn_used, turn_wasted)
                 yield {
                     "is_task_complete": True,
                     "content": final_response_content,
+                    # Already parsed and validated; the executor uses these
+                    # instead of parsing the content again.
+                    "a2ui_messages": a2ui_messages,
                 }
                 return  # We're done, exit the generator
 
@@ -315,19 +860,39 @@ class LandscapeAgent:
                     f"--- LandscapeAgent.stream: Retrying... ({attempt}/{max_retries + 1}) ---"
                 )
                 # Prepare the query for the retry
+                if self.structured_output:
+                    format_hint = (
+                        "The response MUST be a JSON object with a `text` field and an "
+                        "`a2ui` field holding a JSON list of A2UI messages. "
+                    )
+                else:
+                    format_hint = (
+                        "The response MUST be a JSON list of A2UI messages. "
+                        "Ensure the response is split by '---a2ui_JSON---' and the JSON part is well-formed. "
+                    )
                 current_query_text = (
                     f"Your previous response was invalid. {error_message} "
                     "You MUST generate a valid response that strictly follows the A2UI JSON SCHEMA. "
-                    "The response MUST be a JSON list of A2UI messages. "
-                    "Ensure the response is split by '---a2ui_JSON---' and the JSON part is well-formed. "
+                    f"{format_hint}"
                     f"Please retry the original request: '{query}'"
                 )
+                # Escalate to the stronger fallback model, if one is configured,
+                # rather than retrying on the model that just failed.
+                model = self.router.fallback_for(model)
                 # Loop continues...
 
         # --- If we're here, it means we've exhausted retries ---
         logger.error(
             "--- LandscapeAgent.stream: Max retries exhausted. Sending text-only error. ---"
         )
+        metrics.inc("agent_turn_failures_total", mode=mode)
+        metrics.observe(
+            "agent_turn_latency_seconds",
+            time.monotonic() - turn_started,
+            mode=mode,
+            action=action_label,
+        )
+        await self._record_turn_usage(session, action_label, turn_used, turn_wasted)
         yield {
             "is_task_complete": True,
             "content": (
@@ -12,18 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import base64
+import contextlib
 import json
 import logging
 import mimetypes
 import os
 import uuid
+from contextlib import aclosing
 
+import json_codec
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.types import (
     DataPart,
+    FileWithBytes,
+    FileWithUri,
     Part,
     Task,
     TaskState,
@@ -37,17 +43,61 @@ from a2a.utils import (
     new_task,
 )
 from a2a.utils.errors import ServerError
-from a2ui_ext import a2ui_MIME_TYPE
+from a2ui_encoding import get_compact_codec
+from a2ui_ext import a2ui_COMPACT_MIME_TYPE, a2ui_MIME_TYPE
 from agent import LandscapeAgent
+from cart import CART_ACTIONS, CartService
+from config import env_flag, env_float, env_int
+from metrics import metrics
+from opentelemetry import trace
+from profiling import RequestProfiler
+from questionnaire_cache import QuestionnaireCache, questionnaire_key
+from speculation import SpeculativeScheduler, predict_next_actions
+from status_updates import StatusThrottle
+from surface_state import SurfaceRegistry, payload_size
+from tracing import new_root_context, tracer
+from uploads import (
+    UPLOADS_DIR,
+    bundled_image_path,
+    file_sha256,
+    read_upload,
+    resolve_local_uri,
+    save_base64_upload,
+)
 
 logger = logging.getLogger(__name__)
 
+BUDGET_EXHAUSTED_MESSAGE = (
+    "This conversation has reached its usage limit. Please start a new one."
+)
+
 
 class ImagePart:
-    def __init__(self, url: str, mime_type: str = None, bytes_data: bytes = None):
+    def __init__(
+        self,
+        url: str,
+        mime_type: str = None,
+        bytes_data: bytes = None,
+        path: str = None,
+        sha256: str = None,
+    ):
         self.url = url
         self.mime_type = mime_type
         self.bytes_data = bytes_data
+        # The stored upload, read back only when a model call needs the bytes.
+        self.path = path
+        self.sha256 = sha256
+
+    def read_bytes(self) -> bytes | None:
+        """
+        Returns the image bytes, if they are available locally.
+
+        A stored upload is read on the first call and kept on the part, so
+        retried attempts of the turn reuse the same bytes.
+        """
+        if self.bytes_data is None and self.path is not None:
+            self.bytes_data = read_upload(self.path)
+        return self.bytes_data
 
 
 class LandscapeAgentExecutor(AgentExecutor):
@@ -58,17 +108,99 @@ class LandscapeAgentExecutor(AgentExecutor):
         # The appropriate one will be chosen at execution time.
         self.ui_agent = LandscapeAgent(base_url=base_url, use_ui=True)
         self.text_agent = LandscapeAgent(base_url=base_url, use_ui=False)
+        # When enabled, only the parts of each surface the client does not
+        # already have are sent.
+        self.surfaces = (
+            SurfaceRegistry(max_contexts=env_int("VERDURE_SURFACE_REGISTRY_SIZE", 1000))
+            if env_flag("VERDURE_DIFF_SURFACES")
+            else None
+        )
+        # Used for clients that negotiate the compact a2ui encoding.
+        self.compact_codec = get_compact_codec()
+        # A2A task id -> asyncio task currently generating its response.
+        self._inflight: dict[str, asyncio.Task] = {}
+        # Optionally bounds how many model turns run at the same time.
+        max_turns = env_int("VERDURE_MAX_CONCURRENT_TURNS", 0)
+        self._turn_slot = (
+            asyncio.Semaphore(max_turns) if max_turns > 0 else contextlib.nullcontext()
+        )
+        metrics.register_gauge("executor_inflight_turns", lambda: len(self._inflight))
+        # When enabled, likely next actions are generated ahead of time on
+        # forked sessions while the server is otherwise idle.
+        self.speculator = (
+            SpeculativeScheduler(
+                max_concurrent=env_int("VERDURE_SPECULATION_MAX_CONCURRENT", 2),
+                ttl=env_float("VERDURE_SPECULATION_TTL", 120.0),
+                is_idle=self._is_idle,
+            )
+            if env_flag("VERDURE_SPECULATION")
+            else None
+        )
+        self.speculative_actions = {
+            name.strip()
+            for name in os.getenv(
+                "VERDURE_SPECULATIVE_ACTIONS", "select_option,checkout"
+            ).split(",")
+            if name.strip()
+        }
+        # Profiles single requests on demand; None unless enabled.
+        self.profiler = RequestProfiler.from_env()
+        # Questionnaires generated per photo; None unless enabled.
+        self.questionnaires = QuestionnaireCache.from_env()
+        # Prices carts and orders instead of the model; None when disabled.
+        self.carts = CartService.from_env()
+        if self.carts is not None:
+            # Their responses take no model call, so there is nothing to
+            # generate ahead of time.
+            self.speculative_actions -= CART_ACTIONS
+
+    def _is_idle(self) -> bool:
+        """Returns False while every turn slot is taken by a real request."""
+        return not (
+            isinstance(self._turn_slot, asyncio.Semaphore) and self._turn_slot.locked()
+        )
 
     async def execute(
         self,
         context: RequestContext,
         event_queue: EventQueue,
         use_ui: bool = False,  # This will be passed by the a2ui wrapper
+        a2ui_encoding: str = a2ui_MIME_TYPE,  # Negotiated by the a2ui wrapper
+    ) -> None:
+        profiling = (
+            self.profiler.maybe_profile(context)
+            if self.profiler is not None
+            else contextlib.nullcontext()
+        )
+        # Each A2A task is its own trace, linked to the request that started it.
+        incoming = trace.get_current_span().get_span_context()
+        with tracer.start_as_current_span(
+            "a2a.task",
+            context=new_root_context(),
+            links=[trace.Link(incoming)] if incoming.is_valid else None,
+            attributes={
+                "a2a.task_id": context.task_id or "",
+                "a2a.context_id": context.context_id or "",
+                "verdure.use_ui": use_ui,
+            },
+        ):
+            async with profiling:
+                await self._execute(context, event_queue, use_ui, a2ui_encoding)
+
+    async def _execute(
+        self,
+        context: RequestContext,
+        event_queue: EventQueue,
+        use_ui: bool,
+        a2ui_encoding: str,
     ) -> None:
         query = ""
         ui_event_part = None
         image_part = None
         action = None
+        ctx = {}
+        # The yard description and photo URL of a details submission.
+        details = None
 
         # Determine which agent to use based on whether the a2ui extension is active.
         if use_ui:
@@ -82,108 +214,65 @@ class LandscapeAgentExecutor(AgentExecutor):
                 "--- AGENT_EXECUTOR: A2UI extension is not active. Using text agent. ---"
             )
 
-        if context.message and context.message.parts:
-            logger.info(
-                f"--- AGENT_EXECUTOR: Processing {len(context.message.parts)} message parts ---"
-            )
-            for i, part in enumerate(context.message.parts):
-                if isinstance(part.root, DataPart):
-                    if "userAction" in part.root.data:
-                        logger.info(f"  Part {i}: Found a2ui UI ClientEvent payload.")
-                        ui_event_part = part.root.data["userAction"]
+        with tracer.start_as_current_span("executor.parse_parts"):
+            if context.message and context.message.parts:
+                logger.info(
+                    f"--- AGENT_EXECUTOR: Processing {len(context.message.parts)} message parts ---"
+                )
+                for i, part in enumerate(context.message.parts):
+                    if isinstance(part.root, DataPart):
+                        if "userAction" in part.root.data:
+                            logger.info(f"  Part {i}: Found a2ui UI ClientEvent payload.")
+                            ui_event_part = part.root.data["userAction"]
+                        else:
+                            logger.info(f"  Part {i}: DataPart (data: {part.root.data})")
+                    elif isinstance(part.root, TextPart):
+                        logger.info(f"  Part {i}: TextPart (text: {part.root.text})")
+                    elif isinstance(part.root, FilePart):
+                        logger.info(f"  Part {i}: Found FilePart ({part.root.file.mime_type}).")
+                        file_data = part.root.file
+                        if isinstance(file_data, FileWithBytes) and file_data.bytes:
+                            logger.info(f"  Extracting {len(part.root.file.bytes)} bytes")
+                            try:
+                                # Decoded in chunks straight to disk, off the event
+                                # loop; the bytes are not kept in memory.
+                                with tracer.start_as_current_span("executor.save_image") as span:
+                                    stored = await asyncio.to_thread(
+                                        save_base64_upload, file_data.bytes, file_data.mime_type
+                                    )
+                                    span.set_attribute("verdure.image_bytes", stored.size)
+
+                                image_url = f"{self.ui_agent.base_url}/images/uploads/{stored.filename}"
+                                mime_type = file_data.mime_type if file_data.mime_type else "image/jpeg"
+                                image_part = ImagePart(
+                                    image_url, mime_type, path=stored.path, sha256=stored.sha256
+                                )
+                                logger.info(f"  Part {i}: Set image_part to a {mime_type} image.")
+                                logger.info(f"  Saved FilePart to {stored.path}, URL: {image_url}")
+                            except Exception as e:
+                                logger.error(f"Failed to save FilePart: {e}")
+                        elif isinstance(file_data, FileWithUri) and file_data.uri:
+                            logger.info(f"  Part {i}: FilePart has URI: {file_data.uri}")
+                            image_part = self._image_from_uri(file_data) or image_part
                     else:
-                        logger.info(f"  Part {i}: DataPart (data: {part.root.data})")
-                elif isinstance(part.root, TextPart):
-                    logger.info(f"  Part {i}: TextPart (text: {part.root.text})")
-                elif isinstance(part.root, FilePart):
-                    logger.info(f"  Part {i}: Found FilePart: bytes: {part.root.file.bytes[0:100]}...")
-                    file_data = part.root.file
-                    if file_data.bytes:
-                        logger.info(f"  Extracting {len(part.root.file.bytes)} bytes")
-                        try:
-                            image_bytes = base64.b64decode(file_data.bytes)
-                            mime_type = file_data.mime_type
-                            extension = {
-                                "image/png": ".png",
-                                "image/jpeg": ".jpg",
-                                "image/heic": ".heic",
-                                "image/webp": ".webp",
-                            }.get(mime_type, ".jpg")
-                            filename = f"{uuid.uuid4()}{extension}"
-                            images_dir = os.path.join(os.path.dirname(__file__), "images", "uploads")
-                            os.makedirs(images_dir, exist_ok=True)
-                            filepath = os.path.join(images_dir, filename)
-                            with open(filepath, "wb") as f:
-                                f.write(image_bytes)
-
-                            image_url = f"{self.ui_agent.base_url}/images/uploads/{filename}"
-                            mime_type = file_data.mime_type if file_data.mime_type else "image/jpeg"
-                            image_part = ImagePart(image_url, mime_type, image_bytes)
-                            logger.info(f"  Part {i}: Set image_part to a {mime_type} image.")
-                            logger.info(f"  Saved FilePart to {filepath}, URL: {image_url}")
-                        except Exception as e:
-                            logger.error(f"Failed to save FilePart: {e}")
-                    elif file_data.uri:
-                         logger.info(f"  Part {i}: FilePart has URI: {file_data.uri}")
-                         # Handle URI if needed, but for now focus on bytes
-                else:
-                    logger.info(f"  Part {i}: Unknown part type ({type(part.root)})")
+                        logger.info(f"  Part {i}: Unknown part type ({type(part.root)})")
 
         if ui_event_part:
             logger.info(f"Received a2ui ClientEvent: {ui_event_part}")
             action = ui_event_part.get("name")
             ctx = ui_event_part.get("context", {})
-
-            if action == "start_project":
-                logger.info("Handling 'start_project' action.")
-                query = "USER_WANTS_TO_START_PROJECT"
-
-            elif action == "submit_details":
-                logger.info("Handling 'submit_details' action.")
-                yard_desc = ctx.get("yardDescription", "No description")
-                image_url = ctx.get("imageUrl", "No URL")
-                if image_part:
-                    image_url = image_part.url
-                    logger.info(f"Using image URL from ImagePart: {image_url}")
-
-                logger.info("Handling 'submit_details' action.")
-                query = f"USER_SUBMITTED_DETAILS: Description: '{yard_desc}', Image: '{image_url}'"
-
-            elif action == "submit_questionnaire":
-                # These keys now match the new dynamic questionnaire
-                preserve_bushes = ctx.get("preserveBushes", True)
-                guest_count = ctx.get("guestCount", 4)
-                patio_plan = ctx.get("patioPlan", ["any"])
-
-                logger.info("Handling 'submit_questionnaire' action.")
-                # Ensure patio_plan is a single string for the prompt
-                patio_plan_str = (
-                    patio_plan[0]
-                    if isinstance(patio_plan, list) and patio_plan
-                    else "any"
+            query = self._build_query(action, ctx, image_part)
+            if action == "submit_details":
+                details = (
+                    ctx.get("yardDescription", ""),
+                    image_part.url if image_part else ctx.get("imageUrl"),
                 )
-
-                query = f"USER_SUBMITTED_QUESTIONNAIRE: Preserve Bushes: {preserve_bushes}, Guest Count: {guest_count}, Patio Plan: {patio_plan_str}"
-
-            elif action == "select_option":
-                option_name = ctx.get("optionName", "Unknown Option")
-                logger.info("Handling 'select_option' action.")
-                query = f"USER_SELECTED_OPTION: {option_name}"
-
-            elif action == "checkout":
-                option_name = ctx.get("optionName", "Unknown Option")
-                total_price = ctx.get("totalPrice", "Unknown Price")
-                logger.info("Handling 'checkout' action.")
-                query = f"USER_CHECKED_OUT: {option_name}, Price: {total_price}"
-
-            else:
-                logger.warning(f"Handling unknown action: {action}")
-                query = f"User submitted an event: {action} with data: {ctx}"
         else:
             logger.info("No a2ui UI event part found. Falling back to text input.")
             user_input = context.get_user_input()
             if image_part:
                  query = f"USER_SUBMITTED_DETAILS: Description: '{user_input}', Image: '{image_part.url}'"
+                 details = (user_input, image_part.url)
             else:
                  query = user_input
 
@@ -204,89 +293,497 @@ class LandscapeAgentExecutor(AgentExecutor):
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.context_id)
 
-        async for item in agent.stream(query, task.context_id, image_part=image_part):
-            is_task_complete = item["is_task_complete"]
-            if not is_task_complete:
+        cart_item = (
+            self.carts.respond(action, ctx, task.context_id, agent.load_examples())
+            if self.carts is not None and agent is self.ui_agent
+            else None
+        )
+        if cart_item is not None:
+            logger.info(f"--- AGENT_EXECUTOR: Serving a computed '{action}' response. ---")
+            await agent.record_cached_turn(task.context_id, query, cart_item["content"])
+            await self._publish_final(cart_item, task, updater, action, a2ui_encoding)
+            return
+
+        questionnaire = None
+        if (
+            details is not None
+            and self.questionnaires is not None
+            and agent is self.ui_agent
+        ):
+            questionnaire = await self._questionnaire_key(image_part, *details)
+
+        # Track the asyncio task serving this A2A task so `cancel` can abort it.
+        self._inflight[task.id] = asyncio.current_task()
+        try:
+            async with self._turn_slot:
+                await self._run_turn(
+                    agent,
+                    query,
+                    task,
+                    updater,
+                    image_part,
+                    action,
+                    a2ui_encoding,
+                    questionnaire,
+                )
+        except asyncio.CancelledError:
+            logger.info(f"--- AGENT_EXECUTOR: Turn for task {task.id} was cancelled. ---")
+            metrics.inc("executor_turns_cancelled_total")
+            self._forget_surfaces(task.context_id)
+            raise
+        except Exception:
+            self._forget_surfaces(task.context_id)
+            raise
+        finally:
+            self._inflight.pop(task.id, None)
+
+    def _forget_surfaces(self, context_id: str) -> None:
+        """
+        Makes the next turn of a conversation send its surfaces in full.
+
+        After a cancelled or failed turn the client may hold a partial update,
+        so what it has can no longer be assumed.
+        """
+        if self.surfaces is not None:
+            self.surfaces.forget(context_id)
+
+    def _image_from_uri(self, file_data: FileWithUri) -> ImagePart | None:
+        """
+        Resolves a FilePart URI to an image.
+
+        Uploads stored by this server and allowed `file://` paths are read from
+        disk when a model call needs them; any other URI is passed to the model.
+        """
+        try:
+            path = resolve_local_uri(file_data.uri, self.ui_agent.base_url)
+        except (PermissionError, FileNotFoundError) as e:
+            logger.error(f"Ignoring FilePart URI: {e}")
+            return None
+        mime_type = (
+            file_data.mime_type
+            or mimetypes.guess_type(path or file_data.uri)[0]
+            or "image/jpeg"
+        )
+        if path is None:
+            return ImagePart(file_data.uri, mime_type)
+        # Stored uploads are named after their hash.
+        sha256 = (
+            os.path.splitext(os.path.basename(path))[0]
+            if os.path.dirname(path) == UPLOADS_DIR
+            else None
+        )
+        return ImagePart(file_data.uri, mime_type, path=path, sha256=sha256)
+
+    async def _questionnaire_key(
+        self, image_part: ImagePart | None, description: str, image_url: str | None
+    ) -> tuple[str, str] | None:
+        """
+        Returns the questionnaire cache key of a photo and its URL.
+
+        Photos are identified by their content, so only uploads and bundled
+        images, which are available locally, can be cached.
+        """
+        sha256 = image_part.sha256 if image_part else None
+        if sha256 is None:
+            path = image_part.path if image_part else None
+            if path is None and image_url:
+                path = bundled_image_path(image_url, self.ui_agent.base_url)
+            if path is None:
+                return None
+            sha256 = await asyncio.to_thread(file_sha256, path)
+        key = questionnaire_key(sha256, description, self.ui_agent.prompt_version)
+        return key, image_url
+
+    def _build_query(
+        self, action: str, ctx: dict, image_part: ImagePart | None = None
+    ) -> str:
+        """Turns an a2ui userAction into the query sent to the agent."""
+        if action == "start_project":
+            logger.info("Handling 'start_project' action.")
+            return "USER_WANTS_TO_START_PROJECT"
+
+        elif action == "submit_details":
+            logger.info("Handling 'submit_details' action.")
+            yard_desc = ctx.get("yardDescription", "No description")
+            image_url = ctx.get("imageUrl", "No URL")
+            if image_part:
+                image_url = image_part.url
+                logger.info(f"Using image URL from ImagePart: {image_url}")
+
+            logger.info("Handling 'submit_details' action.")
+            return f"USER_SUBMITTED_DETAILS: Description: '{yard_desc}', Image: '{image_url}'"
+
+        elif action == "submit_questionnaire":
+            # These keys now match the new dynamic questionnaire
+            preserve_bushes = ctx.get("preserveBushes", True)
+            guest_count = ctx.get("guestCount", 4)
+            patio_plan = ctx.get("patioPlan", ["any"])
+
+            logger.info("Handling 'submit_questionnaire' action.")
+            # Ensure patio_plan is a single string for the prompt
+            patio_plan_str = (
+                patio_plan[0]
+                if isinstance(patio_plan, list) and patio_plan
+                else "any"
+            )
+
+            return f"USER_SUBMITTED_QUESTIONNAIRE: Preserve Bushes: {preserve_bushes}, Guest Count: {guest_count}, Patio Plan: {patio_plan_str}"
+
+        elif action == "select_option":
+            option_name = ctx.get("optionName", "Unknown Option")
+            logger.info("Handling 'select_option' action.")
+            return f"USER_SELECTED_OPTION: {option_name}"
+
+        elif action == "checkout":
+            option_name = ctx.get("optionName", "Unknown Option")
+            total_price = ctx.get("totalPrice", "Unknown Price")
+            logger.info("Handling 'checkout' action.")
+            return f"USER_CHECKED_OUT: {option_name}, Price: {total_price}"
+
+        else:
+            logger.warning(f"Handling unknown action: {action}")
+            return f"User submitted an event: {action} with data: {ctx}"
+
+    async def _run_turn(
+        self,
+        agent: LandscapeAgent,
+        query: str,
+        task: Task,
+        updater: TaskUpdater,
+        image_part: ImagePart | None,
+        action: str | None,
+        a2ui_encoding: str,
+        questionnaire: tuple[str, str] | None = None,
+    ) -> None:
+        """
+        Runs one agent turn and publishes its status updates.
+
+        `questionnaire` is the cache key and photo URL of a details
+        submission, whose questionnaire is served from the cache if it can be.
+        """
+        if await agent.over_budget(task.context_id):
+            await self._run_over_budget_turn(
+                agent, query, task, updater, image_part, action, a2ui_encoding
+            )
+            return
+
+        speculate = self.speculator is not None and agent is self.ui_agent
+        cached = (
+            self.questionnaires.get(questionnaire[0]) if questionnaire is not None else None
+        )
+        speculated = None
+        if speculate and cached is not None:
+            # The conversation has moved on; drop its speculations and forks.
+            self.speculator.discard(task.context_id)
+        elif speculate:
+            speculated = await self.speculator.take(task.context_id, query)
+        if cached is not None:
+            logger.info("--- AGENT_EXECUTOR: Serving a cached questionnaire. ---")
+            item = cached.response(questionnaire[1])
+            await agent.record_cached_turn(task.context_id, query, item["content"])
+            messages = await self._publish_final(
+                item, task, updater, action, a2ui_encoding
+            )
+        elif speculated is not None:
+            fork_id, item = speculated
+            logger.info("--- AGENT_EXECUTOR: Serving a speculatively generated turn. ---")
+            await agent.adopt_fork(task.context_id, fork_id)
+            messages = await self._publish_final(
+                item, task, updater, action, a2ui_encoding
+            )
+        else:
+            messages = await self._stream_turn(
+                agent,
+                query,
+                task,
+                updater,
+                image_part,
+                action,
+                a2ui_encoding,
+                questionnaire,
+            )
+
+        if speculate and messages and not await agent.over_budget(task.context_id):
+            self._speculate_next(agent, task.context_id, messages)
+
+    async def _stream_turn(
+        self,
+        agent: LandscapeAgent,
+        query: str,
+        task: Task,
+        updater: TaskUpdater,
+        image_part: ImagePart | None,
+        action: str | None,
+        a2ui_encoding: str,
+        questionnaire: tuple[str, str] | None = None,
+    ) -> list | None:
+        """
+        Streams one agent turn, returning the a2ui messages of its response.
+
+        A valid response to a details submission is added to the questionnaire
+        cache under `questionnaire`, once it has been sent.
+        """
+
+        async def send_working(text: str) -> None:
+            with tracer.start_as_current_span(
+                "executor.update_status", attributes={"a2a.state": "working"}
+            ):
                 await updater.update_status(
                     TaskState.working,
-                    new_agent_text_message(item["updates"], task.context_id, task.id),
+                    new_agent_text_message(text, task.context_id, task.id),
                 )
-                continue
 
-            final_state = (
-                TaskState.completed
-                if action == "checkout"
-                else TaskState.input_required
+        status = StatusThrottle.from_env(send_working)
+        try:
+            # aclosing() makes sure the agent's generator, and the model call
+            # beneath it, is closed right away if this turn is cancelled.
+            async with aclosing(
+                agent.stream(query, task.context_id, image_part=image_part, action=action)
+            ) as stream:
+                async for item in stream:
+                    if not item["is_task_complete"]:
+                        await status.update(
+                            item["updates"], streaming=item.get("streaming", False)
+                        )
+                        continue
+                    await status.close()
+                    messages = await self._publish_final(
+                        item, task, updater, action, a2ui_encoding
+                    )
+                    if questionnaire is not None and item.get("a2ui_messages"):
+                        await self.questionnaires.put(
+                            questionnaire[0],
+                            questionnaire[1],
+                            item["content"],
+                            item["a2ui_messages"],
+                        )
+                    return messages
+        finally:
+            await status.close()
+        return None
+
+    async def _run_over_budget_turn(
+        self,
+        agent: LandscapeAgent,
+        query: str,
+        task: Task,
+        updater: TaskUpdater,
+        image_part: ImagePart | None,
+        action: str | None,
+        a2ui_encoding: str,
+    ) -> None:
+        """
+        Answers a turn of a conversation that has spent its token budget.
+
+        The UI agent's cached template for the action is used where there is
+        one, and the text agent (whose prompt is a fraction of the size)
+        otherwise. Once the text agent's budget is spent too, a fixed message
+        is sent.
+        """
+        content = agent.cached_response(query)
+        if content is not None:
+            degraded_to = "template"
+        elif agent is self.ui_agent and not await self.text_agent.over_budget(
+            task.context_id
+        ):
+            logger.info("--- AGENT_EXECUTOR: Over token budget, using the text agent. ---")
+            metrics.inc("executor_budget_degraded_total", to="text")
+            await self._stream_turn(
+                self.text_agent, query, task, updater, image_part, action, a2ui_encoding
             )
+            return
+        else:
+            content, degraded_to = BUDGET_EXHAUSTED_MESSAGE, "message"
 
-            content = item["content"]
-            final_parts = []
-            if "---a2ui_JSON---" in content:
-                logger.info("Splitting final response into text and UI parts.")
-                text_content, json_string = content.split("---a2ui_JSON---", 1)
+        logger.info(
+            f"--- AGENT_EXECUTOR: Over token budget, answering with a {degraded_to}. ---"
+        )
+        metrics.inc("executor_budget_degraded_total", to=degraded_to)
+        await self._publish_final(
+            {"content": content}, task, updater, action, a2ui_encoding
+        )
 
-                if text_content.strip():
-                    final_parts.append(Part(root=TextPart(text=text_content.strip())))
+    async def _publish_final(
+        self,
+        item: dict,
+        task: Task,
+        updater: TaskUpdater,
+        action: str | None,
+        a2ui_encoding: str,
+    ) -> list | None:
+        """
+        Publishes the final response of a turn.
+
+        Returns:
+            The full list of a2ui messages in the response, if any.
+        """
+        final_state = (
+            TaskState.completed
+            if action == "checkout"
+            else TaskState.input_required
+        )
 
-                if json_string.strip():
-                    try:
+        content = item["content"]
+        final_parts = []
+        messages = None
+        surface_diff = None
+        if "---a2ui_JSON---" in content:
+            logger.info("Splitting final response into text and UI parts.")
+            text_content, json_string = content.split("---a2ui_JSON---", 1)
+
+            if text_content.strip():
+                final_parts.append(Part(root=TextPart(text=text_content.strip())))
+
+            if item.get("a2ui_messages") is not None or json_string.strip():
+                try:
+                    if item.get("a2ui_messages") is not None:
+                        # Already parsed and validated by the agent.
+                        json_data = item["a2ui_messages"]
+                    else:
                         json_string_cleaned = (
                             json_string.strip().lstrip("```json").rstrip("```").strip()
                         )
                         # The new protocol sends a stream of JSON objects.
                         # For this example, we'll assume they are sent as a list in the final response.
-                        json_data = json.loads(json_string_cleaned)
+                        json_data = json_codec.loads(json_string_cleaned)
+                    messages = json_data if isinstance(json_data, list) else [json_data]
+
+                    if self.surfaces is not None:
+                        full_size = payload_size(json_data)
+                        # Committed once the client has been sent the diff.
+                        surface_diff = self.surfaces.diff(task.context_id, messages)
+                        json_data = surface_diff.messages
+                        metrics.observe("a2ui_payload_bytes", full_size, kind="full")
+                        metrics.observe(
+                            "a2ui_payload_bytes", payload_size(json_data), kind="sent"
+                        )
 
-                        if isinstance(json_data, list):
-                            logger.info(
-                                f"Found {len(json_data)} messages. Creating individual DataParts."
-                            )
-                            for message in json_data:
-                                final_parts.append(
-                                    Part(
-                                        root=DataPart(
-                                            data=message,
-                                            mime_type=a2ui_MIME_TYPE,
-                                        )
-                                    )
-                                )
-                        else:
-                            # Handle the case where a single JSON object is returned
-                            logger.info(
-                                "Received a single JSON object. Creating a DataPart."
-                            )
+                    if (
+                        a2ui_encoding == a2ui_COMPACT_MIME_TYPE
+                        and self.compact_codec is not None
+                    ):
+                        logger.info(
+                            "Client negotiated the compact a2ui encoding. Creating a FilePart."
+                        )
+                        final_parts.append(self._compact_part(json_data))
+                    elif isinstance(json_data, list):
+                        logger.info(
+                            f"Found {len(json_data)} messages. Creating individual DataParts."
+                        )
+                        for message in json_data:
                             final_parts.append(
                                 Part(
                                     root=DataPart(
-                                        data=json_data,
+                                        data=message,
                                         mime_type=a2ui_MIME_TYPE,
                                     )
                                 )
                             )
+                    else:
+                        # Handle the case where a single JSON object is returned
+                        logger.info(
+                            "Received a single JSON object. Creating a DataPart."
+                        )
+                        final_parts.append(
+                            Part(
+                                root=DataPart(
+                                    data=json_data,
+                                    mime_type=a2ui_MIME_TYPE,
+                                )
+                            )
+                        )
 
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse UI JSON: {e}")
-                        final_parts.append(Part(root=TextPart(text=json_string)))
-            else:
-                final_parts.append(Part(root=TextPart(text=content.strip())))
-
-            logger.info("--- FINAL PARTS TO BE SENT ---")
-            for i, part in enumerate(final_parts):
-                logger.info(f"  - Part {i}: Type = {type(part.root)}")
-                if isinstance(part.root, TextPart):
-                    logger.info(f"    - Text: {part.root.text[:200]}...")
-                elif isinstance(part.root, DataPart):
-                    logger.info(f"    - Data: {str(part.root.data)[:200]}...")
-            logger.info("-----------------------------")
-
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to parse UI JSON: {e}")
+                    final_parts.append(Part(root=TextPart(text=json_string)))
+        else:
+            final_parts.append(Part(root=TextPart(text=content.strip())))
+
+        logger.info("--- FINAL PARTS TO BE SENT ---")
+        for i, part in enumerate(final_parts):
+            logger.info(f"  - Part {i}: Type = {type(part.root)}")
+            if isinstance(part.root, TextPart):
+                logger.info(f"    - Text: {part.root.text[:200]}...")
+            elif isinstance(part.root, DataPart):
+                logger.info(f"    - Data: {str(part.root.data)[:200]}...")
+            elif isinstance(part.root, FilePart):
+                logger.info(f"    - File: {part.root.file.mime_type}")
+        logger.info("-----------------------------")
+
+        with tracer.start_as_current_span(
+            "executor.update_status", attributes={"a2a.state": final_state.value}
+        ):
             await updater.update_status(
                 final_state,
                 new_agent_parts_message(final_parts, task.context_id, task.id),
                 final=(final_state == TaskState.completed),
             )
-            break
+        if surface_diff is not None:
+            surface_diff.commit()
+        return messages
+
+    def _speculate_next(
+        self, agent: LandscapeAgent, context_id: str, messages: list
+    ) -> None:
+        """Pre-generates the responses to the actions the user is likely to take next."""
+        for name, ctx in predict_next_actions(messages, self.speculative_actions):
+            query = self._build_query(name, ctx)
+            fork_id = f"{context_id}:speculative:{uuid.uuid4().hex}"
+
+            async def run(query=query, name=name, fork_id=fork_id):
+                # Speculative turns outlive the task that scheduled them, so
+                # they are traced on their own.
+                with tracer.start_as_current_span(
+                    "executor.speculate",
+                    context=new_root_context(),
+                    attributes={"a2a.context_id": context_id, "verdure.action": name},
+                ):
+                    await agent.fork_session(context_id, fork_id)
+                    async with aclosing(
+                        agent.stream(query, fork_id, action=name)
+                    ) as stream:
+                        async for item in stream:
+                            if item["is_task_complete"]:
+                                return fork_id, item
+                    raise RuntimeError("Speculative turn ended without a response.")
+
+            self.speculator.schedule(
+                context_id,
+                query,
+                run,
+                cleanup=lambda fork_id=fork_id: agent.discard_fork(fork_id),
+            )
+
+    def _compact_part(self, json_data) -> Part:
+        """Packs a2ui messages into one FilePart using the compact encoding."""
+        messages = json_data if isinstance(json_data, list) else [json_data]
+        encoded = base64.b64encode(self.compact_codec.encode(messages)).decode("ascii")
+        # What the response carries: the base64 text, not the MessagePack bytes.
+        metrics.observe("a2ui_payload_bytes", len(encoded), kind="compact")
+        return Part(
+            root=FilePart(
+                file=FileWithBytes(
+                    bytes=encoded,
+                    mime_type=a2ui_COMPACT_MIME_TYPE,
+                    name="a2ui.msgpack",
+                )
+            )
+        )
 
     async def cancel(
         self, request: RequestContext, event_queue: EventQueue
     ) -> Task | None:
-        raise ServerError(error=UnsupportedOperationError())
+        """Aborts the in-flight turn for a task, if any, and marks it canceled."""
+        if not request.task_id:
+            raise ServerError(error=UnsupportedOperationError())
+
+        inflight = self._inflight.pop(request.task_id, None)
+        if inflight is not None and not inflight.done():
+            logger.info(
+                f"--- AGENT_EXECUTOR: Cancelling in-flight turn for task {request.task_id} ---"
+            )
+            inflight.cancel()
+
+        updater = TaskUpdater(event_queue, request.task_id, request.context_id)
+        await updater.cancel()
+        return None
@@ -0,0 +1,276 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Carts and orders priced by the server instead of written by the model.
+#
+# Left to the model, the `select_option` turn fills the cart template with
+# made-up items and the `checkout` turn makes up the order details: both take
+# a model call, differ from one run to the next, and the items need not add up
+# to the total. Instead, each option of `tools.LANDSCAPE_OPTIONS` has a bill
+# of materials here, priced with Decimal arithmetic (line totals and tax are
+# rounded half up to the cent) once, when the service is built. The executor
+# answers those two actions by filling the `SHOPPING_CART_EXAMPLE` and
+# `ORDER_CONFIRMATION_EXAMPLE` templates with the precomputed cart, and
+# records the turn in the conversation as if the model had written it.
+#
+# The order is priced from the option again at checkout, not from the total
+# the client sends back, and its number is derived from the conversation, so
+# the same checkout always gets the same number. An option the catalog does
+# not know is left to the model.
+#
+# Configuration (environment):
+#   VERDURE_CART_ENGINE    Set to `false` to let the model write carts and
+#                          orders again.
+#   VERDURE_CART_TAX_RATE  Sales tax rate applied to the subtotal, as a
+#                          fraction at least 0 and below 1 (default 0.08).
+
+import hashlib
+import logging
+import os
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any
+
+from config import env_flag
+from metrics import metrics
+from structured_output import to_delimited_response
+from tools import LANDSCAPE_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAX_RATE = Decimal("0.08")
+
+# The actions whose responses are computed here.
+CART_ACTIONS = {"select_option", "checkout"}
+
+_CENT = Decimal("0.01")
+
+
+def _cents(amount: Decimal) -> Decimal:
+    return amount.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def format_usd(amount: Decimal) -> str:
+    """Formats an amount like `$7,500.00`."""
+    return f"${amount:,.2f}"
+
+
+class LineItem:
+    """One line of a bill of materials."""
+
+    def __init__(self, name: str, unit_price: str, quantity: str = "1", unit: str = ""):
+        self.name = name
+        self.unit_price = Decimal(unit_price)
+        self.quantity = Decimal(quantity)
+        self.unit = unit
+        self.total = _cents(self.unit_price * self.quantity)
+
+    @property
+    def label(self) -> str:
+        return f"{self.name} ({self.quantity} {self.unit})" if self.unit else self.name
+
+
+# Option ID -> bill of materials. Prices are in dollars, as strings so they
+# are exact.
+BILLS_OF_MATERIALS = {
+    "option1": [
+        LineItem("Zen Design Service", "2000.00"),
+        LineItem("River Rocks", "300.00", "5", "tons"),
+        LineItem("Japanese Maple Tree", "500.00"),
+        LineItem("Drought-Tolerant Shrubs", "125.00", "8", "plants"),
+        LineItem("Labor & Installation", "62.50", "40", "hours"),
+    ],
+    "option2": [
+        LineItem("Cottage Design Service", "1200.00"),
+        LineItem("Perennial Flowers", "18.50", "60", "plants"),
+        LineItem("Climbing Roses", "45.00", "6", "plants"),
+        LineItem("Gravel Path", "180.00", "2", "tons"),
+        LineItem("Mulch & Compost", "55.00", "4", "cu yd"),
+        LineItem("Labor & Installation", "55.00", "32", "hours"),
+    ],
+}
+
+
+class Cart:
+    """The priced cart of one design option."""
+
+    def __init__(self, option_id: str, name: str, items: list[LineItem], tax_rate: Decimal):
+        self.option_id = option_id
+        self.name = name
+        self.items = items
+        self.subtotal = sum((item.total for item in items), Decimal(0))
+        self.tax = _cents(self.subtotal * tax_rate)
+        self.total = self.subtotal + self.tax
+
+    @property
+    def total_label(self) -> str:
+        return f"Total: {format_usd(self.total)} (incl. {format_usd(self.tax)} tax)"
+
+    def cart_contents(self) -> list[dict[str, Any]]:
+        """Returns the data model of the `SHOPPING_CART_EXAMPLE` template."""
+        return [
+            {"key": "optionName", "valueString": self.name},
+            {"key": "totalPrice", "valueString": self.total_label},
+            {
+                "key": "cartItems",
+                "valueMap": [
+                    {
+                        "key": f"item{i}",
+                        "valueMap": [
+                            {"key": "name", "valueString": item.label},
+                            {"key": "price", "valueString": format_usd(item.total)},
+                        ],
+                    }
+                    for i, item in enumerate(self.items, 1)
+                ],
+            },
+        ]
+
+    def order_contents(self, order_number: str) -> list[dict[str, Any]]:
+        """Returns the data model of the `ORDER_CONFIRMATION_EXAMPLE` template."""
+        return [
+            {"key": "designName", "valueString": self.name},
+            {"key": "price", "valueString": format_usd(self.total)},
+            {"key": "orderNumber", "valueString": order_number},
+        ]
+
+
+def order_number(context_id: str, option_id: str) -> str:
+    """Returns the order number of a checkout, the same for the same conversation."""
+    digest = hashlib.blake2b(f"{context_id}:{option_id}".encode(), digest_size=4)
+    return f"#LSC-{int.from_bytes(digest.digest(), 'big') % 100_000:05d}"
+
+
+def _with_data_model(
+    template: list[dict[str, Any]], contents: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Returns a template's messages with the data model replaced by `contents`."""
+    messages = []
+    for message in template:
+        update = message.get("dataModelUpdate")
+        if update is not None:
+            message = {"dataModelUpdate": {**update, "contents": contents}}
+        messages.append(message)
+    return messages
+
+
+class CartService:
+    """Answers the cart and checkout actions from the precomputed carts."""
+
+    def __init__(self, tax_rate: Decimal = DEFAULT_TAX_RATE):
+        self.tax_rate = tax_rate
+        # Option ID and lower-cased name -> cart.
+        self._carts: dict[str, Cart] = {}
+        for option in LANDSCAPE_OPTIONS:
+            items = BILLS_OF_MATERIALS.get(option["id"])
+            if items is None:
+                continue
+            cart = Cart(option["id"], option["name"], items, tax_rate)
+            self._carts[cart.option_id] = self._carts[cart.name.lower()] = cart
+
+    @classmethod
+    def from_env(cls) -> "CartService | None":
+        if not env_flag("VERDURE_CART_ENGINE", True):
+            return None
+        value = os.getenv("VERDURE_CART_TAX_RATE", "").strip()
+        tax_rate = DEFAULT_TAX_RATE
+        if value:
+            try:
+                rate = Decimal(value)
+            except InvalidOperation:
+                rate = None
+            # Also rules out NaN and infinities.
+            if rate is not None and rate.is_finite() and 0 <= rate < 1:
+                tax_rate = rate
+            else:
+                logger.warning(f"Ignoring invalid number for VERDURE_CART_TAX_RATE: '{value}'")
+        return cls(tax_rate)
+
+    def cart_for(self, option: str) -> Cart | None:
+        """Returns the cart of an option, by ID or name."""
+        return self._carts.get(option.strip().lower())
+
+    def respond(
+        self,
+        action: str,
+        ctx: dict[str, Any],
+        context_id: str,
+        templates: dict[str, list[dict[str, Any]]],
+    ) -> dict[str, Any] | None:
+        """
+        Returns the final response item for a cart action.
+
+        The item carries the A2UI messages as they are, next to the response in
+        the `---a2ui_JSON---` format for the conversation history, so they are
+        not parsed again before sending. Returns None for other actions and for
+        options without a cart, which are left to the model.
+        """
+        if action not in CART_ACTIONS:
+            return None
+        cart = self.cart_for(str(ctx.get("optionName", "")))
+        if cart is None:
+            metrics.inc("cart_responses_total", action=action, outcome="unknown_option")
+            return None
+
+        if action == "select_option":
+            text = f"Great choice! Here is your cart for the {cart.name}."
+            messages = _with_data_model(
+                templates["SHOPPING_CART_EXAMPLE"], cart.cart_contents()
+            )
+        else:
+            sent_total = str(ctx.get("totalPrice", ""))
+            if format_usd(cart.total) not in sent_total:
+                logger.warning(
+                    f"Checkout of {cart.name} sent total '{sent_total}', "
+                    f"charging {format_usd(cart.total)}."
+                )
+            number = order_number(context_id, cart.option_id)
+            text = f"Your order {number} is confirmed."
+            messages = _with_data_model(
+                templates["ORDER_CONFIRMATION_EXAMPLE"], cart.order_contents(number)
+            )
+        metrics.inc("cart_responses_total", action=action, outcome="computed")
+        return {
+            "is_task_complete": True,
+            "content": to_delimited_response(text, messages),
+            "a2ui_messages": messages,
+        }
+
+
+if __name__ == "__main__":
+    # Prints every cart and times building the responses from the templates.
+    import time
+
+    from ui_examples import load_ui_examples
+
+    logging.disable(logging.WARNING)
+    templates = load_ui_examples("http://localhost:10002")
+    service = CartService()
+    for option in LANDSCAPE_OPTIONS:
+        cart = service.cart_for(option["name"])
+        print(f"{cart.name} ({cart.option_id})")
+        for item in cart.items:
+            print(f"  {item.label:36} {format_usd(item.total):>12}")
+        print(f"  {'Subtotal':36} {format_usd(cart.subtotal):>12}")
+        print(f"  {f'Tax ({service.tax_rate:%})':36} {format_usd(cart.tax):>12}")
+        print(f"  {'Total':36} {format_usd(cart.total):>12}")
+
+    rounds = 10_000
+    for action in ("select_option", "checkout"):
+        started = time.perf_counter()
+        for i in range(rounds):
+            service.respond(
+                action, {"optionName": "Modern Zen Garden"}, f"context-{i}", templates
+            )
+        elapsed = time.perf_counter() - started
+        print(f"{action}: {elapsed / rounds * 1e6:.1f}us per response")
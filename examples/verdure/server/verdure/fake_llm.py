@@ -0,0 +1,240 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# An offline stand-in for the real model, selected with `LITELLM_MODEL=fake`.
+#
+# It replays the templates from ui_examples.py as recorded responses for each
+# step of the flow, emulates the `get_landscape_options` tool call, and can
+# inject latency (including a slow tail) and invalid output. This makes it
+# possible to run the server, and to compare configurations, without network
+# access or API keys. Responses report estimated token usage, as a provider
+# would.
+#
+# Invalid output is truncated JSON in delimited mode; in structured mode, where
+# the provider guarantees well-formed JSON, one A2UI message loses its required
+# `surfaceId`, so both modes exercise the retry path.
+
+import asyncio
+import logging
+import random
+from collections.abc import AsyncGenerator
+
+import json_codec
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+from structured_output import A2UI_DELIMITER, A2UI_FIELD, TEXT_FIELD
+from ui_examples import load_ui_examples
+
+logger = logging.getLogger(__name__)
+
+# Characters per token, for usage estimates and streamed chunks.
+_CHARS_PER_TOKEN = 4
+
+# Maps query markers to the recorded response used for them.
+_RECORDED_RESPONSES = [
+    (
+        "USER_WANTS_TO_START_PROJECT",
+        "PROJECT_DETAILS_EXAMPLE",
+        "Let's get started! Tell me about your yard and upload a photo.",
+    ),
+    (
+        "USER_SUBMITTED_DETAILS",
+        "QUESTIONNAIRE_EXAMPLE",
+        "Thanks for the photo! A few questions about your space.",
+    ),
+    (
+        "USER_SUBMITTED_QUESTIONNAIRE",
+        "OPTIONS_PRESENTATION_EXAMPLE",
+        "Here are two designs that match your preferences.",
+    ),
+    (
+        "USER_SELECTED_OPTION",
+        "SHOPPING_CART_EXAMPLE",
+        "Great choice! Here is your cart.",
+    ),
+    (
+        "USER_CHECKED_OUT",
+        "ORDER_CONFIRMATION_EXAMPLE",
+        "Your order is confirmed.",
+    ),
+]
+_DEFAULT_RESPONSE = (
+    None,
+    "WELCOME_SCREEN_EXAMPLE",
+    "Welcome to Verdure! Let's design your dream landscape.",
+)
+
+
+class FakeLlm(BaseLlm):
+    """A deterministic model that answers with recorded A2UI responses."""
+
+    model: str = "fake"
+    base_url: str = "http://localhost:10002"
+    structured_output: bool = False
+    # Fixed delay added to every model call, in seconds.
+    latency: float = 0.0
+    # Probability that a call takes `slow_latency` instead, emulating the slow
+    # tail of a real provider.
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    # Probability that a UI response is invalid: truncated JSON in delimited
+    # mode, an A2UI message missing a required field in structured mode.
+    invalid_rate: float = 0.0
+    # Time to generate one token (~4 characters) of the response. In streaming
+    # mode, each token is sent as a chunk once generated.
+    token_delay: float = 0.0
+    seed: int | None = None
+
+    _random: random.Random = PrivateAttr(default_factory=random.Random)
+    _examples: dict | None = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        if self.seed is not None:
+            self._random.seed(self.seed)
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"fake.*"]
+
+    def _load_examples(self) -> dict:
+        if self._examples is None:
+            self._examples = load_ui_examples(self.base_url)
+        return self._examples
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        latency = self.latency
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            logger.info("--- FakeLlm: Injecting a slow response ---")
+            latency = self.slow_latency
+        if latency:
+            await asyncio.sleep(latency)
+
+        query = _last_user_text(llm_request)
+        marker, example_name, text = match_recorded_response(query) or _DEFAULT_RESPONSE
+
+        if marker == "USER_SUBMITTED_QUESTIONNAIRE" and not _has_function_response(
+            llm_request
+        ):
+            yield LlmResponse(
+                content=types.Content(
+                    role="model",
+                    parts=[
+                        types.Part.from_function_call(
+                            name="get_landscape_options",
+                            args={
+                                "budget": "any",
+                                "style": "any",
+                                "maintenance": "any",
+                                "space_description": query,
+                            },
+                        )
+                    ],
+                ),
+                usage_metadata=_usage(llm_request, query),
+            )
+            return
+
+        if not _is_ui_request(llm_request):
+            response_text = text
+        elif self.structured_output:
+            messages = self._load_examples()[example_name]
+            if self.invalid_rate and self._random.random() < self.invalid_rate:
+                logger.info("--- FakeLlm: Injecting a schema-invalid response ---")
+                messages = _without_surface_id(messages)
+            response_text = json_codec.dumps({TEXT_FIELD: text, A2UI_FIELD: messages})
+        else:
+            json_string = json_codec.dumps(self._load_examples()[example_name])
+            if self.invalid_rate and self._random.random() < self.invalid_rate:
+                logger.info("--- FakeLlm: Injecting a malformed response ---")
+                json_string = json_string[: len(json_string) * 2 // 3]
+            response_text = f"{text}\n{A2UI_DELIMITER}\n{json_string}"
+
+        if stream:
+            for start in range(0, len(response_text), _CHARS_PER_TOKEN):
+                if self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield LlmResponse(
+                    content=types.Content(
+                        role="model",
+                        parts=[
+                            types.Part.from_text(
+                                text=response_text[start : start + _CHARS_PER_TOKEN]
+                            )
+                        ],
+                    ),
+                    partial=True,
+                )
+        elif self.token_delay:
+            # Generating the response takes as long without streaming.
+            chunks = -(-len(response_text) // _CHARS_PER_TOKEN)
+            await asyncio.sleep(self.token_delay * chunks)
+
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part.from_text(text=response_text)]
+            ),
+            usage_metadata=_usage(llm_request, response_text),
+        )
+
+
+def match_recorded_response(query: str) -> tuple[str, str, str] | None:
+    """Returns the (marker, example name, text) recorded for a query, if any."""
+    return next((entry for entry in _RECORDED_RESPONSES if entry[0] in query), None)
+
+
+def _without_surface_id(messages: list[dict]) -> list[dict]:
+    """Returns a copy of `messages` whose first message lacks its `surfaceId`."""
+    kind, body = next(iter(messages[0].items()))
+    body = {key: value for key, value in body.items() if key != "surfaceId"}
+    return [{kind: body}, *messages[1:]]
+
+
+def _usage(llm_request: LlmRequest, response_text: str):
+    """Estimates token counts like a provider would report them (~4 chars per token)."""
+    config = llm_request.config
+    prompt = str(config.system_instruction or "") if config else ""
+    prompt += "".join(
+        part.text or "" for content in llm_request.contents for part in content.parts or []
+    )
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=len(prompt) // _CHARS_PER_TOKEN,
+        candidates_token_count=len(response_text) // _CHARS_PER_TOKEN,
+        total_token_count=(len(prompt) + len(response_text)) // _CHARS_PER_TOKEN,
+    )
+
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents):
+        if content.role != "user" or not content.parts:
+            continue
+        texts = [part.text for part in content.parts if part.text]
+        if texts:
+            return "\n".join(texts)
+    return ""
+
+
+def _has_function_response(llm_request: LlmRequest) -> bool:
+    if not llm_request.contents or not llm_request.contents[-1].parts:
+        return False
+    return any(part.function_response for part in llm_request.contents[-1].parts)
+
+
+def _is_ui_request(llm_request: LlmRequest) -> bool:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    return "A2UI JSON SCHEMA" in str(instruction or "")
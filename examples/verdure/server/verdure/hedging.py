@@ -0,0 +1,163 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Hedged model requests.
+#
+# The tail of the turn latency is dominated by the occasional slow provider
+# response. When a model call has not produced a final response after a
+# threshold (by default the observed p90 latency of that model and action),
+# the agent sends a second, identical request and keeps whichever finishes
+# first with a valid response. Extra requests are limited by a process-wide
+# budget, so hedging cannot multiply provider load when everything is slow.
+#
+# Configuration (environment):
+#   VERDURE_HEDGING           Set to `true` to enable hedged requests.
+#   VERDURE_HEDGE_DELAY       Fixed hedging threshold in seconds. When unset,
+#                             the observed latency quantile is used instead.
+#   VERDURE_HEDGE_QUANTILE    Latency percentile used as threshold (default 90).
+#   VERDURE_HEDGE_MIN_SAMPLES Samples needed before the observed threshold is
+#                             trusted (default 20); no hedging before that.
+#   VERDURE_HEDGE_BUDGET      Extra requests allowed per primary request
+#                             (default 0.1, i.e. at most ~10% more calls).
+
+import logging
+
+from config import env_flag, env_float, env_int
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Histogram the adaptive threshold is derived from.
+LATENCY_METRIC = "agent_attempt_latency_seconds"
+
+
+class HedgeBudget:
+    """
+    A token bucket limiting hedges to a fraction of primary requests.
+
+    Every primary request earns `ratio` tokens, up to `burst`; every hedge
+    spends one.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 3.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    def record_request(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class HedgingPolicy:
+    """Decides when a model call is hedged."""
+
+    def __init__(
+        self,
+        budget: HedgeBudget,
+        delay: float | None = None,
+        quantile: float = 90,
+        min_samples: int = 20,
+    ):
+        self.budget = budget
+        self.delay = delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_env(cls) -> "HedgingPolicy | None":
+        """Returns the configured policy, or None if hedging is disabled."""
+        if not env_flag("VERDURE_HEDGING"):
+            return None
+        delay = env_float("VERDURE_HEDGE_DELAY", 0.0)
+        return cls(
+            budget=_process_budget(),
+            delay=delay if delay > 0 else None,
+            quantile=env_float("VERDURE_HEDGE_QUANTILE", 90),
+            min_samples=env_int("VERDURE_HEDGE_MIN_SAMPLES", 20),
+        )
+
+    def threshold(self, model: str, action: str) -> float | None:
+        """Returns how long to wait before hedging a call, or None to not hedge."""
+        if self.delay is not None:
+            return self.delay
+        if metrics.sample_count(LATENCY_METRIC, model=model, action=action) < self.min_samples:
+            return None
+        return metrics.percentile(
+            LATENCY_METRIC, self.quantile, model=model, action=action
+        )
+
+
+_budget: HedgeBudget | None = None
+
+
+def _process_budget() -> HedgeBudget:
+    """Returns the hedge budget shared by every agent in this process."""
+    global _budget
+    if _budget is None:
+        _budget = HedgeBudget(ratio=env_float("VERDURE_HEDGE_BUDGET", 0.1))
+        metrics.register_gauge("agent_hedge_budget_tokens", lambda: _budget.tokens)
+    return _budget
+
+
+if __name__ == "__main__":
+    # Compares turn latency with and without hedging against the fake model
+    # with an injected slow tail: 5% of calls take 2s instead of 0.1s.
+    import asyncio
+    import os
+    import time
+
+    os.environ.setdefault("LITELLM_MODEL", "fake")
+    os.environ.setdefault("VERDURE_FAKE_LATENCY", "0.1")
+    os.environ.setdefault("VERDURE_FAKE_SLOW_RATE", "0.05")
+    os.environ.setdefault("VERDURE_FAKE_SLOW_LATENCY", "2.0")
+    logging.disable(logging.WARNING)
+
+    from agent import LandscapeAgent
+
+    async def run(hedging: bool, turns: int = 200) -> list[float]:
+        os.environ["VERDURE_HEDGING"] = "true" if hedging else "false"
+        agent = LandscapeAgent(base_url="http://localhost:10002", use_ui=True)
+        latencies = []
+        # Turns run one at a time, so latency reflects the model rather than
+        # CPU contention, and the adaptive threshold learns from earlier turns.
+        for i in range(turns):
+            started = time.monotonic()
+            async for item in agent.stream("USER_WANTS_TO_START_PROJECT", f"s{i}"):
+                if item["is_task_complete"]:
+                    break
+            latencies.append(time.monotonic() - started)
+        return sorted(latencies)
+
+    def pct(values: list[float], q: float) -> float:
+        return values[max(0, int(q / 100 * len(values)) - 1)]
+
+    for hedging in (False, True):
+        metrics.reset()
+        latencies = asyncio.run(run(hedging))
+        hedges = metrics.counter("agent_hedges_total", model="fake")
+        print(
+            f"hedging={'on ' if hedging else 'off'} "
+            f"p50={pct(latencies, 50):.3f}s p90={pct(latencies, 90):.3f}s "
+            f"p99={pct(latencies, 99):.3f}s extra requests={int(hedges)}"
+        )
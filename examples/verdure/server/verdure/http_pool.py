@@ -0,0 +1,371 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# A process-wide HTTP connection pool for model calls.
+#
+# Both agents (and every model they route to) send their requests through one
+# keep-alive `httpx.AsyncClient`, using HTTP/2 when the `h2` package is
+# installed. Pool usage is exported on /metrics: open, active and idle
+# connections, new connections versus reused ones, and how long requests
+# waited for a connection.
+#
+# Configuration (environment):
+#   VERDURE_HTTP_MAX_CONNECTIONS    Maximum open connections (default 100).
+#   VERDURE_HTTP_MAX_KEEPALIVE      Maximum idle connections kept (default 20).
+#   VERDURE_HTTP_KEEPALIVE_EXPIRY   Seconds an idle connection is kept (default 30).
+#   VERDURE_HTTP_CONNECT_TIMEOUT    Connect timeout in seconds (default 5).
+#   VERDURE_HTTP_POOL_TIMEOUT       Seconds to wait for a free connection (default 30).
+#   VERDURE_HTTP_TIMEOUT            Read/write timeout in seconds (default 600).
+#   VERDURE_HTTP2                   Set to `false` to disable HTTP/2.
+
+import logging
+import os
+import ssl
+import time
+
+import httpx
+from config import env_flag, env_float, env_int
+from google.adk.models.lite_llm import LiteLLMClient
+from metrics import metrics
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - depends on the environment
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+# Providers whose litellm handlers accept an `AsyncHTTPHandler` as `client`.
+# OpenAI-compatible providers use `litellm.aclient_session` instead.
+_HTTP_HANDLER_PROVIDERS = {"gemini", "vertex_ai", "vertex_ai_beta", "anthropic"}
+
+# Endpoints of providers litellm does not report an `api_base` for.
+_PROVIDER_BASE_URLS = {
+    "gemini": "https://generativelanguage.googleapis.com",
+    "openai": "https://api.openai.com",
+    "anthropic": "https://api.anthropic.com",
+}
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Records connection reuse and pool wait time for every request."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        timings = {"connect": 0.0, "connect_started": None, "sent": None}
+
+        async def trace(event_name: str, info: dict) -> None:
+            now = time.monotonic()
+            if event_name.startswith("connection.") and event_name.endswith(".started"):
+                timings["connect_started"] = now
+            elif event_name.startswith("connection.") and timings["connect_started"]:
+                timings["connect"] += now - timings["connect_started"]
+                timings["connect_started"] = None
+            elif event_name.endswith("send_request_headers.started") and timings["sent"] is None:
+                timings["sent"] = now
+
+        request.extensions = {**request.extensions, "trace": trace}
+        response = await super().handle_async_request(request)
+
+        reused = timings["connect"] == 0.0
+        metrics.inc("http_requests_total", reused=str(reused).lower())
+        if timings["sent"] is not None:
+            metrics.observe(
+                "http_pool_wait_seconds",
+                max(0.0, timings["sent"] - started - timings["connect"]),
+            )
+        if not reused:
+            metrics.observe("http_connect_seconds", timings["connect"])
+        return response
+
+    def pool_stats(self) -> dict[str, int]:
+        """
+        Returns the open, active and idle connections, or {} if unknown.
+
+        httpx does not expose its connection pool, so this reads the private
+        `_pool` attribute and gives up quietly if a release changes it.
+        """
+        try:
+            connections = list(self._pool.connections)
+            idle = sum(1 for connection in connections if connection.is_idle())
+        except (AttributeError, TypeError):
+            return {}
+        return {
+            "open": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+        }
+
+
+class SharedHttpPool:
+    """Owns the shared client and hands it to litellm in the forms it accepts."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        pool_timeout: float = 30.0,
+        timeout: float = 600.0,
+        http2: bool = True,
+        verify: ssl.SSLContext | bool = True,
+    ):
+        if http2 and h2 is None:
+            logger.info("The 'h2' package is not installed; using HTTP/1.1 only.")
+            http2 = False
+        self.http2 = http2
+        self.transport = _InstrumentedTransport(
+            http2=http2,
+            verify=verify,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout, pool=pool_timeout),
+            follow_redirects=True,
+        )
+        self._handler = None
+
+    @classmethod
+    def from_env(cls) -> "SharedHttpPool":
+        return cls(
+            max_connections=env_int("VERDURE_HTTP_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=env_int("VERDURE_HTTP_MAX_KEEPALIVE", 20),
+            keepalive_expiry=env_float("VERDURE_HTTP_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=env_float("VERDURE_HTTP_CONNECT_TIMEOUT", 5.0),
+            pool_timeout=env_float("VERDURE_HTTP_POOL_TIMEOUT", 30.0),
+            timeout=env_float("VERDURE_HTTP_TIMEOUT", 600.0),
+            http2=env_flag("VERDURE_HTTP2", True),
+        )
+
+    async def http_handler(self):
+        """Returns a litellm `AsyncHTTPHandler` backed by the shared client."""
+        if self._handler is None:
+            from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+            handler = AsyncHTTPHandler()
+            default_client, handler.client = handler.client, self.client
+            self._handler = handler
+            # The handler creates a client of its own, which is never used.
+            await default_client.aclose()
+        return self._handler
+
+    def stats(self) -> dict[str, int]:
+        """Returns the connection counts of the pool, or {} if unknown."""
+        return self.transport.pool_stats()
+
+    async def preconnect(self, urls: list[str]) -> int:
+        """
+        Opens a keep-alive connection to the host of each URL.
+
+        Any HTTP response will do; the connection (TCP, TLS and HTTP/2 set
+        up) stays in the pool for `keepalive_expiry` seconds.
+
+        Returns:
+            The number of hosts connected to.
+        """
+        connected = 0
+        for url in urls:
+            try:
+                response = await self.client.head(url)
+                await response.aclose()
+                connected += 1
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not connect to {url} ahead of time: {e}")
+        return connected
+
+
+class PooledLiteLLMClient(LiteLLMClient):
+    """LiteLLMClient that sends every completion through the shared pool."""
+
+    def __init__(self, pool: SharedHttpPool):
+        self._pool = pool
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        if "client" not in kwargs and _provider(model) in _HTTP_HANDLER_PROVIDERS:
+            kwargs["client"] = await self._pool.http_handler()
+        return await super().acompletion(model, messages, tools, **kwargs)
+
+
+def _provider(model: str) -> str | None:
+    import litellm
+
+    try:
+        return litellm.get_llm_provider(model)[1]
+    except Exception:
+        return None
+
+
+def provider_base_url(model: str) -> str | None:
+    """Returns the endpoint model calls to `model` are sent to, if known."""
+    import litellm
+
+    try:
+        _, provider, _, api_base = litellm.get_llm_provider(model)
+    except Exception:
+        return None
+    if api_base:
+        return api_base
+    if provider in ("vertex_ai", "vertex_ai_beta"):
+        location = os.getenv("VERTEXAI_LOCATION", "us-central1")
+        return f"https://{location}-aiplatform.googleapis.com"
+    return _PROVIDER_BASE_URLS.get(provider)
+
+
+_pool: SharedHttpPool | None = None
+
+
+def get_shared_pool() -> SharedHttpPool:
+    """Returns the pool shared by every model client in this process."""
+    global _pool
+    if _pool is None:
+        import litellm
+
+        _pool = SharedHttpPool.from_env()
+        # Used by litellm's OpenAI-compatible providers.
+        litellm.aclient_session = _pool.client
+        for name in ("open", "active", "idle"):
+            metrics.register_gauge(
+                f"http_pool_connections_{name}",
+                lambda name=name: _pool.stats().get(name),
+            )
+    return _pool
+
+
+if __name__ == "__main__":
+    # Measures per-request overhead against a local TLS stand-in for the model
+    # endpoint: a new client per request (what per-call clients cost), a
+    # shared client without keep-alive (a TCP and TLS handshake per request),
+    # and the shared pool.
+    import asyncio
+    import datetime
+    import tempfile
+
+    import uvicorn
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    def self_signed_certificate(directory: str) -> tuple[str, str]:
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(
+                x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False
+            )
+            .sign(key, hashes.SHA256())
+        )
+        cert_path, key_path = f"{directory}/cert.pem", f"{directory}/key.pem"
+        with open(cert_path, "wb") as f:
+            f.write(certificate.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, "wb") as f:
+            f.write(
+                key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                )
+            )
+        return cert_path, key_path
+
+    async def chat(request):
+        await request.body()
+        return JSONResponse({"choices": [{"message": {"content": "ok"}}]})
+
+    app = Starlette(routes=[Route("/v1/chat/completions", chat, methods=["POST"])])
+    url = "https://localhost:18765/v1/chat/completions"
+    payload = {"model": "stand-in", "messages": [{"role": "user", "content": "hi"}]}
+
+    async def main(directory: str, requests: int = 500, concurrency: int = 10):
+        cert_path, key_path = self_signed_certificate(directory)
+        server = uvicorn.Server(
+            uvicorn.Config(
+                app,
+                host="127.0.0.1",
+                port=18765,
+                log_level="warning",
+                ssl_certfile=cert_path,
+                ssl_keyfile=key_path,
+            )
+        )
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        verify = ssl.create_default_context(cafile=cert_path)
+
+        async def run(label: str, send) -> None:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with semaphore:
+                    await send()
+
+            started = time.monotonic()
+            await asyncio.gather(*(one() for _ in range(requests)))
+            elapsed = time.monotonic() - started
+            print(
+                f"{label:16} {requests / elapsed:8.0f} req/s "
+                f"{elapsed / requests * concurrency * 1000:7.2f} ms/request"
+            )
+
+        async def new_client():
+            async with httpx.AsyncClient(verify=cert_path) as client:
+                await client.post(url, json=payload)
+
+        no_keepalive = httpx.AsyncClient(
+            verify=verify, limits=httpx.Limits(max_keepalive_connections=0)
+        )
+
+        async def new_connection():
+            await no_keepalive.post(url, json=payload)
+
+        # The stand-in only speaks HTTP/1.1.
+        pool = SharedHttpPool(http2=False, verify=verify)
+
+        async def pooled():
+            await pool.client.post(url, json=payload)
+
+        await run("new client", new_client)
+        await run("no keep-alive", new_connection)
+        metrics.reset()
+        await run("shared pool", pooled)
+        print(
+            f"shared pool: {int(metrics.counter('http_requests_total', reused='false'))} "
+            f"connections opened for {requests} requests, {pool.stats()}"
+        )
+
+        await no_keepalive.aclose()
+        await pool.client.aclose()
+        server.should_exit = True
+        await serving
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(main(directory))
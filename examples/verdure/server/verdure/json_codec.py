@@ -0,0 +1,112 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# JSON parsing and serialization on the request path.
+#
+# Model responses, tool results and a2ui payloads go through `loads` and
+# `dumps` here, which use orjson when it is installed and the standard library
+# otherwise. Both produce compact JSON, and decode errors are always
+# `json.JSONDecodeError` (orjson's error is a subclass of it).
+#
+# Configuration (environment):
+#   VERDURE_JSON_BACKEND  `orjson`, `json`, or `auto` (default) to use orjson
+#                         when it is available.
+
+import json
+import logging
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _select_backend() -> str:
+    requested = os.getenv("VERDURE_JSON_BACKEND", "auto").lower()
+    if requested == "json":
+        return "json"
+    if orjson is None:
+        if requested == "orjson":
+            logger.warning("orjson is not installed; using the json module.")
+        return "json"
+    return "orjson"
+
+
+BACKEND = _select_backend()
+
+if BACKEND == "orjson":
+
+    def loads(data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+else:
+
+    def loads(data: str | bytes) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return dumps(obj).encode("utf-8")
+
+
+if __name__ == "__main__":
+    # Compares the backends over the example payloads. Each UI turn parses
+    # one of these once (it used to be twice) and serializes it once.
+    import timeit
+
+    from a2ui_schema import A2UI_SCHEMA
+    from ui_examples import load_ui_examples
+
+    backends = {
+        "json": (
+            json.loads,
+            lambda obj: json.dumps(obj, separators=(",", ":"), ensure_ascii=False),
+        )
+    }
+    if orjson is not None:
+        backends["orjson"] = (orjson.loads, lambda obj: orjson.dumps(obj).decode())
+    else:
+        print("orjson is not installed; only the json module is measured.")
+
+    payloads = dict(load_ui_examples("http://localhost:10002"))
+    payloads["A2UI_SCHEMA"] = json.loads(A2UI_SCHEMA)
+    iterations = 2000
+
+    def per_call_us(fn) -> float:
+        return timeit.timeit(fn, number=iterations) / iterations * 1e6
+
+    header = f"{'payload':32} {'bytes':>7}"
+    for name in backends:
+        header += f" {name + ' loads':>13} {name + ' dumps':>13}"
+    print(header + "  (microseconds per call)")
+    for name, payload in payloads.items():
+        text = json.dumps(payload)
+        line = f"{name:32} {len(text):>7}"
+        for backend_loads, backend_dumps in backends.values():
+            assert backend_loads(text) == payload
+            line += f" {per_call_us(lambda: backend_loads(text)):>13.1f}"
+            line += f" {per_call_us(lambda: backend_dumps(payload)):>13.1f}"
+        print(line)
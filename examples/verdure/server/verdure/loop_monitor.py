@@ -0,0 +1,207 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Event-loop lag monitor and blocking-call detector.
+#
+# A ticker task on the event loop measures how late it is scheduled, which is
+# recorded as the `event_loop_lag_seconds` histogram. A watchdog thread checks
+# the ticker's heartbeat; when the loop has not run for longer than the
+# threshold, it captures the loop thread's stack. Each blocking episode is
+# attributed to a stage (agent, executor, ...) from the innermost frame that
+# belongs to this server and counted per stage and call site. Recent episodes,
+# with their stacks, are served as JSON from `/debug/loop`.
+#
+# Configuration (environment):
+#   VERDURE_LOOP_MONITOR            Set to `true` to enable the monitor.
+#   VERDURE_LOOP_MONITOR_INTERVAL   Seconds between lag samples (default 0.05).
+#   VERDURE_LOOP_BLOCK_THRESHOLD    Seconds the loop must be stalled before a
+#                                   stack is captured (default 0.1).
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any
+
+from config import env_flag, env_float
+from metrics import metrics
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+_SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose frames name the stage a blocking call happened in.
+_STAGES = {
+    "agent": "agent",
+    "agent_executor": "executor",
+    "fake_llm": "model",
+    "tools": "tools",
+}
+
+MAX_EPISODES = 50
+MAX_STACK_DEPTH = 30
+
+
+def attribute(frames: list[traceback.FrameSummary]) -> tuple[str, str]:
+    """Returns the stage and call site of the innermost server frame in `frames`."""
+    for frame in reversed(frames):
+        if frame.filename.startswith("<"):
+            # Generated code, e.g. "<attrs generated init ...>".
+            continue
+        path = os.path.abspath(frame.filename)
+        if os.path.dirname(path) != _SERVER_DIR:
+            continue
+        module = os.path.splitext(os.path.basename(path))[0]
+        if module == os.path.splitext(os.path.basename(__file__))[0]:
+            continue
+        return _STAGES.get(module, module), f"{module}.{frame.name}:{frame.lineno}"
+    return "other", frames[-1].name if frames else "unknown"
+
+
+class LoopMonitor:
+    """Samples event-loop lag and captures the stacks of blocking callbacks."""
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.episodes: deque[dict[str, Any]] = deque(maxlen=MAX_EPISODES)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._ticker: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        # The episode currently in progress, filled in by the watchdog.
+        self._blocked: dict[str, Any] | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor | None":
+        """Returns the configured monitor, or None if it is disabled."""
+        if not env_flag("VERDURE_LOOP_MONITOR"):
+            return None
+        return cls(
+            interval=env_float("VERDURE_LOOP_MONITOR_INTERVAL", 0.05),
+            threshold=env_float("VERDURE_LOOP_BLOCK_THRESHOLD", 0.1),
+        )
+
+    async def start(self) -> None:
+        """Starts the monitor on the running event loop."""
+        if self._ticker is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._ticker = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Event-loop monitor started (interval {self.interval}s, "
+            f"threshold {self.threshold}s)."
+        )
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            metrics.observe("event_loop_lag_seconds", max(0.0, now - expected))
+            with self._lock:
+                self._heartbeat = now
+                blocked, self._blocked = self._blocked, None
+            if blocked is not None:
+                self._finish_episode(blocked, now)
+
+    def _watch(self) -> None:
+        # Checks a few times per threshold so stalls are caught while the
+        # blocking code is still on the stack.
+        period = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(period):
+            with self._lock:
+                stalled = time.monotonic() - self._heartbeat
+                if stalled < self.threshold + self.interval or self._blocked is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                frames = traceback.extract_stack(frame)[-MAX_STACK_DEPTH:]
+                stage, site = attribute(frames)
+                self._blocked = {
+                    "stage": stage,
+                    "site": site,
+                    "started": self._heartbeat,
+                    "stack": traceback.format_list(frames),
+                }
+
+    def _finish_episode(self, blocked: dict[str, Any], now: float) -> None:
+        # The heartbeat is refreshed every `interval`, so that much of the
+        # stall is ordinary sleeping rather than blocking.
+        duration = max(0.0, now - blocked.pop("started") - self.interval)
+        metrics.inc(
+            "event_loop_blocking_calls_total", stage=blocked["stage"], site=blocked["site"]
+        )
+        metrics.observe("event_loop_blocked_seconds", duration, stage=blocked["stage"])
+        self.episodes.append(
+            {"duration_seconds": round(duration, 4), "time": time.time(), **blocked}
+        )
+        logger.warning(
+            f"--- LoopMonitor: Event loop blocked for {duration:.3f}s in "
+            f"{blocked['stage']} ({blocked['site']}) ---"
+        )
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "threshold_seconds": self.threshold,
+            "episodes": list(reversed(self.episodes)),
+        }
+
+
+def loop_monitor_endpoint(monitor: LoopMonitor):
+    """Returns a Starlette route serving the monitor's recent blocking episodes."""
+
+    async def endpoint(request: Request) -> JSONResponse:
+        return JSONResponse(monitor.report())
+
+    return endpoint
+
+
+if __name__ == "__main__":
+    # Blocks the loop for 0.3s and prints what was captured.
+    import json
+
+    async def main():
+        monitor = LoopMonitor(interval=0.02, threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.1)
+        time.sleep(0.3)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        print(json.dumps(monitor.report(), indent=2))
+        print(json.dumps(metrics.snapshot()["histograms"], indent=2))
+
+    asyncio.run(main())
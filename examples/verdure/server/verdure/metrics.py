@@ -0,0 +1,143 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# A tiny in-process metrics registry. It keeps counters and latency samples
+# per label set and is served as JSON from the `/metrics` route, which is
+# enough to compare configurations (e.g. retry rate, p95 turn latency)
+# without running a metrics backend.
+
+import logging
+import math
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent samples kept per histogram for percentile estimates.
+MAX_SAMPLES = 2048
+
+
+def _label_key(labels: dict[str, Any]) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Metrics:
+    """Process-wide counters, histograms and gauges keyed by name and labels."""
+
+    def __init__(self):
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, _Histogram]] = {}
+        self._gauges: dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        if key not in series:
+            series[key] = _Histogram()
+        series[key].observe(value)
+
+    def register_gauge(self, name: str, callback: Callable[[], Any]) -> None:
+        """Registers a callback that is evaluated whenever metrics are read."""
+        self._gauges[name] = callback
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def sample_count(self, name: str, **labels) -> int:
+        """Returns how many samples a histogram currently holds."""
+        histogram = self._histograms.get(name, {}).get(_label_key(labels))
+        return len(histogram.samples) if histogram else 0
+
+    def percentile(self, name: str, q: float, **labels) -> float | None:
+        histogram = self._histograms.get(name, {}).get(_label_key(labels))
+        return histogram.percentile(q) if histogram else None
+
+    def snapshot(self) -> dict[str, Any]:
+        def series(labels: tuple) -> dict[str, str]:
+            return dict(labels)
+
+        gauges = {}
+        for name, callback in self._gauges.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                logger.warning(f"Failed to read gauge {name}: {e}")
+
+        return {
+            "counters": {
+                name: [
+                    {"labels": series(labels), "value": value}
+                    for labels, value in values.items()
+                ]
+                for name, values in self._counters.items()
+            },
+            "histograms": {
+                name: [
+                    {"labels": series(labels), **histogram.summary()}
+                    for labels, histogram in values.items()
+                ]
+                for name, values in self._histograms.items()
+            },
+            "gauges": gauges,
+        }
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+async def metrics_endpoint(request: Request) -> JSONResponse:
+    """Starlette route that serves the current metrics snapshot."""
+    return JSONResponse(metrics.snapshot())
@@ -0,0 +1,101 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Per-action model routing.
+#
+# Not every step of the flow needs the same model: `select_option` and
+# `checkout` are simple template fills, while `submit_details` needs image
+# understanding. The router maps each action (or query class) to a model and
+# names a stronger fallback model to use when a response fails validation.
+#
+# Configuration (environment):
+#   LITELLM_MODEL            Default model for every turn.
+#   VERDURE_MODEL_ROUTES     Comma-separated `<route>=<model>` pairs. A route is
+#                            an a2ui action name (e.g. `checkout`), `image` for
+#                            any turn carrying an uploaded image, or `text` for
+#                            free-text turns.
+#   VERDURE_FALLBACK_MODEL   Model used for retries after a validation failure.
+
+import logging
+import os
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+
+logger = logging.getLogger(__name__)
+
+# Session state key holding the model chosen for the current attempt.
+ROUTED_MODEL_STATE_KEY = "routed_model"
+
+IMAGE_ROUTE = "image"
+TEXT_ROUTE = "text"
+
+
+def parse_routes(value: str | None) -> dict[str, str]:
+    """Parses `route=model` pairs, ignoring malformed entries."""
+    routes = {}
+    for entry in (value or "").split(","):
+        route, sep, model = entry.partition("=")
+        if not sep or not route.strip() or not model.strip():
+            if entry.strip():
+                logger.warning(f"Ignoring malformed model route: '{entry}'")
+            continue
+        routes[route.strip()] = model.strip()
+    return routes
+
+
+class ModelRouter:
+    """Chooses the model for each turn and the fallback for failed attempts."""
+
+    def __init__(
+        self,
+        default_model: str,
+        routes: dict[str, str] | None = None,
+        fallback_model: str | None = None,
+    ):
+        self.default_model = default_model
+        self.routes = routes or {}
+        self.fallback_model = fallback_model
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        return cls(
+            default_model=os.getenv("LITELLM_MODEL", "gemini-2.5-flash"),
+            routes=parse_routes(os.getenv("VERDURE_MODEL_ROUTES")),
+            fallback_model=os.getenv("VERDURE_FALLBACK_MODEL") or None,
+        )
+
+    def model_for(self, action: str | None, has_image: bool = False) -> str:
+        """Returns the model for a turn triggered by `action`."""
+        if action and action in self.routes:
+            return self.routes[action]
+        if has_image and IMAGE_ROUTE in self.routes:
+            return self.routes[IMAGE_ROUTE]
+        if not action and TEXT_ROUTE in self.routes:
+            return self.routes[TEXT_ROUTE]
+        return self.default_model
+
+    def fallback_for(self, model: str) -> str:
+        """Returns the model to retry with after `model` produced an invalid response."""
+        return self.fallback_model or model
+
+
+def route_model_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> None:
+    """before_model_callback that applies the routed model to the request."""
+    model = callback_context.state.get(ROUTED_MODEL_STATE_KEY)
+    if model:
+        llm_request.model = model
+    return None
@@ -0,0 +1,302 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Benchmarks of the a2ui payload path, by payload size.
+#
+# Generates synthetic responses that conform to A2UI_SCHEMA, varying the
+# number of components, the nesting depth and the size of the data model
+# (`dataModelUpdate` entries holding a `valueMap` each), and times every stage
+# a UI response goes through between the model and the client:
+#
+#   split              splitting the text from the JSON at the delimiter
+#   strip_fence        removing the ```json fence around the JSON
+#   json_loads         parsing with the standard library
+#   codec_loads        parsing with json_codec (the configured backend)
+#   schema_validate    jsonschema.validate against A2UI_SCHEMA, as the agent does
+#   schema_validate_cached
+#                      the same with a validator built once, for comparison
+#   structure_validate a2ui_validation.validate_structure
+#   datapart_build     building a DataPart per message, as the executor does
+#   datapart_serialize serializing the status message that carries them
+#
+# Usage:
+#   python payload_bench.py                      print a table
+#   python payload_bench.py --json results.json  also write the results as JSON
+#   python payload_bench.py --baseline results.json
+#       compare against earlier results and exit with status 1 if a stage got
+#       slower than the tolerance allows
+#
+# Baselines are only comparable when recorded on the same machine.
+
+import importlib.metadata
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from typing import Any
+
+import click
+import json_codec
+import jsonschema
+from a2a.types import DataPart, Part
+from a2a.utils import new_agent_parts_message
+from a2ui_ext import a2ui_MIME_TYPE
+from a2ui_schema import load_a2ui_schema
+from a2ui_validation import validate_structure
+from structured_output import A2UI_DELIMITER
+
+# (name, components, depth, data model entries) per benchmark case.
+SUITES = {
+    "default": [
+        ("components-10", 10, 4, 10),
+        ("components-100", 100, 4, 10),
+        ("components-1000", 1_000, 4, 10),
+        ("components-10000", 10_000, 4, 10),
+        ("depth-2", 1_000, 2, 10),
+        ("depth-16", 1_000, 16, 10),
+        ("depth-64", 1_000, 64, 10),
+        ("data-100", 100, 4, 100),
+        ("data-1000", 100, 4, 1_000),
+        ("data-10000", 100, 4, 10_000),
+    ],
+    "quick": [
+        ("components-10", 10, 4, 10),
+        ("components-1000", 1_000, 4, 10),
+        ("depth-64", 1_000, 64, 10),
+        ("data-1000", 100, 4, 1_000),
+    ],
+}
+
+# Stages faster than this are left out of baseline comparisons, where timer
+# noise dominates.
+MIN_COMPARED_US = 20.0
+
+
+def synthetic_response(
+    components: int, depth: int, data_entries: int, map_size: int = 8
+) -> list[dict[str, Any]]:
+    """
+    Returns a2ui messages for one surface with `components` components.
+
+    The tree is a chain of `depth` nested Columns and Rows, with the remaining
+    components spread over the levels as Text and Image leaves bound to the
+    data model. The data model has `data_entries` entries, each a `valueMap`
+    of `map_size` values.
+    """
+    depth = max(1, min(depth, components))
+    containers = [
+        {
+            "id": f"level-{level}",
+            "component": {
+                "Column" if level % 2 == 0 else "Row": {"children": {"explicitList": []}}
+            },
+        }
+        for level in range(depth)
+    ]
+    for level in range(depth - 1):
+        _children(containers[level]).append(f"level-{level + 1}")
+
+    leaves = []
+    for i in range(components - depth):
+        entry = f"/items/item-{i % data_entries}" if data_entries else None
+        if i % 4 == 3:
+            url = (
+                {"path": f"{entry}/image"}
+                if entry
+                else {"literalString": f"https://example.com/{i}.png"}
+            )
+            leaf = {"Image": {"url": url, "fit": "cover"}}
+        else:
+            text = {"path": f"{entry}/name"} if entry else {"literalString": f"Item {i}"}
+            leaf = {"Text": {"text": text}}
+        leaves.append({"id": f"leaf-{i}", "component": leaf})
+        _children(containers[i % depth]).append(f"leaf-{i}")
+
+    contents = []
+    for i in range(data_entries):
+        value_map = [
+            {"key": "name", "valueString": f"Item {i}"},
+            {"key": "image", "valueString": f"https://example.com/{i}.png"},
+        ]
+        for j in range(max(0, map_size - len(value_map))):
+            value_map.append(
+                {"key": f"field-{j}", "valueNumber": i * 0.5 + j}
+                if j % 2 == 0
+                else {"key": f"field-{j}", "valueBoolean": bool(i % 2)}
+            )
+        contents.append({"key": f"item-{i}", "valueMap": value_map})
+
+    return [
+        {
+            "beginRendering": {
+                "surfaceId": "bench",
+                "root": "level-0",
+                "styles": {"primaryColor": "#228B22", "font": "Roboto"},
+            }
+        },
+        {"surfaceUpdate": {"surfaceId": "bench", "components": containers + leaves}},
+        {"dataModelUpdate": {"surfaceId": "bench", "path": "/items", "contents": contents}},
+    ]
+
+
+def _children(container: dict[str, Any]) -> list[str]:
+    (props,) = container["component"].values()
+    return props["children"]["explicitList"]
+
+
+def model_response(messages: list[dict[str, Any]]) -> str:
+    """Returns `messages` as a model writes them: text, delimiter, fenced JSON."""
+    return (
+        "Here is your design.\n"
+        f"{A2UI_DELIMITER}\n```json\n{json.dumps(messages, indent=2)}\n```"
+    )
+
+
+def time_stage(
+    fn: Callable[[], Any], min_time: float, max_runs: int, min_runs: int = 3
+) -> list[float]:
+    """Runs `fn` until `min_time` has passed (within the run limits), returning the run times."""
+    times: list[float] = []
+    while len(times) < min_runs or (sum(times) < min_time and len(times) < max_runs):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def run_case(
+    name: str,
+    components: int,
+    depth: int,
+    data_entries: int,
+    min_time: float = 0.2,
+    max_runs: int = 1000,
+) -> list[dict[str, Any]]:
+    """Times every stage for one synthetic response."""
+    messages = synthetic_response(components, depth, data_entries)
+    content = model_response(messages)
+    _, json_string = content.split(A2UI_DELIMITER, 1)
+    cleaned = json_string.strip().lstrip("```json").rstrip("```").strip()
+    schema = {"type": "array", "items": load_a2ui_schema()}
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    parts = [Part(root=DataPart(data=m, mime_type=a2ui_MIME_TYPE)) for m in messages]
+    status_message = new_agent_parts_message(parts, "context", "task")
+
+    stages = {
+        "split": lambda: content.split(A2UI_DELIMITER, 1),
+        "strip_fence": lambda: json_string.strip().lstrip("```json").rstrip("```").strip(),
+        "json_loads": lambda: json.loads(cleaned),
+        "codec_loads": lambda: json_codec.loads(cleaned),
+        "schema_validate": lambda: jsonschema.validate(instance=messages, schema=schema),
+        "schema_validate_cached": lambda: validator.validate(messages),
+        "structure_validate": lambda: validate_structure(messages),
+        "datapart_build": lambda: [
+            Part(root=DataPart(data=m, mime_type=a2ui_MIME_TYPE)) for m in messages
+        ],
+        "datapart_serialize": lambda: status_message.model_dump_json(exclude_none=True),
+    }
+    results = []
+    for stage, fn in stages.items():
+        times = time_stage(fn, min_time, max_runs)
+        results.append(
+            {
+                "case": name,
+                "components": components,
+                "depth": depth,
+                "data_entries": data_entries,
+                "payload_bytes": len(cleaned.encode("utf-8")),
+                "stage": stage,
+                "runs": len(times),
+                "min_us": min(times) * 1e6,
+                "median_us": statistics.median(times) * 1e6,
+                "p90_us": statistics.quantiles(times, n=10)[-1] * 1e6,
+            }
+        )
+    return results
+
+
+def compare(
+    results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    """
+    Returns the stages that got slower than `tolerance` allows.
+
+    Stages are compared by their fastest run, which varies the least with
+    other load on the machine.
+    """
+    before = {(r["case"], r["stage"]): r["min_us"] for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result["case"], result["stage"])
+        if key not in before or max(before[key], result["min_us"]) < MIN_COMPARED_US:
+            continue
+        ratio = result["min_us"] / before[key]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{key[0]} {key[1]}: {before[key]:.1f}us -> "
+                f"{result['min_us']:.1f}us ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+@click.command()
+@click.option("--suite", type=click.Choice(sorted(SUITES)), default="default")
+@click.option("--min-time", default=0.2, help="Seconds to spend on each stage.")
+@click.option("--json", "json_path", help="Write the results to this file as JSON.")
+@click.option("--baseline", help="Compare against results written by --json.")
+@click.option("--tolerance", default=0.25, help="Allowed slowdown against the baseline.")
+def main(suite, min_time, json_path, baseline, tolerance):
+    results = []
+    click.echo(
+        f"{'case':18} {'stage':22} {'bytes':>9} {'runs':>5} {'median us':>11} {'p90 us':>11}"
+    )
+    for case in SUITES[suite]:
+        for result in run_case(*case, min_time=min_time):
+            results.append(result)
+            click.echo(
+                f"{result['case']:18} {result['stage']:22} {result['payload_bytes']:>9} "
+                f"{result['runs']:>5} {result['median_us']:>11.1f} {result['p90_us']:>11.1f}"
+            )
+
+    document = {
+        "meta": {
+            "suite": suite,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "json_backend": json_codec.BACKEND,
+            "jsonschema": importlib.metadata.version("jsonschema"),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(document, f, indent=2)
+        click.echo(f"Wrote {len(results)} results to {json_path}.")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f)["results"], tolerance)
+        if regressions:
+            click.echo(f"Slower than the baseline by more than {tolerance:.0%}:")
+            for regression in regressions:
+                click.echo(f"  {regression}")
+            sys.exit(1)
+        click.echo("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
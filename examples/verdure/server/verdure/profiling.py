@@ -0,0 +1,293 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# On-demand profiling of single requests.
+#
+# A profile is requested with the `X-Verdure-Profile` header on an A2A
+# request, or armed for the next request(s) of a conversation through
+# `POST /debug/profile`. While the profiled `execute` call runs, a sampler
+# thread records the stack of its asyncio task at a fixed interval. When the
+# task is running, the loop thread's real stack is used; when it is
+# suspended, its chain of awaits (through async generators and awaited
+# tasks) is used instead. The profile therefore covers wall-clock task time,
+# split under a `running` and a `waiting` root frame.
+#
+# Profiles are written as folded stacks (`frame;frame;frame count` per line),
+# which flamegraph.pl, inferno and speedscope read directly.
+#
+# Configuration (environment):
+#   VERDURE_PROFILING             Set to `true` to allow profiling. When unset,
+#                                 no profiling code runs at all.
+#   VERDURE_PROFILE_TOKEN         If set, the header value (or the endpoint's
+#                                 `token` field) must match it.
+#   VERDURE_PROFILE_DIR           Output directory (default `profiles`).
+#   VERDURE_PROFILE_INTERVAL      Seconds between samples (default 0.005).
+#   VERDURE_PROFILE_MIN_INTERVAL  Minimum seconds between two profiles
+#                                 (default 60).
+
+import asyncio
+import contextlib
+import gc
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+import json_codec
+from config import env_flag, env_float
+from metrics import metrics
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-verdure-profile"
+MAX_STACK_DEPTH = 64
+# Most requests one call to the endpoint can arm.
+MAX_ARMED_COUNT = 100
+
+
+def _label(frame: FrameType) -> str:
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+    return f"{module}:{name}"
+
+
+def _await_chain(coro) -> list[str]:
+    """Returns the frames of a suspended coroutine and everything it awaits."""
+    labels = []
+    while coro is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "ag_frame", None)
+            or getattr(coro, "gi_frame", None)
+        )
+        if frame is None:
+            break
+        labels.append(_label(frame))
+        awaited = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "ag_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+        )
+        if isinstance(awaited, asyncio.Task):
+            awaited = awaited.get_coro()
+        elif isinstance(awaited, asyncio.Future):
+            labels.append("<future>")
+            break
+        elif awaited is not None and type(awaited).__name__ == "async_generator_asend":
+            # `async for` awaits an opaque asend object; step into its generator.
+            awaited = next(
+                (r for r in gc.get_referents(awaited) if hasattr(r, "ag_frame")), None
+            )
+        coro = awaited
+    return labels
+
+
+class _Sampler:
+    """Samples the stack of one asyncio task from a background thread."""
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._loop_thread_id = threading.get_ident()
+        self._root_frame = task.get_coro().cr_frame
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                stack = self._running_stack() or ["waiting"] + _await_chain(
+                    self.task.get_coro()
+                )
+            except Exception:  # The task changed while being inspected.
+                continue
+            self.samples[";".join(stack)] += 1
+
+    def _running_stack(self) -> list[str] | None:
+        """Returns the loop thread's stack if it is currently running the task."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            if frame is self._root_frame:
+                labels = [_label(f) for f in reversed(frames)]
+                return ["running"] + labels[:MAX_STACK_DEPTH]
+            frame = frame.f_back
+        return None
+
+
+class RequestProfiler:
+    """Decides which requests are profiled and writes their profiles."""
+
+    def __init__(
+        self,
+        output_dir: str = "profiles",
+        interval: float = 0.005,
+        min_interval: float = 60.0,
+        token: str | None = None,
+    ):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.min_interval = min_interval
+        self.token = token
+        # context_id (or "*" for any) -> number of requests still to profile.
+        self._armed: dict[str, int] = {}
+        self._active = False
+        self._last_started = float("-inf")
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler | None":
+        """Returns the configured profiler, or None if profiling is disabled."""
+        if not env_flag("VERDURE_PROFILING"):
+            return None
+        return cls(
+            output_dir=os.getenv("VERDURE_PROFILE_DIR", "profiles"),
+            interval=env_float("VERDURE_PROFILE_INTERVAL", 0.005),
+            min_interval=env_float("VERDURE_PROFILE_MIN_INTERVAL", 60.0),
+            token=os.getenv("VERDURE_PROFILE_TOKEN") or None,
+        )
+
+    def _authorized(self, value: str | None) -> bool:
+        if not value or not isinstance(value, str):
+            return False
+        return self.token is None or hmac.compare_digest(
+            value.encode(), self.token.encode()
+        )
+
+    def arm(self, context_id: str | None, count: int = 1) -> None:
+        """Profiles the next `count` requests of a conversation (or of any)."""
+        self._armed[context_id or "*"] = count
+
+    def rate_limited(self) -> bool:
+        """Whether a profile would be refused right now."""
+        return self._active or time.monotonic() - self._last_started < self.min_interval
+
+    def _requested(self, context) -> str | None:
+        """
+        Returns why this request is profiled: the armed key it would use, or
+        the header name. Returns None if no profile was asked for.
+        """
+        call_context = context.call_context
+        headers = call_context.state.get("headers", {}) if call_context else {}
+        if self._authorized(headers.get(PROFILE_HEADER)):
+            return PROFILE_HEADER
+        for key in (context.context_id, "*"):
+            if self._armed.get(key, 0) > 0:
+                return key
+        return None
+
+    def _consume(self, key: str) -> None:
+        if key not in self._armed:
+            return
+        self._armed[key] -= 1
+        if not self._armed[key]:
+            del self._armed[key]
+
+    @contextlib.asynccontextmanager
+    async def maybe_profile(self, context):
+        """Profiles the enclosed block if this request asked for a profile."""
+        reason = self._requested(context)
+        if reason is None:
+            yield
+            return
+
+        if self.rate_limited():
+            # An armed profile stays armed for a later request.
+            logger.info("--- Profiler: Rate limited, not profiling this request. ---")
+            metrics.inc("profiles_skipped_total")
+            yield
+            return
+
+        self._consume(reason)
+        self._active = True
+        self._last_started = time.monotonic()
+        sampler = _Sampler(asyncio.current_task(), self.interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            self._active = False
+            path = self._write(context.task_id or "request", sampler.samples)
+            metrics.inc("profiles_written_total")
+            logger.info(
+                f"--- Profiler: Wrote {sum(sampler.samples.values())} samples "
+                f"to {path} ---"
+            )
+
+    def _write(self, name: str, samples: Counter[str]) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded"
+        )
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def profile_endpoint(profiler: RequestProfiler):
+    """
+    Returns a Starlette route that arms the profiler.
+
+    Expects a JSON body like `{"contextId": "...", "count": 1, "token": "..."}`;
+    without `contextId`, the next requests of any conversation are profiled.
+    Responds 400 to a malformed body and 429 while profiles are rate limited.
+    """
+
+    async def endpoint(request: Request) -> JSONResponse:
+        try:
+            body = json_codec.loads(await request.body())
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+            context_id = body.get("contextId")
+            if context_id is not None and not isinstance(context_id, str):
+                raise ValueError("'contextId' must be a string")
+            count = body.get("count", 1)
+            if isinstance(count, bool) or not isinstance(count, int):
+                raise ValueError("'count' must be an integer")
+            if not 1 <= count <= MAX_ARMED_COUNT:
+                raise ValueError(f"'count' must be between 1 and {MAX_ARMED_COUNT}")
+            token = body.get("token")
+            if token is not None and not isinstance(token, str):
+                raise ValueError("'token' must be a string")
+        except ValueError as e:
+            return JSONResponse({"error": f"invalid request: {e}"}, status_code=400)
+
+        if profiler.token is not None and not profiler._authorized(token):
+            return JSONResponse({"error": "invalid token"}, status_code=403)
+        if profiler.rate_limited():
+            return JSONResponse(
+                {"error": "profiling is rate limited, try again later"}, status_code=429
+            )
+        profiler.arm(context_id, count)
+        return JSONResponse({"armed": context_id or "*", "count": count})
+
+    return endpoint
@@ -22,13 +22,17 @@ from ui_examples import LANDSCAPE_UI_EXAMPLES
 # --- The large LANDSCAPE_UI_EXAMPLES string has been removed from here ---
 
 
-def get_ui_prompt(base_url: str, examples: str) -> str:
+def get_ui_prompt(
+    base_url: str, examples: str, structured_output: bool = False
+) -> str:
     """
     Constructs the full prompt with UI instructions, rules, examples, and schema.
 
     Args:
         base_url: The base URL for resolving static assets like logos.
         examples: A string containing the specific UI examples for the agent's task.
+        structured_output: Whether the model replies with a single JSON object
+            (constrained by a response schema) instead of delimited text.
 
     Returns:
         A formatted string to be used as the system prompt for the LLM.
@@ -36,14 +40,23 @@ def get_ui_prompt(base_url: str, examples: str) -> str:
     # The f-string substitution for base_url happens here, at runtime.
     formatted_examples = examples.format(base_url=base_url)
 
-    return f"""
-    You are a helpful landscape design assistant. Your final output MUST be an a2ui UI JSON response.
-
-    To generate the response, you MUST follow these rules:
+    if structured_output:
+        response_rules = """
+    1.  Your response MUST be a single JSON object with exactly two fields: `text` and `a2ui`.
+    2.  The `text` field is your conversational text response.
+    3.  The `a2ui` field is a list (array) of A2UI messages.
+    4.  Each message in `a2ui` MUST validate against the A2UI JSON SCHEMA provided below."""
+    else:
+        response_rules = """
     1.  Your response MUST be in two parts, separated by the delimiter: `---a2ui_JSON---`.
     2.  The first part is your conversational text response.
     3.  The second part is a single, raw JSON object which is a list (array) of A2UI messages.
-    4.  The JSON part MUST validate against the A2UI JSON SCHEMA provided below.
+    4.  The JSON part MUST validate against the A2UI JSON SCHEMA provided below."""
+
+    return f"""
+    You are a helpful landscape design assistant. Your final output MUST be an a2ui UI JSON response.
+
+    To generate the response, you MUST follow these rules:{response_rules}
 
     --- UI TEMPLATE RULES ---
     -   If the user query is a greeting or "start", you MUST use the `WELCOME_SCREEN_EXAMPLE` template.
@@ -0,0 +1,314 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Cache of the questionnaires generated for yard photos.
+#
+# The `submit_details` turn, where the model looks at the photo and writes a
+# questionnaire about it, is the most expensive one of the flow, and the same
+# photo is often submitted again (the bundled `old_backyard.png` demo image by
+# most sessions). Validated questionnaires are cached under a key made of
+#   - the SHA-256 of the image content (not its URL),
+#   - the yard description, lower-cased with whitespace collapsed,
+#   - the prompt version, a hash of the UI agent's instruction, so a change to
+#     the prompt, its examples or the schema never serves an old questionnaire.
+# Each entry holds the response with its validated a2ui messages, and the
+# image features the model extracted: the text it wrote about the photo and
+# the questions it asked. The URL of the photo is substituted on a hit, since
+# the same image can be sent under another URL.
+#
+# Entries are evicted least recently used first. With a directory configured,
+# each entry is also written there as a JSON file and the most recent ones are
+# loaded again on start.
+#
+# Configuration (environment):
+#   VERDURE_QUESTIONNAIRE_CACHE       Set to `true` to cache questionnaires.
+#   VERDURE_QUESTIONNAIRE_CACHE_SIZE  Questionnaires kept (default 256).
+#   VERDURE_QUESTIONNAIRE_CACHE_DIR   Directory the cache is persisted to.
+#                                     Unset, it is kept in memory only.
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any
+
+import json_codec
+from config import env_flag, env_int
+from metrics import metrics
+from structured_output import A2UI_DELIMITER
+
+logger = logging.getLogger(__name__)
+
+# Components whose literal text asks the user something about the photo.
+_QUESTION_FIELDS = {"Heading": "text", "CheckBox": "label", "TextField": "label"}
+
+
+def prompt_version(instruction: str) -> str:
+    """Returns a short hash identifying a prompt."""
+    return hashlib.sha256(instruction.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_description(description: str) -> str:
+    return " ".join(description.lower().split())
+
+
+def questionnaire_key(image_sha256: str, description: str, version: str) -> str:
+    """Returns the cache key of the questionnaire for a photo and description."""
+    parts = (image_sha256, normalize_description(description), version)
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def image_features(content: str, messages: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Returns what the model made of the photo, from its questionnaire response.
+
+    That is the text before the a2ui JSON, and the literal text of the
+    questions and choices in the questionnaire, in order.
+    """
+    summary = content.split(A2UI_DELIMITER, 1)[0].strip()
+    questions = []
+    for message in messages:
+        for component in message.get("surfaceUpdate", {}).get("components") or []:
+            definition = component.get("component")
+            if not isinstance(definition, dict) or len(definition) != 1:
+                continue
+            kind, props = next(iter(definition.items()))
+            if not isinstance(props, dict):
+                continue
+            if kind in _QUESTION_FIELDS:
+                text = _literal(props.get(_QUESTION_FIELDS[kind]))
+                if text:
+                    questions.append(text)
+            elif kind == "MultipleChoice":
+                questions += [
+                    text
+                    for option in props.get("options") or []
+                    if (text := _literal(option.get("label")))
+                ]
+    return {"summary": summary, "questions": questions}
+
+
+def _literal(value: Any) -> str | None:
+    return value.get("literalString") if isinstance(value, dict) else None
+
+
+def _replace_string(value: Any, old: str, new: str) -> Any:
+    """Returns `value` with every string equal to `old` replaced by `new`."""
+    if isinstance(value, str):
+        return new if value == old else value
+    if isinstance(value, list):
+        return [_replace_string(item, old, new) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_string(item, old, new) for key, item in value.items()}
+    return value
+
+
+class CachedQuestionnaire:
+    """A validated questionnaire response and the image features it holds."""
+
+    def __init__(
+        self,
+        key: str,
+        image_url: str,
+        content: str,
+        messages: list[dict[str, Any]],
+        features: dict[str, Any],
+        created: float | None = None,
+    ):
+        self.key = key
+        self.image_url = image_url
+        self.content = content
+        self.messages = messages
+        self.features = features
+        self.created = created if created is not None else time.time()
+
+    def response(self, image_url: str) -> dict[str, Any]:
+        """Returns the final response item for a turn about the photo at `image_url`."""
+        if image_url == self.image_url:
+            content, messages = self.content, self.messages
+        else:
+            content = self.content.replace(self.image_url, image_url)
+            messages = _replace_string(self.messages, self.image_url, image_url)
+        return {"is_task_complete": True, "content": content, "a2ui_messages": messages}
+
+    def to_json(self) -> bytes:
+        return json_codec.dumps_bytes(
+            {
+                "key": self.key,
+                "image_url": self.image_url,
+                "content": self.content,
+                "messages": self.messages,
+                "features": self.features,
+                "created": self.created,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "CachedQuestionnaire":
+        fields = json_codec.loads(data)
+        return cls(
+            fields["key"],
+            fields["image_url"],
+            fields["content"],
+            fields["messages"],
+            fields["features"],
+            fields["created"],
+        )
+
+
+class QuestionnaireCache:
+    """A least-recently-used cache of questionnaires, optionally kept on disk."""
+
+    def __init__(self, max_entries: int = 256, directory: str | None = None):
+        self.max_entries = max(1, max_entries)
+        self.directory = directory
+        self._entries: OrderedDict[str, CachedQuestionnaire] = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+        metrics.register_gauge("questionnaire_cache_entries", lambda: len(self._entries))
+
+    @classmethod
+    def from_env(cls) -> "QuestionnaireCache | None":
+        """Returns the configured cache, or None if questionnaires are not cached."""
+        if not env_flag("VERDURE_QUESTIONNAIRE_CACHE"):
+            return None
+        return cls(
+            max_entries=env_int("VERDURE_QUESTIONNAIRE_CACHE_SIZE", 256),
+            directory=os.getenv("VERDURE_QUESTIONNAIRE_CACHE_DIR") or None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> CachedQuestionnaire | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.inc("questionnaire_cache_total", outcome="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("questionnaire_cache_total", outcome="hit")
+        return entry
+
+    async def put(
+        self, key: str, image_url: str, content: str, messages: list[dict[str, Any]]
+    ) -> CachedQuestionnaire:
+        """Caches a validated questionnaire, evicting the least recently used ones."""
+        entry = CachedQuestionnaire(
+            key, image_url, content, messages, image_features(content, messages)
+        )
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+        metrics.inc("questionnaire_cache_total", outcome="store")
+        if evicted:
+            metrics.inc("questionnaire_cache_total", len(evicted), outcome="evicted")
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._persist, entry, evicted)
+            except OSError as e:
+                logger.warning(f"Failed to persist questionnaire {key}: {e}")
+        return entry
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _persist(self, entry: CachedQuestionnaire, evicted: list[str]) -> None:
+        # Written under a temporary name first, so a crash never leaves a
+        # truncated entry behind.
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, suffix=".part", delete=False
+        ) as f:
+            f.write(entry.to_json())
+        os.replace(f.name, self._path(entry.key))
+        for key in evicted:
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _load(self) -> None:
+        """Loads the most recently written entries from the cache directory."""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".json"):
+                files.append((os.path.getmtime(path), path))
+            elif name.endswith(".part"):
+                os.unlink(path)
+        files.sort()
+        for _, path in files[: len(files) - self.max_entries]:
+            os.unlink(path)
+        for _, path in files[-self.max_entries :]:
+            try:
+                with open(path, "rb") as f:
+                    entry = CachedQuestionnaire.from_json(f.read())
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable cached questionnaire {path}: {e}")
+                continue
+            self._entries[entry.key] = entry
+        logger.info(f"Loaded {len(self._entries)} cached questionnaires from {self.directory}.")
+
+
+if __name__ == "__main__":
+    # Submits the demo photo to the fake model in a few conversations, with and
+    # without the cache, then restarts the cache from its directory. The fake
+    # model is given the latency of a real image turn.
+    import sys
+
+    os.environ.setdefault("LITELLM_MODEL", "fake")
+    os.environ.setdefault("VERDURE_FAKE_LATENCY", "2.0")
+    logging.disable(logging.WARNING)
+
+    from agent import LandscapeAgent
+    from uploads import bundled_image_path, file_sha256
+
+    base_url = "http://localhost:10002"
+    image_url = f"{base_url}/images/old_backyard.png"
+    description = "Photo of an old backyard with a concrete patio and weeds."
+    query = f"USER_SUBMITTED_DETAILS: Description: '{description}', Image: '{image_url}'"
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    async def run(cache: QuestionnaireCache | None) -> float:
+        agent = LandscapeAgent(base_url=base_url, use_ui=True)
+        key = questionnaire_key(
+            file_sha256(bundled_image_path(image_url, base_url)),
+            description,
+            agent.prompt_version,
+        )
+        started = time.monotonic()
+        for i in range(turns):
+            entry = cache.get(key) if cache is not None else None
+            if entry is not None:
+                continue
+            async for item in agent.stream(query, f"s{i}", action="submit_details"):
+                if item["is_task_complete"] and cache is not None:
+                    await cache.put(key, image_url, item["content"], item["a2ui_messages"])
+        return (time.monotonic() - started) / turns
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, cache in (
+            ("uncached", None),
+            ("cached", QuestionnaireCache(directory=directory)),
+        ):
+            print(f"{label:9} {asyncio.run(run(cache)) * 1000:7.1f}ms per turn")
+        restarted = QuestionnaireCache(directory=directory)
+        print(f"restarted with {len(restarted)} cached questionnaire(s)")
+        for entry in restarted._entries.values():
+            print(f"features: {json_codec.dumps(entry.features)}")
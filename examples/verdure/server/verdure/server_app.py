@@ -0,0 +1,149 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The server's ASGI application, built by a factory.
+#
+# uvicorn calls `create_app` in every worker process, so each worker builds
+# its own executor, agents, task store, connection pool and background tasks
+# instead of inheriting them from the parent. The workers share only what is
+# on disk (uploads, the questionnaire cache directory, trace files), and the
+# settings in the environment. Conversations and tasks are kept in memory per
+# worker, so with several workers every request of a conversation must reach
+# the same worker; `affinity_router` routes them so by default.
+#
+# Configuration (environment):
+#   VERDURE_BASE_URL  The URL clients reach the server at, used in the agent
+#                     card and image URLs. `__main__` sets it from --host and
+#                     --port unless it is already set (behind a proxy, say).
+#   ADK_CAPTURE_MESSAGE_CONTENT_IN_SPANS
+#                     Defaults to `false` when VERDURE_STREAM_TEXT is on: ADK
+#                     otherwise serializes the whole request, prompt included,
+#                     into its span for every streamed chunk.
+
+import logging
+import os
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import AgentCapabilities, AgentCard, AgentSkill
+from a2ui_encoding import get_compact_keys
+from a2ui_ext import a2uiExtension
+from agent import LandscapeAgent
+from agent_executor import LandscapeAgentExecutor
+from config import env_flag
+from dotenv import load_dotenv
+from loop_monitor import LoopMonitor, loop_monitor_endpoint
+from metrics import metrics_endpoint
+from profiling import profile_endpoint
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.staticfiles import StaticFiles
+from tracing import configure_tracing
+from uploads import IMAGES_DIR, upload_endpoint
+from validation_pool import shutdown_validation_pool
+from warmup import Warmup, ready_endpoint
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://localhost:10002"
+
+
+def create_app() -> Starlette:
+    """Builds the application and everything it serves, for one worker process."""
+    base_url = os.getenv("VERDURE_BASE_URL", DEFAULT_BASE_URL)
+
+    hello_ext = a2uiExtension(compact_keys=get_compact_keys())
+    capabilities = AgentCapabilities(
+        streaming=True,
+        extensions=[
+            hello_ext.agent_extension(),
+        ],
+    )
+    skill = AgentSkill(
+        id="design_landscape",
+        name="Landscape Design Tool",
+        description="Helps users design a landscape by guiding them through preferences and options.",
+        tags=["landscape", "design", "garden"],
+        examples=["Design my backyard", "Start a new landscape project"],
+    )
+
+    agent_card = AgentCard(
+        name="A2UIScape Design",
+        description="This agent helps you envision your dream landscape.",
+        url=base_url,  # <-- Use base_url here
+        version="1.0.0",
+        default_input_modes=LandscapeAgent.SUPPORTED_CONTENT_TYPES,
+        default_output_modes=LandscapeAgent.SUPPORTED_CONTENT_TYPES,
+        capabilities=capabilities,
+        skills=[skill],
+    )
+
+    if env_flag("VERDURE_STREAM_TEXT"):
+        os.environ.setdefault("ADK_CAPTURE_MESSAGE_CONTENT_IN_SPANS", "false")
+    tracer_provider = configure_tracing()
+    agent_executor = LandscapeAgentExecutor(base_url=base_url)
+    profiler = agent_executor.profiler
+    warmup = Warmup.from_env(agent_executor)
+
+    agent_executor = hello_ext.wrap_executor(agent_executor)
+
+    request_handler = DefaultRequestHandler(
+        agent_executor=agent_executor,
+        task_store=InMemoryTaskStore(),
+    )
+    server = A2AStarletteApplication(
+        agent_card=agent_card, http_handler=request_handler
+    )
+
+    app = server.build()
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+    app.add_route("/uploads", upload_endpoint(base_url), methods=["POST"])
+    # Reports ready once the warm-up started with the server is done.
+    app.add_route("/ready", ready_endpoint(warmup), methods=["GET"])
+    app.add_event_handler("startup", warmup.start)
+    app.add_event_handler("shutdown", warmup.stop)
+
+    if profiler is not None:
+        app.add_route(
+            "/debug/profile", profile_endpoint(profiler), methods=["POST"]
+        )
+
+    loop_monitor = LoopMonitor.from_env()
+    if loop_monitor is not None:
+        app.add_event_handler("startup", loop_monitor.start)
+        app.add_event_handler("shutdown", loop_monitor.stop)
+        app.add_route(
+            "/debug/loop", loop_monitor_endpoint(loop_monitor), methods=["GET"]
+        )
+
+    if tracer_provider is not None:
+        # Writes the trees of tasks still in progress.
+        app.add_event_handler("shutdown", tracer_provider.shutdown)
+
+    app.add_event_handler("shutdown", shutdown_validation_pool)
+    logger.info(f"Built the application for worker process {os.getpid()}.")
+    return app
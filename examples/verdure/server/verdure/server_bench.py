@@ -0,0 +1,185 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Throughput of the server by number of worker processes.
+#
+# Starts the server (`python .`) with the fake model for each worker count,
+# waits for every worker to start, then sends requests from a fixed number of
+# concurrent connections for a while and reports requests per second for:
+#
+#   agent-card  GET /.well-known/agent-card.json
+#   image       GET /images/old_backyard.png (a static file of ~2 MB)
+#   a2a         a greeting sent with message/send, with the a2ui extension,
+#               answered by the fake model (a new conversation each time)
+#
+# The load is generated by one client process on the same machine, so with
+# few CPUs the client competes with the workers; compare worker counts on the
+# same machine only.
+#
+# Usage:
+#   python server_bench.py                      1, 2, 4 and 8 workers
+#   python server_bench.py -w 1 -w 4 --duration 10 --loop uvloop --http httptools
+
+import asyncio
+import collections
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import click
+import httpx
+from a2a.extensions.common import HTTP_EXTENSION_HEADER
+from a2ui_ext import URI as A2UI_EXTENSION_URI
+
+SCENARIOS = ("agent-card", "image", "a2a")
+
+
+def _request(scenario: str) -> tuple[str, str, dict | None, dict | None]:
+    """Returns the method, path, JSON body and headers of one request."""
+    if scenario == "agent-card":
+        return "GET", "/.well-known/agent-card.json", None, None
+    if scenario == "image":
+        return "GET", "/images/old_backyard.png", None, None
+    body = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "message/send",
+        "params": {
+            "message": {
+                "role": "user",
+                "parts": [{"kind": "text", "text": "hi"}],
+                "messageId": uuid.uuid4().hex,
+            }
+        },
+    }
+    return "POST", "/", body, {HTTP_EXTENSION_HEADER: A2UI_EXTENSION_URI}
+
+
+async def run_load(
+    base_url: str, scenario: str, duration: float, concurrency: int
+) -> tuple[int, int, float]:
+    """Sends requests for `duration` seconds, returning (successes, errors, seconds)."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        ok = errors = 0
+        deadline = time.monotonic() + duration
+
+        async def connection() -> None:
+            nonlocal ok, errors
+            while time.monotonic() < deadline:
+                method, path, body, headers = _request(scenario)
+                try:
+                    response = await client.request(method, path, json=body, headers=headers)
+                    await response.aread()
+                    if response.status_code == 200:
+                        ok += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        return ok, errors, time.monotonic() - started
+
+
+def start_server(port: int, workers: int, loop: str, http: str) -> subprocess.Popen:
+    """Starts the server and returns once every worker has started."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {
+        **os.environ,
+        "LITELLM_MODEL": "fake",
+        "VERDURE_BASE_URL": f"http://localhost:{port}",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            here,
+            *("--port", str(port), "--workers", str(workers)),
+            *("--loop", loop, "--http", http),
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    started = 0
+    for line in server.stderr:
+        if "Application startup complete" in line:
+            started += 1
+            if started == workers:
+                break
+    else:
+        raise RuntimeError(f"The server exited with status {server.wait()}.")
+    # Keeps the log pipe from filling up while the benchmark runs.
+    threading.Thread(
+        target=collections.deque, args=(server.stderr, 0), daemon=True
+    ).start()
+    return server
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("The server did not become ready.")
+
+
+@click.command()
+@click.option(
+    "-w", "--workers", "worker_counts", multiple=True, type=int, default=(1, 2, 4, 8)
+)
+@click.option(
+    "--scenario", "scenarios", multiple=True, type=click.Choice(SCENARIOS), default=SCENARIOS
+)
+@click.option("--duration", default=5.0, help="Seconds of load per scenario.")
+@click.option("--concurrency", default=32, help="Concurrent client connections.")
+@click.option("--loop", type=click.Choice(["auto", "asyncio", "uvloop"]), default="auto")
+@click.option("--http", type=click.Choice(["auto", "h11", "httptools"]), default="auto")
+@click.option("--port", default=10102)
+def main(worker_counts, scenarios, duration, concurrency, loop, http, port):
+    click.echo(f"CPUs: {os.cpu_count()}, loop={loop}, http={http}, concurrency={concurrency}")
+    click.echo(f"{'workers':>7} {'scenario':12} {'requests':>9} {'errors':>7} {'req/s':>9}")
+    base_url = f"http://localhost:{port}"
+    for workers in worker_counts:
+        server = start_server(port, workers, loop, http)
+        try:
+            asyncio.run(wait_ready(base_url))
+            for scenario in scenarios:
+                ok, errors, elapsed = asyncio.run(
+                    run_load(base_url, scenario, duration, concurrency)
+                )
+                click.echo(
+                    f"{workers:>7} {scenario:12} {ok:>9} {errors:>7} {ok / elapsed:>9.1f}"
+                )
+        finally:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Speculative pre-generation of the next screen.
+#
+# The Verdure flow is very predictable: once the options screen is shown, the
+# next request is almost always `select_option` for one of the presented
+# options. The scheduler uses idle capacity to generate those likely next
+# responses ahead of time and keeps them in a short-lived cache per
+# conversation. When the real request arrives, a matching speculation is
+# served (or awaited, if still running) and every other speculation for that
+# conversation is cancelled.
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from metrics import metrics
+from surface_state import decode_contents
+
+logger = logging.getLogger(__name__)
+
+
+class _Speculation:
+    def __init__(
+        self,
+        task: asyncio.Task,
+        cleanup: Callable[[], Awaitable[None]] | None,
+    ):
+        self.task = task
+        self.cleanup = cleanup
+        self.started_at = time.monotonic()
+        self.finished_at: float | None = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self.finished_at = time.monotonic()
+
+
+class SpeculativeScheduler:
+    """Runs speculative turns in the background and caches their results."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        ttl: float = 120.0,
+        is_idle: Callable[[], bool] | None = None,
+    ):
+        self._max_concurrent = max_concurrent
+        self._ttl = ttl
+        self._is_idle = is_idle or (lambda: True)
+        # context_id -> key -> speculation
+        self._entries: dict[str, dict[str, _Speculation]] = {}
+        metrics.register_gauge("speculations_running", self._running)
+
+    def _running(self) -> int:
+        return sum(
+            1
+            for entries in self._entries.values()
+            for entry in entries.values()
+            if not entry.task.done()
+        )
+
+    def schedule(
+        self,
+        context_id: str,
+        key: str,
+        run: Callable[[], Awaitable[Any]],
+        cleanup: Callable[[], Awaitable[None]] | None = None,
+    ) -> bool:
+        """
+        Starts `run()` as a speculation for `key`, if there is idle capacity.
+
+        Args:
+            context_id: The conversation the speculation belongs to.
+            key: Identifies the request the speculation answers.
+            run: Produces the speculative result.
+            cleanup: Releases resources held by a result that is never used.
+
+        Returns:
+            True if the speculation was started.
+        """
+        self._expire()
+        entries = self._entries.setdefault(context_id, {})
+        if key in entries:
+            return False
+        if self._running() >= self._max_concurrent or not self._is_idle():
+            logger.info(f"--- Speculation: No idle capacity, skipping '{key}' ---")
+            metrics.inc("speculations_skipped_total")
+            return False
+
+        logger.info(f"--- Speculation: Pre-generating '{key}' for {context_id} ---")
+        entries[key] = _Speculation(asyncio.create_task(run()), cleanup)
+        metrics.inc("speculations_started_total")
+        return True
+
+    async def take(self, context_id: str, key: str) -> Any | None:
+        """
+        Returns the speculative result for `key`, waiting for it if still running.
+
+        Any other speculation for the conversation is discarded, since the
+        conversation has moved on.
+        """
+        self._expire()
+        entries = self._entries.pop(context_id, {})
+        entry = entries.pop(key, None)
+        for other in entries.values():
+            self._discard(other)
+
+        if entry is None:
+            if entries:
+                metrics.inc("speculation_misses_total")
+            return None
+
+        requested_at = time.monotonic()
+        try:
+            # Shielded, so cancelling the request does not look like a
+            # cancelled speculation.
+            result = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            self._discard(entry)
+            if asyncio.current_task().cancelling() or not entry.task.cancelled():
+                # The request itself was cancelled.
+                raise
+            metrics.inc("speculation_misses_total")
+            return None
+        except Exception as e:
+            logger.warning(f"--- Speculation: '{key}' failed: {e} ---")
+            self._discard(entry)
+            metrics.inc("speculation_misses_total")
+            return None
+
+        # Latency saved is the generation time that happened before the
+        # request arrived.
+        saved = min(requested_at, entry.finished_at or requested_at) - entry.started_at
+        metrics.inc("speculation_hits_total")
+        metrics.observe("speculation_latency_saved_seconds", max(saved, 0.0))
+        logger.info(f"--- Speculation: Hit for '{key}', saved {saved:.2f}s ---")
+        return result
+
+    def discard(self, context_id: str) -> None:
+        """Drops every speculation for a conversation."""
+        for entry in self._entries.pop(context_id, {}).values():
+            self._discard(entry)
+
+    def _discard(self, entry: _Speculation) -> None:
+        metrics.inc("speculations_discarded_total")
+        if not entry.task.done():
+            entry.task.cancel()
+        if entry.cleanup is not None:
+            cleanup = entry.cleanup
+
+            async def run_cleanup():
+                # Wait for a cancelled speculation to unwind before cleaning up.
+                await asyncio.gather(entry.task, return_exceptions=True)
+                await cleanup()
+
+            asyncio.create_task(run_cleanup())
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for context_id in list(self._entries):
+            entries = self._entries[context_id]
+            for key in [k for k, e in entries.items() if now - e.started_at > self._ttl]:
+                self._discard(entries.pop(key))
+            if not entries:
+                del self._entries[context_id]
+
+
+def _resolve(value: dict[str, Any], data_model: dict[str, Any]) -> Any:
+    for literal in ("literalString", "literalNumber", "literalBoolean"):
+        if literal in value:
+            return value[literal]
+    node: Any = data_model
+    for segment in str(value.get("path", "")).strip("/").split("/"):
+        node = node.get(segment) if isinstance(node, dict) else None
+    return node
+
+
+def predict_next_actions(
+    messages: list[dict[str, Any]], actions: set[str]
+) -> list[tuple[str, dict[str, Any]]]:
+    """
+    Finds the buttons in `messages` that trigger one of `actions`.
+
+    Returns:
+        A list of (action name, resolved action context) pairs, in the order
+        the buttons appear.
+    """
+    data_models: dict[str, dict[str, Any]] = {}
+    for message in messages:
+        update = message.get("dataModelUpdate") if isinstance(message, dict) else None
+        if update and (update.get("path") or "/") == "/":
+            data_models[update.get("surfaceId")] = decode_contents(
+                update.get("contents", [])
+            )
+
+    predictions = []
+    for message in messages:
+        update = message.get("surfaceUpdate") if isinstance(message, dict) else None
+        if not update:
+            continue
+        data_model = data_models.get(update.get("surfaceId"), {})
+        for component in update.get("components", []):
+            button = component.get("component", {}).get("Button")
+            action = (button or {}).get("action") or {}
+            if action.get("name") not in actions:
+                continue
+            context = {
+                item["key"]: _resolve(item.get("value", {}), data_model)
+                for item in action.get("context", [])
+                if "key" in item
+            }
+            predictions.append((action["name"], context))
+    return predictions
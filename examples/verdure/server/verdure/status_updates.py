@@ -0,0 +1,196 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Coalescing of intermediate ("working") status updates.
+#
+# The agent reports progress for runner events as they arrive, which can be
+# many per turn, most of them saying the same thing. Every update the executor
+# publishes is a task-store write and an SSE event, so updates go through a
+# `StatusThrottle` per turn:
+#   - an update repeating the text on screen is dropped;
+#   - updates closer together than the minimum interval are coalesced, and the
+#     latest one is sent once the interval has passed;
+#   - after the per-turn cap, further updates are dropped.
+# The final response is never throttled; it discards a pending update.
+# Streamed response text (see text_stream.py) is coalesced over its own,
+# shorter interval and does not count towards the cap.
+#
+# Configuration (environment):
+#   VERDURE_STATUS_MIN_INTERVAL  Seconds between working updates of a turn
+#                                (default 0.5, 0 to not coalesce).
+#   VERDURE_STATUS_MAX_UPDATES   Working updates sent per turn (default 10,
+#                                0 for no limit).
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from config import env_float, env_int
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StatusThrottle:
+    """Coalesces the working updates of one turn before they are sent."""
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        min_interval: float = 0.5,
+        max_updates: int = 10,
+        stream_interval: float = 0.05,
+    ):
+        self._send = send
+        self.min_interval = min_interval
+        self.max_updates = max_updates
+        self.stream_interval = stream_interval
+        self.sent = 0
+        self.dropped = 0
+        # Sent updates that count towards `max_updates`.
+        self._counted = 0
+        self._last_text: str | None = None
+        self._last_sent = float("-inf")
+        self._pending: str | None = None
+        self._pending_counted = False
+        self._timer: asyncio.Task | None = None
+        self._closed = False
+        # Held while an update is being sent, so updates stay in order.
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, send: Callable[[str], Awaitable[None]]) -> "StatusThrottle":
+        return cls(
+            send,
+            min_interval=env_float("VERDURE_STATUS_MIN_INTERVAL", 0.5),
+            max_updates=env_int("VERDURE_STATUS_MAX_UPDATES", 10),
+            stream_interval=env_float("VERDURE_STREAM_TEXT_INTERVAL", 0.05),
+        )
+
+    async def update(self, text: str, streaming: bool = False) -> None:
+        """
+        Sends `text` now, later, or not at all.
+
+        `streaming` marks the streamed text of the response.
+        """
+        if self._closed:
+            return
+        if text == self._last_text:
+            # Back to what is on screen; a pending update is outdated.
+            self._drop(self._pending is not None)
+            self._pending = None
+            self._drop()
+            return
+        if text == self._pending or (
+            not streaming and self.max_updates and self._counted >= self.max_updates
+        ):
+            self._drop()
+            return
+        interval = self.stream_interval if streaming else self.min_interval
+        wait = self._last_sent + interval - time.monotonic()
+        if wait <= 0 and self._timer is None:
+            await self._emit(text, counted=not streaming)
+            return
+        self._drop(self._pending is not None)
+        self._pending, self._pending_counted = text, not streaming
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._send_later(max(wait, 0.0)))
+
+    async def close(self) -> None:
+        """Discards a pending update and waits for one being sent."""
+        if self._closed:
+            return
+        self._closed = True
+        self._drop(self._pending is not None)
+        self._pending = None
+        if self._timer is not None:
+            self._timer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._timer
+        async with self._lock:
+            pass
+        metrics.observe("executor_status_updates_per_turn", self.sent)
+
+    async def _send_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        text, self._pending = self._pending, None
+        if text is not None:
+            # Cancelling the timer from here on must not interrupt the send.
+            await asyncio.shield(self._emit(text, self._pending_counted))
+
+    async def _emit(self, text: str, counted: bool) -> None:
+        self._last_text = text
+        self._last_sent = time.monotonic()
+        self.sent += 1
+        self._counted += counted
+        metrics.inc("executor_status_updates_total", outcome="sent")
+        async with self._lock:
+            await self._send(text)
+
+    def _drop(self, dropped: bool = True) -> None:
+        if dropped:
+            self.dropped += 1
+            metrics.inc("executor_status_updates_total", outcome="dropped")
+
+
+if __name__ == "__main__":
+    # Events and CPU time per turn for a turn that reports progress on every
+    # streamed model chunk (200 updates over ~2s, with a tool call in between),
+    # publishing each update as before versus through the throttle.
+    from a2a.server.events import EventQueue
+    from a2a.server.tasks import TaskUpdater
+    from a2a.types import TaskState
+    from a2a.utils import new_agent_text_message
+
+    logging.disable(logging.WARNING)
+
+    def progress() -> list[str]:
+        texts = ["Designing your landscape options..."] * 200
+        texts[80:85] = ["Looking up landscape options..."] * 5
+        return texts
+
+    async def run_turn(throttled: bool) -> tuple[int, float]:
+        queue = EventQueue()
+        updater = TaskUpdater(queue, "task", "context")
+
+        async def send(text: str) -> None:
+            await updater.update_status(
+                TaskState.working, new_agent_text_message(text, "context", "task")
+            )
+
+        throttle = StatusThrottle.from_env(send)
+        cpu_started = time.process_time()
+        for text in progress():
+            await asyncio.sleep(0.01)
+            if throttled:
+                await throttle.update(text)
+            else:
+                await send(text)
+        await throttle.close()
+        cpu = time.process_time() - cpu_started
+        events = 0
+        while not queue.queue.empty():
+            queue.queue.get_nowait()
+            events += 1
+        return events, cpu
+
+    for throttled in (False, True):
+        events, cpu = asyncio.run(run_turn(throttled))
+        print(
+            f"{'throttled' if throttled else 'every update':13} "
+            f"events/turn={events:4d} cpu/turn={cpu * 1000:6.1f}ms"
+        )
@@ -0,0 +1,98 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Support for schema-constrained ("structured output") responses.
+#
+# Instead of asking the model for free text split by `---a2ui_JSON---`, the
+# model is asked for a single JSON object with the conversational reply in
+# `text` and the A2UI messages in `a2ui`. The provider enforces the schema
+# while decoding, so the JSON part can no longer be malformed.
+
+from typing import Any
+
+import json_codec
+
+A2UI_DELIMITER = "---a2ui_JSON---"
+TEXT_FIELD = "text"
+A2UI_FIELD = "a2ui"
+
+# JSON Schema keywords that Gemini's response schema subset does not accept.
+_UNSUPPORTED_KEYWORDS = {"title", "pattern"}
+
+
+def _strip_unsupported(schema: Any) -> Any:
+    if isinstance(schema, dict):
+        return {
+            key: _strip_unsupported(value)
+            for key, value in schema.items()
+            # "properties" maps names to schemas, so its keys are never keywords.
+            if key not in _UNSUPPORTED_KEYWORDS or isinstance(value, dict)
+        }
+    if isinstance(schema, list):
+        return [_strip_unsupported(item) for item in schema]
+    return schema
+
+
+def build_response_schema(single_message_schema: dict[str, Any]) -> dict[str, Any]:
+    """Wraps the single A2UI message schema into the structured response schema."""
+    return {
+        "type": "object",
+        "properties": {
+            TEXT_FIELD: {
+                "type": "string",
+                "description": "The conversational text response shown to the user.",
+            },
+            A2UI_FIELD: {
+                "type": "array",
+                "description": "The list of A2UI messages that render the UI.",
+                "items": _strip_unsupported(single_message_schema),
+            },
+        },
+        "required": [TEXT_FIELD, A2UI_FIELD],
+    }
+
+
+def get_response_format(response_schema: dict[str, Any]) -> dict[str, Any]:
+    """Builds the LiteLLM `response_format` argument for the given schema."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "a2ui_response",
+            "schema": response_schema,
+        },
+    }
+
+
+def parse_structured_response(content: str) -> tuple[str, Any]:
+    """
+    Parses a structured model response.
+
+    Returns:
+        A (text, a2ui_messages) tuple.
+
+    Raises:
+        ValueError: If the response is not a JSON object with the expected fields.
+    """
+    cleaned = content.strip().removeprefix("```json").removesuffix("```").strip()
+    data = json_codec.loads(cleaned)
+    if not isinstance(data, dict):
+        raise ValueError("Structured response is not a JSON object.")
+    if A2UI_FIELD not in data:
+        raise ValueError(f"Structured response is missing the '{A2UI_FIELD}' field.")
+    return str(data.get(TEXT_FIELD, "")), data[A2UI_FIELD]
+
+
+def to_delimited_response(text: str, a2ui_messages: Any) -> str:
+    """Renders a parsed response in the `---a2ui_JSON---` format the executor expects."""
+    return f"{text}\n{A2UI_DELIMITER}\n{json_codec.dumps(a2ui_messages)}"
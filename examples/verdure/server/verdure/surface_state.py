@@ -0,0 +1,300 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Server-side record of the surfaces each client already has.
+#
+# For every conversation (`context_id`) the registry remembers the last
+# `beginRendering`, component set and data model sent for each `surfaceId`.
+# New responses are reduced to what actually changed: identical
+# `beginRendering` messages are dropped, `surfaceUpdate` only carries changed
+# components, and `dataModelUpdate` is split into path-scoped updates of the
+# smallest maps that changed. Components missing from a turn's updates of a
+# surface are forgotten, so they are sent in full if they come back.
+#
+# A diff is only recorded once it has been delivered: `diff` returns the
+# messages together with the surfaces they lead to, and the caller commits
+# them after sending. A turn that fails to send leaves the registry as it was.
+
+import copy
+import json
+import logging
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+_LEAF_FIELDS = ("valueString", "valueNumber", "valueBoolean")
+
+
+class _SurfaceState:
+    def __init__(self):
+        self.begin_rendering: dict[str, Any] | None = None
+        self.components: dict[str, dict[str, Any]] = {}
+        # Maps are stored as dicts, leaves as (value field, value) tuples.
+        self.data_model: dict[str, Any] = {}
+
+
+def decode_contents(
+    contents: list[dict[str, Any]],
+    leaf: Callable[[str | None, Any], Any] = lambda field, value: value,
+) -> dict[str, Any]:
+    """
+    Decodes the `contents` of a `dataModelUpdate` into nested dicts.
+
+    Maps become dicts; each leaf becomes `leaf(value field, value)`, the bare
+    value by default. Entries without a key are skipped.
+    """
+    tree = {}
+    for entry in contents:
+        key = entry.get("key")
+        if key is None:
+            continue
+        if "valueMap" in entry:
+            tree[key] = decode_contents(entry["valueMap"], leaf)
+        else:
+            field = next((f for f in _LEAF_FIELDS if f in entry), None)
+            tree[key] = leaf(field, entry.get(field) if field else None)
+    return tree
+
+
+def _leaf_with_field(field: str | None, value: Any) -> tuple[str | None, Any]:
+    return (field, value)
+
+
+def _encode_contents(tree: dict[str, Any]) -> list[dict[str, Any]]:
+    contents = []
+    for key, node in tree.items():
+        if isinstance(node, dict):
+            contents.append({"key": key, "valueMap": _encode_contents(node)})
+        elif node[0] is None:
+            contents.append({"key": key})
+        else:
+            contents.append({"key": key, node[0]: node[1]})
+    return contents
+
+
+def _join_path(path: str, key: str) -> str:
+    return f"/{key}" if path == "/" else f"{path}/{key}"
+
+
+def _path_segments(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+def _diff_tree(old: Any, new: dict[str, Any], path: str) -> list[tuple[str, dict]]:
+    """Returns the (path, map) pairs that must be re-sent to turn `old` into `new`."""
+    if old == new:
+        return []
+    if not isinstance(old, dict):
+        return [(path, new)]
+
+    removed = old.keys() - new.keys()
+    leaf_changed = any(
+        not isinstance(node, dict) and old.get(key) != node
+        for key, node in new.items()
+    )
+    if removed or leaf_changed:
+        # A map is replaced as a whole, so resend it when it lost keys or one
+        # of its direct values changed.
+        return [(path, new)]
+
+    updates = []
+    for key, node in new.items():
+        if old.get(key) != node:
+            updates.extend(_diff_tree(old.get(key), node, _join_path(path, key)))
+    return updates
+
+
+class SurfaceDiff:
+    """The messages to send for a turn, and the surfaces they leave the client with."""
+
+    def __init__(
+        self,
+        registry: "SurfaceRegistry",
+        context_id: str,
+        messages: list[dict[str, Any]],
+        surfaces: dict[str, _SurfaceState],
+        deleted: set[str],
+    ):
+        self.messages = messages
+        self._registry = registry
+        self._context_id = context_id
+        self._surfaces = surfaces
+        self._deleted = deleted
+
+    def commit(self) -> None:
+        """Records the messages as delivered to the client."""
+        surfaces = self._registry._surfaces(self._context_id)
+        for surface_id in self._deleted:
+            surfaces.pop(surface_id, None)
+        surfaces.update(self._surfaces)
+
+
+class SurfaceRegistry:
+    """Tracks the surfaces sent per conversation and diffs new responses."""
+
+    def __init__(self, max_contexts: int = 1000):
+        self._max_contexts = max_contexts
+        self._contexts: OrderedDict[str, dict[str, _SurfaceState]] = OrderedDict()
+
+    def _surfaces(self, context_id: str) -> dict[str, _SurfaceState]:
+        surfaces = self._contexts.pop(context_id, None)
+        if surfaces is None:
+            surfaces = {}
+        self._contexts[context_id] = surfaces
+        while len(self._contexts) > self._max_contexts:
+            self._contexts.popitem(last=False)
+        return surfaces
+
+    def forget(self, context_id: str) -> None:
+        """Drops everything known about a conversation, forcing full resends."""
+        self._contexts.pop(context_id, None)
+
+    def diff(self, context_id: str, messages: list[dict[str, Any]]) -> SurfaceDiff:
+        """
+        Returns only the parts of `messages` the client lacks.
+
+        Nothing is recorded until the returned diff is committed.
+
+        Args:
+            context_id: The conversation the messages are sent to.
+            messages: The full list of A2UI messages generated for this turn.
+
+        Returns:
+            The minimal list of A2UI messages to send, as `SurfaceDiff.messages`.
+        """
+        known = self._contexts.get(context_id, {})
+        # The surfaces this turn changes, copied before they are modified.
+        surfaces: dict[str, _SurfaceState] = {}
+        deleted: set[str] = set()
+        # Surface ID -> IDs of the components this turn sends for it.
+        component_ids: dict[str, set[str]] = {}
+
+        def state_for(surface_id: str) -> _SurfaceState:
+            if surface_id not in surfaces:
+                previous = known.get(surface_id) if surface_id not in deleted else None
+                surfaces[surface_id] = (
+                    copy.deepcopy(previous) if previous else _SurfaceState()
+                )
+            return surfaces[surface_id]
+
+        result = []
+        for message in messages:
+            if not isinstance(message, dict):
+                result.append(message)
+            elif "beginRendering" in message:
+                begin = message["beginRendering"]
+                state = state_for(begin.get("surfaceId"))
+                if state.begin_rendering != begin:
+                    state.begin_rendering = copy.deepcopy(begin)
+                    result.append(message)
+            elif "surfaceUpdate" in message:
+                update = message["surfaceUpdate"]
+                surface_id = update.get("surfaceId")
+                state = state_for(surface_id)
+                sent_ids = component_ids.setdefault(surface_id, set())
+                changed = []
+                for component in update.get("components", []):
+                    component_id = component.get("id")
+                    sent_ids.add(component_id)
+                    if state.components.get(component_id) != component:
+                        state.components[component_id] = copy.deepcopy(component)
+                        changed.append(component)
+                if changed:
+                    result.append({"surfaceUpdate": {**update, "components": changed}})
+            elif "dataModelUpdate" in message:
+                update = message["dataModelUpdate"]
+                result.extend(
+                    self._diff_data_model(state_for(update.get("surfaceId")), update)
+                )
+            elif "deleteSurface" in message:
+                surface_id = message["deleteSurface"].get("surfaceId")
+                surfaces.pop(surface_id, None)
+                component_ids.pop(surface_id, None)
+                deleted.add(surface_id)
+                result.append(message)
+            else:
+                result.append(message)
+
+        for surface_id, sent_ids in component_ids.items():
+            state = surfaces[surface_id]
+            for component_id in state.components.keys() - sent_ids:
+                del state.components[component_id]
+
+        return SurfaceDiff(self, context_id, result, surfaces, deleted)
+
+    def _diff_data_model(
+        self, state: _SurfaceState, update: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        path = update.get("path") or "/"
+        new_tree = decode_contents(update.get("contents", []), _leaf_with_field)
+
+        # Find the currently known subtree at `path`.
+        old_tree = state.data_model
+        segments = _path_segments(path)
+        for segment in segments:
+            old_tree = old_tree.get(segment) if isinstance(old_tree, dict) else None
+
+        updates = _diff_tree(old_tree, new_tree, "/" + "/".join(segments))
+
+        if not segments:
+            state.data_model = new_tree
+        else:
+            node = state.data_model
+            for segment in segments[:-1]:
+                if not isinstance(node.get(segment), dict):
+                    node[segment] = {}
+                node = node[segment]
+            node[segments[-1]] = new_tree
+
+        return [
+            {
+                "dataModelUpdate": {
+                    **update,
+                    "path": update_path,
+                    "contents": _encode_contents(tree),
+                }
+            }
+            for update_path, tree in updates
+        ]
+
+
+def payload_size(messages: list[dict[str, Any]]) -> int:
+    """Returns the size in bytes of the JSON encoding of `messages`."""
+    return len(json_codec.dumps_bytes(messages))
+
+
+if __name__ == "__main__":
+    # Compares full and diffed payloads for a cart whose quantities changed.
+    from ui_examples import load_ui_examples
+
+    cart = load_ui_examples("http://localhost:10002")["SHOPPING_CART_EXAMPLE"]
+    registry = SurfaceRegistry()
+    first = registry.diff("demo", copy.deepcopy(cart))
+    first.commit()
+
+    edited = copy.deepcopy(cart)
+    contents = edited[2]["dataModelUpdate"]["contents"]
+    contents[2]["valueMap"][1]["valueMap"][1]["valueString"] = "$3,000"
+    second = registry.diff("demo", edited)
+
+    for label, full, sent in (("First", cart, first), ("Second", edited, second)):
+        print(
+            f"{label + ' turn:':13}{payload_size(full)} bytes full, "
+            f"{payload_size(sent.messages)} bytes sent"
+        )
+    print(json.dumps(second.messages, indent=2))
@@ -0,0 +1,174 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+import uuid
+
+import pytest
+from a2a.server.agent_execution import RequestContext
+from a2a.server.events import EventQueue
+from a2a.types import (
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    TaskState,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+from agent_executor import LandscapeAgentExecutor
+
+# Far longer than the test waits, so only a cancellation ends the turn.
+FAKE_LATENCY = 30.0
+SLOT_TIMEOUT = 1.0
+
+
+@pytest.fixture
+def executor(monkeypatch) -> LandscapeAgentExecutor:
+    monkeypatch.setenv("LITELLM_MODEL", "fake")
+    monkeypatch.setenv("VERDURE_FAKE_LATENCY", str(FAKE_LATENCY))
+    monkeypatch.setenv("VERDURE_MAX_CONCURRENT_TURNS", "1")
+    return LandscapeAgentExecutor(base_url="http://localhost:10002")
+
+
+@pytest.fixture
+def speculating_executor(executor, monkeypatch) -> LandscapeAgentExecutor:
+    monkeypatch.setenv("VERDURE_SPECULATION", "true")
+    return LandscapeAgentExecutor(base_url="http://localhost:10002")
+
+
+@pytest.fixture
+def diffing_executor(executor, monkeypatch) -> LandscapeAgentExecutor:
+    monkeypatch.setenv("VERDURE_DIFF_SURFACES", "true")
+    return LandscapeAgentExecutor(base_url="http://localhost:10002")
+
+
+def _request(text: str) -> RequestContext:
+    message = Message(
+        role=Role.user,
+        parts=[Part(root=TextPart(text=text))],
+        message_id=uuid.uuid4().hex,
+    )
+    return RequestContext(request=MessageSendParams(message=message))
+
+
+async def _drain(queue: EventQueue) -> list:
+    events = []
+    while not queue.queue.empty():
+        events.append(await queue.dequeue_event())
+    return events
+
+
+async def _wait_inflight(executor: LandscapeAgentExecutor) -> str:
+    """Returns the ID of the task whose turn is running, once there is one."""
+    async with asyncio.timeout(SLOT_TIMEOUT):
+        while not executor._inflight:
+            await asyncio.sleep(0.01)
+    (task_id,) = executor._inflight
+    return task_id
+
+
+async def test_cancel_marks_task_canceled_and_frees_turn_slot(executor):
+    context = _request("hi")
+    turn = asyncio.create_task(executor.execute(context, EventQueue(), use_ui=True))
+    task_id = await _wait_inflight(executor)
+    assert executor._turn_slot.locked()
+
+    cancel_queue = EventQueue()
+    started = time.monotonic()
+    await executor.cancel(
+        RequestContext(task_id=task_id, context_id=context.context_id), cancel_queue
+    )
+
+    with pytest.raises(asyncio.CancelledError):
+        await turn
+    (event,) = await _drain(cancel_queue)
+    assert isinstance(event, TaskStatusUpdateEvent)
+    assert event.task_id == task_id
+    assert event.status.state == TaskState.canceled
+    assert event.final
+    assert task_id not in executor._inflight
+
+    # The next turn gets the only slot right away, not after the model call.
+    await asyncio.wait_for(executor._turn_slot.acquire(), timeout=SLOT_TIMEOUT)
+    executor._turn_slot.release()
+    assert time.monotonic() - started < SLOT_TIMEOUT
+
+
+async def test_second_turn_starts_after_cancelled_one(executor):
+    context = _request("hi")
+    first = asyncio.create_task(executor.execute(context, EventQueue(), use_ui=True))
+    task_id = await _wait_inflight(executor)
+    await executor.cancel(
+        RequestContext(task_id=task_id, context_id=context.context_id), EventQueue()
+    )
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    turn = asyncio.create_task(executor.execute(_request("hi"), EventQueue(), use_ui=True))
+    second_task_id = await _wait_inflight(executor)
+    assert second_task_id != task_id
+    turn.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await turn
+
+
+async def test_cancel_while_waiting_on_a_speculation(speculating_executor):
+    executor = speculating_executor
+    context = _request("hi")
+    speculation_started = asyncio.Event()
+    cleaned_up = asyncio.Event()
+
+    async def run():
+        speculation_started.set()
+        await asyncio.sleep(FAKE_LATENCY)
+
+    async def cleanup():
+        cleaned_up.set()
+
+    assert executor.speculator.schedule(context.context_id, "hi", run, cleanup)
+    turn = asyncio.create_task(executor.execute(context, EventQueue(), use_ui=True))
+    task_id = await _wait_inflight(executor)
+    await speculation_started.wait()
+    # Wait until the turn has taken the speculation and is awaiting it.
+    async with asyncio.timeout(SLOT_TIMEOUT):
+        while executor.speculator._entries:
+            await asyncio.sleep(0.01)
+
+    await executor.cancel(
+        RequestContext(task_id=task_id, context_id=context.context_id), EventQueue()
+    )
+    # The turn ends with the cancellation instead of falling back to a model call.
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(turn, timeout=SLOT_TIMEOUT)
+    await asyncio.wait_for(cleaned_up.wait(), timeout=SLOT_TIMEOUT)
+
+
+async def test_cancel_forgets_the_conversation_surfaces(diffing_executor):
+    executor = diffing_executor
+    context = _request("hi")
+    sent = [{"deleteSurface": {"surfaceId": "welcome"}}]
+    executor.surfaces.diff(context.context_id, sent).commit()
+    assert context.context_id in executor.surfaces._contexts
+
+    turn = asyncio.create_task(executor.execute(context, EventQueue(), use_ui=True))
+    task_id = await _wait_inflight(executor)
+    await executor.cancel(
+        RequestContext(task_id=task_id, context_id=context.context_id), EventQueue()
+    )
+    with pytest.raises(asyncio.CancelledError):
+        await turn
+    # The next turn resends its surfaces in full.
+    assert context.context_id not in executor.surfaces._contexts
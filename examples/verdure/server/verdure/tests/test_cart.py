@@ -0,0 +1,100 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from decimal import Decimal
+
+import pytest
+from cart import CartService, format_usd, order_number
+
+TEMPLATES = {
+    "SHOPPING_CART_EXAMPLE": [
+        {"beginRendering": {"surfaceId": "cart", "root": "root"}},
+        {"dataModelUpdate": {"surfaceId": "cart", "contents": []}},
+    ],
+    "ORDER_CONFIRMATION_EXAMPLE": [
+        {"beginRendering": {"surfaceId": "confirmation", "root": "root"}},
+        {"dataModelUpdate": {"surfaceId": "confirmation", "contents": []}},
+    ],
+}
+
+
+@pytest.fixture
+def service() -> CartService:
+    return CartService()
+
+
+@pytest.mark.parametrize(
+    "option, subtotal, tax, total",
+    [
+        ("option1", "$7,500.00", "$600.00", "$8,100.00"),
+        ("option2", "$4,920.00", "$393.60", "$5,313.60"),
+    ],
+)
+def test_cart_prices(service, option, subtotal, tax, total):
+    cart = service.cart_for(option)
+    assert format_usd(cart.subtotal) == subtotal
+    assert format_usd(cart.tax) == tax
+    assert format_usd(cart.total) == total
+    assert cart.total == cart.subtotal + cart.tax
+
+
+def test_tax_is_rounded_half_up_to_the_cent():
+    cart = CartService(tax_rate=Decimal("0.08131")).cart_for("option1")
+    # 7,500.00 * 0.08131 = 609.825, which rounding half to even makes 609.82.
+    assert cart.tax == Decimal("609.83")
+
+
+def test_cart_is_found_by_name(service):
+    assert service.cart_for("  English Cottage Garden ") is service.cart_for("option2")
+
+
+def test_order_number_is_deterministic():
+    assert order_number("context-1", "option1") == order_number("context-1", "option1")
+    assert order_number("context-1", "option1") != order_number("context-2", "option1")
+    assert order_number("context-1", "option1").startswith("#LSC-")
+
+
+def test_respond_fills_the_cart_template(service):
+    item = service.respond(
+        "select_option", {"optionName": "Modern Zen Garden"}, "context-1", TEMPLATES
+    )
+    contents = item["a2ui_messages"][1]["dataModelUpdate"]["contents"]
+    assert {"key": "optionName", "valueString": "Modern Zen Garden"} in contents
+    assert "---a2ui_JSON---" in item["content"]
+
+
+def test_checkout_charges_the_computed_total(service):
+    item = service.respond(
+        "checkout",
+        {"optionName": "option2", "totalPrice": "$1.00"},
+        "context-1",
+        TEMPLATES,
+    )
+    contents = item["a2ui_messages"][1]["dataModelUpdate"]["contents"]
+    assert {"key": "price", "valueString": "$5,313.60"} in contents
+    assert {
+        "key": "orderNumber",
+        "valueString": order_number("context-1", "option2"),
+    } in contents
+
+
+def test_respond_leaves_other_turns_to_the_model(service):
+    assert service.respond("select_option", {"optionName": "Mystery"}, "c", TEMPLATES) is None
+    assert service.respond("submit_questionnaire", {}, "c", TEMPLATES) is None
+
+
+@pytest.mark.parametrize("value", ["-0.5", "NaN", "Infinity", "1", "abc"])
+def test_invalid_tax_rate_falls_back_to_the_default(monkeypatch, value):
+    monkeypatch.setenv("VERDURE_CART_TAX_RATE", value)
+    assert CartService.from_env().tax_rate == Decimal("0.08")
@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Streaming of the conversational text of a response.
+#
+# With text streaming on, the model is called in streaming mode and the agent
+# forwards the text it has received so far as working status updates, while
+# the response is still being generated. In a delimited UI response, only the
+# text before `---a2ui_JSON---` is streamed; the JSON after it is buffered and
+# validated once complete, as before. Each update carries the whole text so
+# far, so a client shows the latest status message, and coalescing updates
+# loses nothing.
+#
+# Text is not streamed with structured output (the text is a field inside the
+# JSON object) or with hedging (two calls would stream at once).
+#
+# Configuration (environment):
+#   VERDURE_STREAM_TEXT           Set to `true` to stream response text.
+#   VERDURE_STREAM_TEXT_INTERVAL  Seconds between streamed text updates
+#                                 (default 0.05).
+
+from structured_output import A2UI_DELIMITER
+
+
+class DelimitedTextStream:
+    """Collects the text of a streamed delimited response, up to the delimiter."""
+
+    def __init__(self, delimiter: str = A2UI_DELIMITER):
+        self.delimiter = delimiter
+        self.text = ""
+        # Set once the delimiter has been seen; later chunks are not text.
+        self.done = False
+        self._held = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a chunk of the response and returns the text it completes.
+
+        A chunk ending in what could be the start of the delimiter holds that
+        part back until the next chunk shows whether it is.
+        """
+        if self.done:
+            return ""
+        pending = self._held + chunk
+        index = pending.find(self.delimiter)
+        if index >= 0:
+            self.done = True
+            delta, self._held = pending[:index], ""
+        else:
+            held = _partial_suffix(pending, self.delimiter)
+            delta, self._held = pending[: len(pending) - held], pending[len(pending) - held :]
+        self.text += delta
+        return delta
+
+
+def _partial_suffix(text: str, delimiter: str) -> int:
+    """Returns the length of the longest end of `text` that starts `delimiter`."""
+    for length in range(min(len(text), len(delimiter) - 1), 0, -1):
+        if text.endswith(delimiter[:length]):
+            return length
+    return 0
+
+
+if __name__ == "__main__":
+    # Time to the first visible text of a UI turn against the fake model, with
+    # and without streaming. The fake model generates ~4 characters every 2ms,
+    # so the total generation time is the same either way.
+    import asyncio
+    import logging
+    import os
+    import time
+
+    os.environ.setdefault("LITELLM_MODEL", "fake")
+    os.environ.setdefault("VERDURE_FAKE_TOKEN_DELAY", "0.002")
+    logging.disable(logging.WARNING)
+
+    from agent import LandscapeAgent
+
+    async def run(streaming: bool, turns: int = 5) -> tuple[float, float]:
+        os.environ["VERDURE_STREAM_TEXT"] = "true" if streaming else "false"
+        agent = LandscapeAgent(base_url="http://localhost:10002", use_ui=True)
+        first_text, total = 0.0, 0.0
+        for i in range(turns):
+            started = time.monotonic()
+            seen = None
+            async for item in agent.stream("USER_WANTS_TO_START_PROJECT", f"s{i}"):
+                if seen is None and (item["is_task_complete"] or item.get("streaming")):
+                    seen = time.monotonic() - started
+            first_text += seen
+            total += time.monotonic() - started
+        return first_text / turns, total / turns
+
+    for streaming in (False, True):
+        first_text, total = asyncio.run(run(streaming))
+        print(
+            f"streaming={'on ' if streaming else 'off'} "
+            f"first text after {first_text * 1000:6.1f}ms, "
+            f"turn done after {total * 1000:6.1f}ms"
+        )
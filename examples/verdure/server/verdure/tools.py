@@ -12,12 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import logging
 
+import json_codec
+
 logger = logging.getLogger(__name__)
 
 
+# The design options offered for every yard. In a real app, these would come
+# from a model or database; `cart` prices each one from its bill of materials.
+LANDSCAPE_OPTIONS = [
+    {
+        "name": "Modern Zen Garden",
+        "detail": "Low maintenance, drought-tolerant plants, and clean lines. Perfect for relaxation.",
+        "imageUrl": "http://localhost:10002/images/zen_garden.png",
+        "price": "Est. $5,000 - $8,000",
+        "time": "Est. 2-3 weeks",
+        "tradeoffs": "Higher upfront cost, less floral variety.",
+        "id": "option1",
+    },
+    {
+        "name": "English Cottage Garden",
+        "detail": "Vibrant, colorful, and teeming with life. A classic, romantic look.",
+        "imageUrl": "http://localhost:10002/images/cottage_garden.png",
+        "price": "Est. $3,000 - $6,000",
+        "time": "Est. 4-6 weeks",
+        "tradeoffs": "Higher maintenance (watering/weeding), seasonal changes.",
+        "id": "option2",
+    },
+]
+
+
 def get_landscape_options(
     budget: str, style: str, maintenance: str, space_description: str
 ) -> str:
@@ -34,33 +59,10 @@ def get_landscape_options(
     logger.info(f"  - Maintenance: {maintenance}")
     logger.info(f"  - Space: {space_description}")
 
-    # In a real app, this would query a model or database.
-    # Here, we return hardcoded options.
-    options = [
-        {
-            "name": "Modern Zen Garden",
-            "detail": "Low maintenance, drought-tolerant plants, and clean lines. Perfect for relaxation.",
-            "imageUrl": "http://localhost:10002/images/zen_garden.png",
-            "price": "Est. $5,000 - $8,000",
-            "time": "Est. 2-3 weeks",
-            "tradeoffs": "Higher upfront cost, less floral variety.",
-            "id": "option1",
-        },
-        {
-            "name": "English Cottage Garden",
-            "detail": "Vibrant, colorful, and teeming with life. A classic, romantic look.",
-            "imageUrl": "http://localhost:10002/images/cottage_garden.png",
-            "price": "Est. $3,000 - $6,000",
-            "time": "Est. 4-6 weeks",
-            "tradeoffs": "Higher maintenance (watering/weeding), seasonal changes.",
-            "id": "option2",
-        },
-    ]
-
     # --- MODIFICATION ---
     # Remove the filtering logic to always return both options
-    items = options
+    items = LANDSCAPE_OPTIONS
     # --- END MODIFICATION ---
 
     logger.info(f"  - Success: Returning {len(items)} landscape options.")
-    return json.dumps(items)
+    return json_codec.dumps(items)
@@ -0,0 +1,216 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Per-task trace timelines written to local files.
+#
+# Every A2A task gets its own trace, rooted at an `a2a.task` span that carries
+# the task and context ids. Under it are spans for part parsing, image saves,
+# each agent attempt, response validation and status updates; the
+# ADK runner adds its own spans for model calls (`call_llm`) and tool calls
+# (`execute_tool ...`) beneath the attempt they belong to.
+#
+# Spans are held until the root span of their trace ends, and the whole tree
+# is then written as one line of OTLP/JSON (an `ExportTraceServiceRequest`)
+# to a size-rotated file. Encoding and writing happen on a background thread.
+# Each line can be posted to any OTLP/HTTP endpoint as is; no collector is
+# needed to record them. `python tracing.py FILE [CONTEXT_ID]` prints the
+# recorded turns of each conversation as an indented timeline.
+#
+# Configuration (environment):
+#   VERDURE_TRACING          Set to `true` to record traces. When unset, the
+#                            spans are no-ops.
+#   VERDURE_TRACE_FILE       Output file (default `traces/verdure-traces.jsonl`).
+#   VERDURE_TRACE_MAX_BYTES  Size at which the file is rotated (default 10 MiB).
+#   VERDURE_TRACE_BACKUPS    Rotated files kept (default 5).
+
+import base64
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from config import env_flag, env_int
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+
+logger = logging.getLogger(__name__)
+
+# Spans created by this server. Without a configured provider, these are no-ops.
+tracer = trace.get_tracer("verdure")
+
+# Trees still waiting for their root span. When exceeded, the oldest
+# incomplete tree is written as is.
+MAX_PENDING_TRACES = 1000
+
+_ID_FIELDS = {"traceId", "spanId", "parentSpanId"}
+
+
+def new_root_context() -> otel_context.Context:
+    """Returns a context without a current span, for starting a new trace."""
+    return otel_context.Context()
+
+
+def _hex_ids(value):
+    """Rewrites the base64 ids protobuf's JSON mapping produces as OTLP's hex ids."""
+    if isinstance(value, dict):
+        return {
+            key: base64.b64decode(item).hex() if key in _ID_FIELDS else _hex_ids(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_hex_ids(item) for item in value]
+    return value
+
+
+def encode_otlp_json(spans: list[ReadableSpan]) -> str:
+    """Encodes spans as one OTLP/JSON `ExportTraceServiceRequest`."""
+    from google.protobuf.json_format import MessageToDict
+    from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+
+    request = MessageToDict(encode_spans(spans), use_integers_for_enums=True)
+    return json.dumps(_hex_ids(request), separators=(",", ":"))
+
+
+class TraceFileProcessor(SpanProcessor):
+    """Collects the spans of each trace and writes finished trees to a file."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[list[ReadableSpan] | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="trace-writer", daemon=True
+        )
+        self._writer.start()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        evicted = None
+        with self._lock:
+            self._pending.setdefault(trace_id, []).append(span)
+            if span.parent is None:
+                tree = self._pending.pop(trace_id)
+            else:
+                tree = None
+                if len(self._pending) > MAX_PENDING_TRACES:
+                    _, evicted = self._pending.popitem(last=False)
+        if tree is not None:
+            self._queue.put(tree)
+        if evicted is not None:
+            self._queue.put(evicted)
+
+    def _write_loop(self) -> None:
+        while (tree := self._queue.get()) is not None:
+            try:
+                line = encode_otlp_json(tree)
+                self._handler.handle(logging.makeLogRecord({"msg": line}))
+            except Exception:
+                logger.exception("Failed to write a trace.")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            trees, self._pending = list(self._pending.values()), OrderedDict()
+        for tree in trees:
+            self._queue.put(tree)
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+        self._handler.close()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def configure_tracing() -> TracerProvider | None:
+    """Installs the file-exporting tracer provider, if tracing is enabled."""
+    if not env_flag("VERDURE_TRACING"):
+        return None
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "verdure-agent"})
+    )
+    processor = TraceFileProcessor(
+        path=os.getenv("VERDURE_TRACE_FILE", "traces/verdure-traces.jsonl"),
+        max_bytes=env_int("VERDURE_TRACE_MAX_BYTES", 10 * 1024 * 1024),
+        backups=env_int("VERDURE_TRACE_BACKUPS", 5),
+    )
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    logger.info(f"Writing traces to {processor.path}.")
+    return provider
+
+
+if __name__ == "__main__":
+    # Prints the traces in a file as timelines, grouped by conversation.
+    import sys
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python tracing.py TRACE_FILE [CONTEXT_ID]")
+    wanted = sys.argv[2] if len(sys.argv) > 2 else None
+
+    def attributes(span: dict) -> dict:
+        return {
+            attribute["key"]: next(iter(attribute["value"].values()), None)
+            for attribute in span.get("attributes", [])
+        }
+
+    conversations: dict[str, list[list[dict]]] = {}
+    with open(sys.argv[1]) as f:
+        for line in f:
+            spans = [
+                span
+                for resource_spans in json.loads(line).get("resourceSpans", [])
+                for scope_spans in resource_spans.get("scopeSpans", [])
+                for span in scope_spans.get("spans", [])
+            ]
+            root = next((s for s in spans if not s.get("parentSpanId")), None)
+            if root is None or root["name"] != "a2a.task":
+                continue
+            context_id = attributes(root).get("a2a.context_id", "?")
+            if wanted is None or context_id == wanted:
+                conversations.setdefault(context_id, []).append(spans)
+
+    for context_id, turns in conversations.items():
+        print(f"conversation {context_id}")
+        turns.sort(key=lambda spans: min(int(s["startTimeUnixNano"]) for s in spans))
+        for spans in turns:
+            children: dict[str, list[dict]] = {}
+            for span in spans:
+                children.setdefault(span.get("parentSpanId", ""), []).append(span)
+            origin = min(int(s["startTimeUnixNano"]) for s in spans)
+
+            def show(span: dict, depth: int) -> None:
+                start = (int(span["startTimeUnixNano"]) - origin) / 1e6
+                duration = (
+                    int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+                ) / 1e6
+                print(f"  {start:9.1f}ms {duration:9.1f}ms {'  ' * depth}{span['name']}")
+                for child in sorted(
+                    children.get(span["spanId"], []),
+                    key=lambda s: int(s["startTimeUnixNano"]),
+                ):
+                    show(child, depth + 1)
+
+            for root in children.get("", []):
+                show(root, 0)
+            print()
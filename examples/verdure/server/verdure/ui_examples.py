@@ -15,6 +15,10 @@
 # This file serves as the single source of truth for all A2UI example templates.
 # It is imported by agent.py to be passed to the prompt builder.
 
+import json
+import re
+from typing import Any
+
 LANDSCAPE_UI_EXAMPLES = """
 ---BEGIN WELCOME_SCREEN_EXAMPLE---
 [
@@ -72,14 +76,14 @@ LANDSCAPE_UI_EXAMPLES = """
       {{ "id": "take-photo-row", "component": {{ "Row": {{ "distribution": "start", "alignment": "center", "children": {{ "explicitList": ["take-photo-icon", "take-photo-column"] }} }} }} }},
       {{ "id": "take-photo-icon", "component": {{ "Icon": {{ "name": {{ "literalString": "camera-alt" }} }} }} }},
       {{ "id": "take-photo-column", "component": {{ "Column": {{ "children": {{ "explicitList": ["take-photo-title", "take-photo-subtitle"] }} }} }} }},
-      {{ "id": "take-photo-title", "component": {{ "Heading": {{ "level": 4, "text": {{ "literalString": "Take a Photo" }} }} }} }},
+      {{ "id": "take-photo-title", "component": {{ "Heading": {{ "level": "4", "text": {{ "literalString": "Take a Photo" }} }} }} }},
       {{ "id": "take-photo-subtitle", "component": {{ "Text": {{ "text": {{ "literalString": "Capture your space directly from the app." }} }} }} }},
 
       {{ "id": "choose-library-card", "component": {{ "Card": {{ "child": "choose-library-row" }} }} }},
       {{ "id": "choose-library-row", "component": {{ "Row": {{ "distribution": "start", "alignment": "center", "children": {{ "explicitList": ["choose-library-icon", "choose-library-column"] }} }} }} }},
       {{ "id": "choose-library-icon", "component": {{ "Icon": {{ "name": {{ "literalString": "photo-library" }} }} }} }},
       {{ "id": "choose-library-column", "component": {{ "Column": {{  "children": {{ "explicitList": ["choose-library-title", "choose-library-subtitle"] }} }} }} }},
-      {{ "id": "choose-library-title", "component": {{ "Heading": {{ "level": 4, "text": {{ "literalString": "Choose from Library" }} }} }} }},
+      {{ "id": "choose-library-title", "component": {{ "Heading": {{ "level": "4", "text": {{ "literalString": "Choose from Library" }} }} }} }},
       {{ "id": "choose-library-subtitle", "component": {{ "Text": {{ "text": {{ "literalString": "Select a photo from your phone's gallery." }} }} }} }},
 
       {{ "id": "tips-row", "component": {{ "Row": {{ "distribution": "center", "alignment": "center", "children": {{ "explicitList": ["tips-icon", "tips-text"] }} }} }} }},
@@ -175,7 +179,7 @@ LANDSCAPE_UI_EXAMPLES = """
 
       {{ "id": "option-card-2", "weight": 1, "component": {{ "Card": {{ "child": "option-layout-2" }} }} }},
       {{ "id": "option-layout-2", "component": {{ "Column": {{ "alignment": "center", "distribution": "center", "children": {{ "explicitList": ["option-image-2", "option-details-2"] }} }} }} }},
-      {{ "id": "option-image-2", "component": {{ "Image": {{ "url": {{ "path": "/items/option2/imageUrl" }}, "fit": "cover" }} }} }} }},
+      {{ "id": "option-image-2", "component": {{ "Image": {{ "url": {{ "path": "/items/option2/imageUrl" }}, "fit": "cover" }} }} }},
       {{ "id": "option-details-2", "component": {{ "Column": {{ "alignment": "stretch","distribution": "center", "children": {{ "explicitList": ["option-name-2", "option-price-2", "option-time-2", "option-detail-2", "option-tradeoffs-2", "select-button-2"] }} }} }} }},
       {{ "id": "option-name-2", "component": {{ "Heading": {{ "level": "4", "text": {{ "path": "/items/option2/name" }} }} }} }},
       {{ "id": "option-price-2", "component": {{ "Heading": {{ "level": "5", "text": {{ "path": "/items/option2/price" }} }} }} }},
@@ -283,3 +287,25 @@ LANDSCAPE_UI_EXAMPLES = """
 ]
 ---END ORDER_CONFIRMATION_EXAMPLE---
 """
+
+
+_EXAMPLE_PATTERN = re.compile(
+    r"---BEGIN (?P<name>[A-Z_]+)---\s*(?P<body>.*?)\s*---END (?P=name)---", re.DOTALL
+)
+
+
+def load_ui_examples(base_url: str) -> dict[str, list[dict[str, Any]]]:
+    """
+    Parses LANDSCAPE_UI_EXAMPLES into A2UI message lists keyed by example name.
+
+    Args:
+        base_url: The base URL substituted for `{base_url}` in the templates.
+
+    Returns:
+        A dict mapping names such as `WELCOME_SCREEN_EXAMPLE` to their messages.
+    """
+    formatted_examples = LANDSCAPE_UI_EXAMPLES.format(base_url=base_url)
+    return {
+        match.group("name"): json.loads(match.group("body"))
+        for match in _EXAMPLE_PATTERN.finditer(formatted_examples)
+    }
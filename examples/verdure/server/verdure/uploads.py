@@ -0,0 +1,387 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Storage for uploaded images.
+#
+# Inline (base64) uploads are decoded in fixed-size chunks straight into the
+# upload directory while their SHA-256 is computed, so at most one chunk of
+# decoded bytes is held in memory besides the request itself. Files are named
+# after their hash, which also de-duplicates repeated uploads of one photo.
+# A stored file is read back at most once per turn, when a model call first
+# needs its bytes, and not kept once the turn is over.
+#
+# Clients can also upload a photo once with `POST /uploads` (a multipart form
+# with a `file` field, or the raw image as the body) and then refer to it from
+# a FilePart by the returned URI. FilePart URIs pointing at a stored upload, or
+# `file://` URIs inside an allowed directory, are read locally; other URIs are
+# passed on to the model as they are.
+#
+# Configuration (environment):
+#   VERDURE_MAX_UPLOAD_BYTES  Largest accepted upload (default 25 MiB).
+#   VERDURE_FILE_URI_ROOTS    Directories `file://` URIs may point into,
+#                             separated by `os.pathsep`. The upload directory
+#                             is always allowed.
+
+import base64
+import binascii
+import functools
+import hashlib
+import logging
+import os
+import tempfile
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+from config import env_int
+from metrics import metrics
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "uploads")
+# The bundled images served under `/images`, such as the demo yard photo.
+IMAGES_DIR = os.path.dirname(UPLOADS_DIR)
+
+# Base64 characters decoded per chunk; a multiple of 4, so every chunk decodes
+# on its own. 1 MiB of base64 is 768 KiB of image.
+CHUNK_CHARS = 1024 * 1024
+
+_WHITESPACE = ("\n", "\r", " ", "\t")
+
+_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/heic": ".heic",
+    "image/webp": ".webp",
+}
+
+
+class StoredUpload:
+    """An uploaded file, stored under the name of its hash."""
+
+    def __init__(self, path: str, sha256: str, size: int):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+
+def extension_for(mime_type: str | None) -> str:
+    return _EXTENSIONS.get(mime_type, ".jpg")
+
+
+class _UploadWriter:
+    """Writes an upload to a temporary file, then stores it under its hash."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(
+            dir=directory, suffix=".part", delete=False
+        )
+
+    def write(self, data: bytes) -> None:
+        self._digest.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self, mime_type: str | None) -> StoredUpload:
+        self._file.close()
+        sha256 = self._digest.hexdigest()
+        path = os.path.join(self.directory, sha256 + extension_for(mime_type))
+        os.replace(self._file.name, path)
+        return StoredUpload(path, sha256, self.size)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.unlink(self._file.name)
+
+
+def save_base64_upload(
+    data: str, mime_type: str | None, directory: str = UPLOADS_DIR
+) -> StoredUpload:
+    """
+    Decodes a base64 string into the upload directory, chunk by chunk.
+
+    Raises:
+        binascii.Error: If `data` is not valid base64.
+    """
+    writer = _UploadWriter(directory)
+    # A partial 4-character group left at the end of a chunk (only possible
+    # when the input contains line breaks) is decoded with the next one.
+    carry = ""
+    try:
+        for start in range(0, len(data), CHUNK_CHARS):
+            chunk = carry + data[start : start + CHUNK_CHARS]
+            if any(c in chunk for c in _WHITESPACE):
+                chunk = "".join(chunk.split())
+            usable = len(chunk) - len(chunk) % 4
+            chunk, carry = chunk[:usable], chunk[usable:]
+            writer.write(base64.b64decode(chunk, validate=True))
+        if carry:
+            raise binascii.Error("Truncated base64 data.")
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit(mime_type)
+
+
+def _allowed_roots() -> list[str]:
+    roots = [UPLOADS_DIR]
+    roots += [
+        root for root in os.getenv("VERDURE_FILE_URI_ROOTS", "").split(os.pathsep) if root
+    ]
+    return [os.path.realpath(root) for root in roots]
+
+
+def resolve_local_uri(uri: str, base_url: str) -> str | None:
+    """
+    Returns the local path of a FilePart URI, or None if it is not local.
+
+    Upload URIs issued by this server map into the upload directory, and
+    `file://` URIs are accepted inside the allowed directories only.
+
+    Raises:
+        PermissionError: If a `file://` URI points outside the allowed directories.
+        FileNotFoundError: If the URI is local but the file does not exist.
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        path = os.path.realpath(url2pathname(parsed.path))
+        if not any(os.path.commonpath([path, root]) == root for root in _allowed_roots()):
+            raise PermissionError(f"{uri} is outside the allowed directories.")
+    elif uri.startswith(f"{base_url}/images/uploads/") or (
+        not parsed.scheme and parsed.path.startswith("/images/uploads/")
+    ):
+        name = unquote(parsed.path.rsplit("/", 1)[-1])
+        if not name or name.startswith(".") or os.path.basename(name) != name:
+            raise FileNotFoundError(uri)
+        path = os.path.join(UPLOADS_DIR, name)
+    else:
+        return None
+    if not os.path.isfile(path):
+        raise FileNotFoundError(uri)
+    return path
+
+
+def bundled_image_path(uri: str, base_url: str) -> str | None:
+    """Returns the local path of a bundled image URI (`/images/<name>`), or None."""
+    parsed = urlparse(uri)
+    if not uri.startswith(f"{base_url}/images/") and not (
+        not parsed.scheme and parsed.path.startswith("/images/")
+    ):
+        return None
+    name = unquote(parsed.path.removeprefix("/images/"))
+    if not name or name.startswith(".") or os.path.basename(name) != name:
+        return None
+    path = os.path.join(IMAGES_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def file_sha256(path: str) -> str:
+    """Returns the SHA-256 of a file, hashed again only when the file changes."""
+    stat = os.stat(path)
+    return _file_sha256(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _file_sha256(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_CHARS):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_upload(path: str) -> bytes:
+    """
+    Returns the contents of a stored upload, as one copy in memory.
+
+    Callers keep the result for as long as they need it rather than reading
+    the file again.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeds the configured maximum size."""
+
+
+class _MultipartUpload:
+    """Streams the `file` part of a multipart body into an `_UploadWriter`."""
+
+    def __init__(self, boundary: bytes, writer: _UploadWriter):
+        from python_multipart.multipart import MultipartParser
+
+        self.writer = writer
+        self.mime_type: str | None = None
+        self.found = False
+        self._headers: dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._in_file = False
+        self.parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _on_headers_finished(self) -> None:
+        from python_multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and options.get(b"name") == b"file"
+        if self._in_file:
+            self.found = True
+            content_type = self._headers.get(b"content-type")
+            self.mime_type = content_type.decode("latin-1") if content_type else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.writer.write(data[start:end])
+
+    def _on_part_end(self) -> None:
+        self._in_file = False
+
+
+def upload_endpoint(base_url: str):
+    """
+    Returns a Starlette route that stores an uploaded image.
+
+    Accepts a multipart form with a `file` field, or the image itself as the
+    body, and responds with the URI to use in FileParts.
+    """
+    max_bytes = env_int("VERDURE_MAX_UPLOAD_BYTES", 25 * 1024 * 1024)
+
+    async def endpoint(request: Request) -> JSONResponse:
+        from python_multipart.multipart import parse_options_header
+
+        content_type, options = parse_options_header(
+            request.headers.get("content-type", "")
+        )
+        writer = _UploadWriter(UPLOADS_DIR)
+        multipart = (
+            _MultipartUpload(options[b"boundary"], writer)
+            if content_type == b"multipart/form-data" and b"boundary" in options
+            else None
+        )
+        try:
+            async for chunk in request.stream():
+                if multipart is not None:
+                    multipart.parser.write(chunk)
+                else:
+                    writer.write(chunk)
+                if writer.size > max_bytes:
+                    raise UploadTooLarge()
+            if multipart is not None:
+                multipart.parser.finalize()
+                if not multipart.found:
+                    raise ValueError("The form has no 'file' field.")
+                mime_type = multipart.mime_type
+            else:
+                mime_type = content_type.decode("latin-1")
+            if not writer.size:
+                raise ValueError("The upload is empty.")
+        except UploadTooLarge:
+            writer.abort()
+            return JSONResponse(
+                {"error": f"uploads are limited to {max_bytes} bytes"}, status_code=413
+            )
+        except Exception as e:
+            writer.abort()
+            logger.warning(f"Rejected upload: {e}")
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        stored = writer.commit(mime_type)
+        metrics.inc("uploads_total")
+        metrics.observe("upload_bytes", stored.size)
+        return JSONResponse(
+            {
+                "uri": f"{base_url}/images/uploads/{stored.filename}",
+                "mimeType": mime_type,
+                "size": stored.size,
+                "sha256": stored.sha256,
+            },
+            status_code=201,
+        )
+
+    return endpoint
+
+
+if __name__ == "__main__":
+    # Peak resident memory while storing a 20 MB upload that arrived as a
+    # base64 string: decoded at once (as the executor used to) versus decoded
+    # in chunks. Linux only; the peak is reset through /proc/self/clear_refs.
+    import sys
+
+    def rss_kib(field: str) -> int:
+        with open("/proc/self/status") as f:
+            line = next(line for line in f if line.startswith(field))
+        return int(line.split()[1])
+
+    def measure(label: str, store) -> None:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = rss_kib("VmRSS:")
+        kept = store()
+        peak = rss_kib("VmHWM:") - before
+        print(f"{label:10} peak +{peak / 1024:6.1f} MiB over the request")
+        del kept
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20 * 1024 * 1024
+    data = base64.b64encode(os.urandom(size)).decode("ascii")
+    print(f"upload: {size / 2**20:.0f} MiB, as base64: {len(data) / 2**20:.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        def at_once():
+            image_bytes = base64.b64decode(data)
+            with open(os.path.join(directory, "upload.jpg"), "wb") as f:
+                f.write(image_bytes)
+            # The executor kept the decoded bytes for the model call.
+            return image_bytes
+
+        def chunked():
+            return save_base64_upload(data, "image/jpeg", directory)
+
+        # Chunked first, so it cannot reuse memory freed by the other run.
+        measure("chunked", chunked)
+        measure("at once", at_once)
@@ -0,0 +1,115 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Token accounting.
+#
+# Model responses carry usage metadata. The agent sums it per attempt and per
+# turn, and exports it on /metrics by model and action (`agent_tokens_total`,
+# `agent_turn_tokens`). Tokens spent on attempts that were thrown away (an
+# invalid response that was retried, or a hedged call that lost) are counted
+# again in `agent_wasted_tokens_total`. Per-conversation totals are kept in the
+# session state under `token_usage`, split by action.
+#
+# Configuration (environment):
+#   VERDURE_SESSION_TOKEN_BUDGET  Tokens a conversation may spend (default 0,
+#                                 unlimited). Once spent, the UI agent answers
+#                                 with the cached template for the action if
+#                                 there is one, and the text agent otherwise.
+
+from typing import Any
+
+from metrics import metrics
+
+USAGE_STATE_KEY = "token_usage"
+
+
+class TokenUsage:
+    """Tokens used by one or more model calls."""
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.model_calls = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add_event(self, event) -> None:
+        """Adds the usage metadata of a runner event, if it has any."""
+        usage = event.usage_metadata
+        if usage is None:
+            return
+        self.input_tokens += usage.prompt_token_count or 0
+        # Thinking tokens are billed as output.
+        self.output_tokens += (usage.candidates_token_count or 0) + (
+            usage.thoughts_token_count or 0
+        )
+        self.cached_tokens += usage.cached_content_token_count or 0
+        self.model_calls += 1
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cached_tokens += other.cached_tokens
+        self.model_calls += other.model_calls
+
+    def record(self, model: str, action: str) -> None:
+        """Exports these tokens on /metrics as spent."""
+        for kind, value in (
+            ("input", self.input_tokens),
+            ("output", self.output_tokens),
+            ("cached", self.cached_tokens),
+        ):
+            if value:
+                metrics.inc("agent_tokens_total", value, kind=kind, model=model, action=action)
+
+    def record_wasted(self, model: str, action: str) -> None:
+        """Exports these tokens on /metrics as spent on a discarded response."""
+        if self.total_tokens:
+            metrics.inc(
+                "agent_wasted_tokens_total", self.total_tokens, model=model, action=action
+            )
+
+
+def add_turn(
+    totals: dict[str, Any] | None, action: str, used: TokenUsage, wasted: TokenUsage
+) -> dict[str, Any]:
+    """
+    Returns the conversation totals in `totals` updated with one turn.
+
+    `used` is every token the turn spent, including the `wasted` ones.
+    """
+    totals = {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "wasted_tokens": 0,
+        "turns": 0,
+        "by_action": {},
+        **(totals or {}),
+    }
+    totals["input_tokens"] += used.input_tokens
+    totals["output_tokens"] += used.output_tokens
+    totals["total_tokens"] += used.total_tokens
+    totals["wasted_tokens"] += wasted.total_tokens
+    totals["turns"] += 1
+    by_action = dict(totals["by_action"])
+    entry = dict(by_action.get(action, {"total_tokens": 0, "turns": 0}))
+    entry["total_tokens"] += used.total_tokens
+    entry["turns"] += 1
+    by_action[action] = entry
+    totals["by_action"] = by_action
+    return totals
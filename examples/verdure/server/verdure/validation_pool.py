@@ -0,0 +1,249 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Parsing and validation of a2ui responses, off the event loop when large.
+#
+# Checking a UI response (JSON parsing, the A2UI schema, the component tree)
+# is pure CPU work. For a large surface it takes long enough to stall every
+# other conversation served by the event loop. With a pool configured,
+# responses above a size threshold are checked in a worker instead and the
+# agent awaits the result; smaller ones are still checked inline, where the
+# hand-off would cost more than it saves.
+#
+# A process pool runs the checks in parallel with the event loop. A thread
+# pool avoids the cost of sending the parsed messages back between processes,
+# but shares the GIL with the loop, so it only bounds how long the loop is
+# held at a time. Either way, the schema validator is built once per process
+# (and per worker) rather than on every call.
+#
+# Configuration (environment):
+#   VERDURE_VALIDATION_POOL          `process` or `thread` to check large
+#                                    responses in a pool. Unset, everything is
+#                                    checked inline.
+#   VERDURE_VALIDATION_WORKERS       Workers in the pool (default 2).
+#   VERDURE_VALIDATION_INLINE_BYTES  Responses up to this size are checked
+#                                    inline (default 65536).
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from typing import Any
+
+import json_codec
+import jsonschema
+from a2ui_schema import load_a2ui_schema
+from a2ui_validation import validate_structure
+from config import env_int
+from metrics import metrics
+from structured_output import parse_structured_response
+
+logger = logging.getLogger(__name__)
+
+# Parsed a2ui messages, the text of a structured response, an error, and the
+# wall-clock (start, end) nanoseconds of each stage of the check that ran.
+CheckResult = tuple[Any, str | None, str | None, dict[str, tuple[int, int]]]
+
+# The stages of a check, in order: parsing the JSON, the A2UI schema and the
+# component tree.
+CHECK_STAGES = ("parse", "schema", "structure")
+
+
+@functools.cache
+def response_validator() -> jsonschema.protocols.Validator:
+    """Returns the validator for a list of a2ui messages, built once per process."""
+    schema = {"type": "array", "items": load_a2ui_schema()}
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def check_response_json(json_text: str, structured: bool = False) -> CheckResult:
+    """
+    Parses and validates the JSON of a UI response.
+
+    `json_text` is the a2ui JSON of a delimited response, or the whole
+    response in structured mode, where the text part is returned as well.
+
+    Returns:
+        The parsed messages, the text part (structured mode only), an error
+        message if the response is invalid (the messages are then None), and
+        the times of each stage run, up to the one that failed. The times are
+        taken from the wall clock, so those measured in a worker process line
+        up with the caller's.
+    """
+    timings: dict[str, tuple[int, int]] = {}
+    stages = iter(CHECK_STAGES)
+    stage, started = next(stages), time.time_ns()
+
+    def finish_stage() -> None:
+        nonlocal stage, started
+        now = time.time_ns()
+        timings[stage] = (started, now)
+        stage, started = next(stages, None), now
+
+    try:
+        if structured:
+            text, messages = parse_structured_response(json_text)
+        else:
+            text, messages = None, json_codec.loads(json_text)
+        finish_stage()
+        response_validator().validate(messages)
+        finish_stage()
+        problems = validate_structure(messages)
+        finish_stage()
+        if problems:
+            raise ValueError(f"Invalid component tree: {'; '.join(problems)}")
+    except (ValueError, jsonschema.exceptions.ValidationError) as e:
+        # ValueError covers json.JSONDecodeError. Only the message crosses
+        # back from a worker process.
+        if stage is not None:
+            finish_stage()
+        return None, None, str(e), timings
+    return messages, text, None, timings
+
+
+class ValidationPool:
+    """Checks large responses in a worker pool and small ones inline."""
+
+    def __init__(self, kind: str = "process", workers: int = 2, inline_bytes: int = 65536):
+        self.kind = kind
+        self.inline_bytes = inline_bytes
+        if kind == "process":
+            # Workers are spawned rather than forked from a process that
+            # already runs threads, and build their validator on start.
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=response_validator,
+            )
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="validation"
+            )
+        # Starts the workers now rather than on the first large response.
+        self._started = [self._executor.submit(os.getpid) for _ in range(workers)]
+
+    @classmethod
+    def from_env(cls) -> "ValidationPool | None":
+        """Returns the configured pool, or None if responses are checked inline."""
+        kind = os.getenv("VERDURE_VALIDATION_POOL", "").strip().lower()
+        if kind in ("", "off", "none", "false"):
+            return None
+        if kind not in ("process", "thread"):
+            logger.warning(f"Unknown VERDURE_VALIDATION_POOL '{kind}'; checking inline.")
+            return None
+        return cls(
+            kind=kind,
+            workers=env_int("VERDURE_VALIDATION_WORKERS", 2),
+            inline_bytes=env_int("VERDURE_VALIDATION_INLINE_BYTES", 65536),
+        )
+
+    async def wait_started(self) -> None:
+        """Waits until the workers started when the pool was created are up."""
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in self._started))
+
+    async def check(self, json_text: str, structured: bool = False) -> CheckResult:
+        """Checks a response inline or in the pool, depending on its size."""
+        if len(json_text) <= self.inline_bytes:
+            metrics.inc("agent_validations_total", where="inline")
+            return check_response_json(json_text, structured)
+        metrics.inc("agent_validations_total", where=self.kind)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, check_response_json, json_text, structured
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: ValidationPool | None = None
+_pool_loaded = False
+
+
+def shared_validation_pool() -> ValidationPool | None:
+    """Returns the validation pool shared by every agent in this process."""
+    global _pool, _pool_loaded
+    if not _pool_loaded:
+        _pool, _pool_loaded = ValidationPool.from_env(), True
+    return _pool
+
+
+def shutdown_validation_pool() -> None:
+    if _pool is not None:
+        _pool.shutdown()
+
+
+if __name__ == "__main__":
+    # Load test: small responses (10 components) arrive every 50ms, as from
+    # many conversations, while a large one (1000 components) arrives every
+    # 500ms. Reports the latency of the small checks, which includes any
+    # time spent waiting for the event loop.
+    import statistics
+    import sys
+    import time
+
+    from payload_bench import synthetic_response
+
+    small = json_codec.dumps(synthetic_response(10, depth=4, data_entries=10))
+    large = json_codec.dumps(synthetic_response(1_000, depth=8, data_entries=100))
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+
+    async def load_test(pool: ValidationPool | None) -> list[float]:
+        async def check(text: str) -> None:
+            if pool is None:
+                check_response_json(text)
+            else:
+                await pool.check(text)
+
+        async def timed_small(arrival: float) -> float:
+            await check(small)
+            return time.perf_counter() - arrival
+
+        async def arrivals(text: str, interval: float, timed: bool) -> list:
+            # Requests arrive on a fixed schedule; those due while the loop
+            # was blocked start late, and their latency counts from arrival.
+            tasks = []
+            arrival = started
+            while arrival < started + duration:
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+                tasks.append(
+                    asyncio.create_task(timed_small(arrival) if timed else check(text))
+                )
+                arrival += interval
+            return await asyncio.gather(*tasks)
+
+        response_validator()
+        await check(large)  # warm up
+        started = time.perf_counter()
+        latencies, _ = await asyncio.gather(
+            arrivals(small, 0.05, timed=True), arrivals(large, 0.5, timed=False)
+        )
+        return latencies
+
+    print(f"small response: {len(small)} bytes, large response: {len(large)} bytes")
+    for kind in (None, "thread", "process"):
+        pool = ValidationPool(kind=kind) if kind else None
+        latencies = asyncio.run(load_test(pool))
+        if pool is not None:
+            pool.shutdown()
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{kind or 'inline':8} small checks={len(latencies):4d} "
+            f"p50={quantiles[49] * 1000:7.1f}ms p99={quantiles[98] * 1000:7.1f}ms "
+            f"max={max(latencies) * 1000:7.1f}ms"
+        )
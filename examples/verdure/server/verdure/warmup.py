@@ -0,0 +1,190 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Warm-up of a server process, and the readiness endpoint that waits for it.
+#
+# Much of what the first request needs is set up lazily: the UI templates are
+# parsed, the schema validator is built, validation workers are started and
+# connections to the model provider are opened on first use. Once the server
+# has started, these steps run in the background:
+#   templates        parse every UI template and check it against the schema
+#                    and the component tree checks (builds the validator);
+#   validation_pool  wait for the validation workers, if there is a pool;
+#   connections      open a keep-alive connection to each model's endpoint;
+#   prime            optionally, run a greeting turn through the UI agent,
+#                    which loads the rest of the model call path and lets the
+#                    provider cache the prompt.
+# `GET /ready` answers 503 until they are done and 200 afterwards, so a load
+# balancer only sends traffic to a warm process. An invalid template fails
+# the warm-up and the process never becomes ready; a provider that cannot be
+# reached does not, since model calls may still succeed later.
+#
+# Configuration (environment):
+#   VERDURE_WARMUP_CONNECT  Set to `false` to not open model connections
+#                           during warm-up.
+#   VERDURE_WARMUP_PRIME    Set to `true` to make a priming model call (this
+#                           spends tokens on every start).
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable
+from typing import Any
+
+import json_codec
+from agent_executor import LandscapeAgentExecutor
+from config import env_flag
+from http_pool import get_shared_pool, provider_base_url
+from metrics import metrics
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from validation_pool import check_response_json
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Warms up the executor's agents once the server has started."""
+
+    def __init__(
+        self, executor: LandscapeAgentExecutor, connect: bool = True, prime: bool = False
+    ):
+        self.executor = executor
+        self.connect = connect
+        self.prime = prime
+        # pending -> warming -> ready, or failed.
+        self.status = "pending"
+        self.error: str | None = None
+        # Seconds taken by each step, in order.
+        self.steps: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls, executor: LandscapeAgentExecutor) -> "Warmup":
+        return cls(
+            executor,
+            connect=env_flag("VERDURE_WARMUP_CONNECT", True),
+            prime=env_flag("VERDURE_WARMUP_PRIME"),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def start(self) -> None:
+        """Starts the warm-up in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self) -> None:
+        self.status = "warming"
+        started = time.monotonic()
+        try:
+            await self._step("templates", asyncio.to_thread(self._check_templates))
+            pool = self.executor.ui_agent.validation_pool
+            if pool is not None:
+                await self._step("validation_pool", pool.wait_started())
+            if self.connect:
+                await self._step("connections", self._open_connections())
+            if self.prime:
+                await self._step("prime", self._prime())
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            logger.error(f"Warm-up failed, the server will not report ready: {e}")
+            return
+        self.status = "ready"
+        elapsed = time.monotonic() - started
+        metrics.observe("warmup_seconds", elapsed)
+        logger.info(f"Warm-up done in {elapsed:.2f}s: {self.steps}")
+
+    async def _step(self, name: str, work: Awaitable[Any]) -> None:
+        started = time.monotonic()
+        await work
+        self.steps[name] = round(time.monotonic() - started, 4)
+
+    def _check_templates(self) -> None:
+        for name, messages in self.executor.ui_agent.load_examples().items():
+            _, _, error, _ = check_response_json(json_codec.dumps(messages))
+            if error is not None:
+                raise ValueError(f"UI template {name} is invalid: {error}")
+
+    async def _open_connections(self) -> None:
+        router = self.executor.ui_agent.router
+        models = {router.default_model, *router.routes.values()}
+        if router.fallback_model:
+            models.add(router.fallback_model)
+        # The offline fake models make no connections.
+        models = {model for model in models if not model.startswith("fake")}
+        urls = sorted({url for model in models if (url := provider_base_url(model))})
+        if urls:
+            connected = await get_shared_pool().preconnect(urls)
+            logger.info(f"Opened connections to {connected} of {len(urls)} model endpoints.")
+
+    async def _prime(self) -> None:
+        try:
+            await self.executor.ui_agent.prime()
+        except Exception as e:
+            logger.warning(f"Priming model call failed: {e}")
+
+    def report(self) -> dict[str, Any]:
+        report = {"status": self.status, "steps": self.steps}
+        if self.error is not None:
+            report["error"] = self.error
+        return report
+
+
+def ready_endpoint(warmup: Warmup):
+    """Returns a Starlette route answering 200 once warm-up is done, 503 before."""
+
+    async def endpoint(request: Request) -> JSONResponse:
+        return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
+
+    return endpoint
+
+
+if __name__ == "__main__":
+    # Time of the first turn after start, cold and after warm-up, against the
+    # fake model (each in a fresh process, since warm-up is per process).
+    import os
+    import subprocess
+    import sys
+
+    if len(sys.argv) > 1:
+        os.environ.setdefault("LITELLM_MODEL", "fake")
+        logging.disable(logging.WARNING)
+
+        async def first_turn(warm: bool) -> None:
+            executor = LandscapeAgentExecutor(base_url="http://localhost:10002")
+            if warm:
+                warmup = Warmup(executor, prime=True)
+                await warmup.run()
+                assert warmup.ready, warmup.report()
+            started = time.monotonic()
+            async for _ in executor.ui_agent.stream("USER_WANTS_TO_START_PROJECT", "s"):
+                pass
+            print(
+                f"{'warm' if warm else 'cold'}: first turn took "
+                f"{(time.monotonic() - started) * 1000:7.1f}ms"
+                + (f" after warm-up steps {warmup.steps}" if warm else "")
+            )
+
+        asyncio.run(first_turn(sys.argv[1] == "warm"))
+    else:
+        for mode in ("cold", "warm"):
+            subprocess.run([sys.executable, __file__, mode], check=True)